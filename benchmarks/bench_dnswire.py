@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare the DNS wire format client with dnspython.
+
+Run with ``python benchmarks/bench_dnswire.py``. Queries are answered by a
+minimal nameserver on 127.0.0.1, so that the numbers reflect the cost on
+the client side: latency per query, memory allocated while querying and
+the cost of importing dyndnsc.detector.dnswanip compared with dnspython.
+"""
+
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+import dns.message
+import dns.query
+import dns.rdatatype
+
+from dyndnsc.common import dnswire
+
+QNAME = "myip.opendns.com"
+# answer section: pointer to the question name, A, IN, ttl 0, 192.0.2.1
+RECORD = b"\xc0\x0c" + struct.pack("!HHIH", 1, 1, 0, 4) + socket.inet_aton("192.0.2.1")
+
+# the detector module as imported by the plugin registry, next to the dyndnsc package it
+# is part of and the dnspython modules it used to import:
+IMPORTS = (
+    ("dnspython", "import dns.asyncresolver, dns.resolver"),
+    ("dyndnsc", "import dyndnsc"),
+    ("dnswanip", "import dyndnsc.detector.dnswanip"),
+)
+
+
+def _serve(sock):
+    while True:
+        try:
+            data, address = sock.recvfrom(512)
+        except OSError:
+            return
+        # echo the query as response with the QR flag and a single answer:
+        qid, flags = struct.unpack_from("!HH", data)
+        sock.sendto(struct.pack("!HHHHHH", qid, flags | 0x8000, 1, 1, 0, 0) + data[12:] + RECORD, address)
+
+
+def _dnspython(port):
+    query = dns.message.make_query(QNAME, "A")
+    response = dns.query.udp(query, "127.0.0.1", timeout=1, port=port)
+    return [rdata.address for rrset in response.answer if rrset.rdtype == dns.rdatatype.A for rdata in rrset]
+
+
+def _measure(func, number):
+    """Return the best latency per call in microseconds and the peak KiB allocated by a call."""
+    func()
+    latency = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        latency = min(latency, (time.perf_counter() - start) / number)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return latency * 1e6, peak / 1024.0
+
+
+def _import_cost(statement):
+    code = ("import sys, time, tracemalloc; tracemalloc.start(); start = time.perf_counter(); %s; "
+            "print(time.perf_counter() - start, tracemalloc.get_traced_memory()[1], 'dns' in sys.modules)" % statement)
+    output = subprocess.check_output([sys.executable, "-c", code])
+    seconds, peak, dnspython = output.split()
+    return float(seconds) * 1000, int(peak) / 1024.0, dnspython.decode()
+
+
+def main():
+    """Print latency and allocations per query and the import cost."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    threading.Thread(target=_serve, args=(sock,), daemon=True).start()
+    client = dnswire.Client(timeout=1)
+    batch = [dnswire.Query("127.0.0.1", QNAME, dnswire.A, port=port)] * 16
+    cases = (
+        ("dnspython", 1, lambda: _dnspython(port)),
+        ("dnswire", 1, lambda: client.query("127.0.0.1", QNAME, dnswire.A, port=port).values(dnswire.A)),
+        ("dnswire x16", len(batch), lambda: [answer.values(dnswire.A) for answer in client.query_many(batch)]),
+    )
+    print("%-12s %14s %14s" % ("query", "us/query", "KiB/query"))  # noqa: T001
+    for name, queries, func in cases:
+        latency, peak = _measure(func, 2000 // queries)
+        print("%-12s %14.1f %14.1f" % (name, latency / queries, peak / queries))  # noqa: T001
+    print()  # noqa: T001
+    print("%-12s %14s %14s %10s" % ("import", "ms", "KiB", "dnspython"))  # noqa: T001
+    for name, statement in IMPORTS:
+        print("%-12s %14.1f %14.1f %10s" % ((name,) + _import_cost(statement)))  # noqa: T001
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
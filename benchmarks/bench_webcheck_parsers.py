@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measure the throughput of the webcheck response parsers.
+
+Run with ``python benchmarks/bench_webcheck_parsers.py``. Every parser is fed
+typical responses line by line, the way _get_ip_from_url() streams them, and
+compared to parsing the complete text with a pattern compiled on every call.
+"""
+
+import re
+import timeit
+
+from dyndnsc.common.six import ipaddress
+from dyndnsc.detector.webcheck import PARSERS
+
+FILLER = "<div class='filler'>lorem ipsum dolor sit amet</div>"
+HTML_TOP = "<html><body>Current IP Address: 192.0.2.1</body></html>\n" + (FILLER + "\n") * 1000
+HTML_BOTTOM = (FILLER + "\n") * 1000 + "<html><body>Current IP Address: 192.0.2.1</body></html>\n"
+
+CASES = (
+    ("plain", "192.0.2.1\n"),
+    ("jsonip", '{"ip":"192.0.2.1","about":"/about"}'),
+    ("checkip", "<html><body>Current IP Address: 192.0.2.1</body></html>"),
+    ("checkip", HTML_TOP),
+    ("checkip", HTML_BOTTOM),
+)
+
+
+def _recompiling_parser(text, pattern="Current IP Address: (.*?)(<.*){0,1}$"):
+    # how webcheck parsed responses before the parser registry:
+    regex = re.compile(pattern)
+    for line in text.splitlines():
+        match_obj = regex.search(line)
+        if match_obj is not None:
+            return str(ipaddress(match_obj.group(1)))
+    return None
+
+
+def _bench(func, number):
+    return number / min(timeit.repeat(func, number=number, repeat=3))
+
+
+def main():
+    """Print parses per second for every case."""
+    print("%-10s %8s %14s %14s" % ("parser", "bytes", "streamed/s", "full text/s"))  # noqa: T001
+    for name, body in CASES:
+        parser = PARSERS[name]
+        lines = body.splitlines()
+        number = 200 if len(body) > 1000 else 20000
+        streamed = _bench(lambda: parser.parse_lines(iter(lines)), number)
+        if name == "checkip":
+            full = _bench(lambda: _recompiling_parser(body), number)
+        else:
+            full = _bench(lambda: parser(body), number)
+        print("%-10s %8i %14.0f %14.0f" % (name, len(body), streamed, full))  # noqa: T001
+
+
+if __name__ == "__main__":
+    main()
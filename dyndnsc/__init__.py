@@ -2,6 +2,6 @@
 
 """Package for dyndnsc."""
 
-from .core import getDynDnsClientForConfig, DynDnsClient  # noqa: @UnusedImport
+from .core import getDynDnsClientForConfig, DynDnsClient, AsyncDynDnsClient  # noqa: @UnusedImport
 
 __version__ = "0.6.2dev0"
@@ -7,6 +7,7 @@ import os
 import logging
 import time
 import argparse
+import threading
 from functools import partial
 
 import json_logging
@@ -14,9 +15,17 @@ import json_logging
 from .plugins.manager import DefaultPluginManager
 from .updater.manager import updater_classes
 from .detector.manager import detector_classes
+from .detector.cache import DetectionCache
+from .detector.dns import DEFAULT_CONCURRENCY as DEFAULT_DNS_CONCURRENCY
 from .core import getDynDnsClientForConfig
+from .scheduler import Scheduler, sync_all, watch_netlink
+from .state import StateStore
+from .shard import Supervisor, client_status
 from .conf import get_configuration, collect_config
 from .common.dynamiccli import parse_cmdline_args
+from .common import constants, health
+
+STATUS_INTERVAL = 60
 
 
 def list_presets(cfg, out):
@@ -46,6 +55,16 @@ def create_argparser():
         "config": None,
         "debug": False,
         "sleeptime": 300,
+        "workers": 1,
+        "check_timeout": None,
+        "startup_jitter": 0,
+        "detection_cache": 0,
+        "state_file": None,
+        "netlink_events": False,
+        "http_pool_size": None,
+        "shards": 0,
+        "dns_resolver": None,
+        "dns_concurrency": DEFAULT_DNS_CONCURRENCY,
         "version": False,
         "verbose_count": 0
     }
@@ -71,6 +90,42 @@ def create_argparser():
     parser.add_argument("--sleeptime", dest="sleeptime",
                         help="how long to sleep between checks in seconds",
                         default=arg_defaults["sleeptime"])
+    parser.add_argument("--workers", dest="workers", type=int,
+                        help="maximum number of clients checked concurrently",
+                        default=arg_defaults["workers"])
+    parser.add_argument("--check-timeout", dest="check_timeout", type=float,
+                        help="seconds a check may take before its HTTP requests time out",
+                        default=arg_defaults["check_timeout"])
+    parser.add_argument("--startup-jitter", dest="startup_jitter", type=float,
+                        help="maximum random delay in seconds before each initial sync",
+                        default=arg_defaults["startup_jitter"])
+    parser.add_argument("--detection-cache", dest="detection_cache", type=float,
+                        help="seconds during which clients with identical detectors share "
+                             "a detected IP (default: 0, disabled)",
+                        default=arg_defaults["detection_cache"])
+    parser.add_argument("--state-file", dest="state_file",
+                        help="file to persist state in, so that restarts skip work that is still fresh",
+                        default=arg_defaults["state_file"])
+    parser.add_argument("--netlink-events", dest="netlink_events",
+                        help="check interface and socket detectors as soon as the kernel reports "
+                             "address or route changes (Linux only)",
+                        action="store_true", default=arg_defaults["netlink_events"])
+    parser.add_argument("--http-pool-size", dest="http_pool_size", type=int,
+                        help="number of HTTP connections kept alive per host (default: %i or --workers if "
+                             "greater)" % constants.HTTP_POOL_MAXSIZE,
+                        default=arg_defaults["http_pool_size"])
+    parser.add_argument("--shards", dest="shards", type=int,
+                        help="split the clients across this many worker processes, "
+                             "restarted if they crash (default: 0, no worker processes)",
+                        default=arg_defaults["shards"])
+    parser.add_argument("--dns-resolver", dest="dns_resolver", choices=("system", "authoritative"),
+                        help="look up the current DNS records through the operating system (default) or by "
+                             "asking the authoritative nameservers directly, bypassing caches",
+                        default=arg_defaults["dns_resolver"])
+    parser.add_argument("--dns-concurrency", dest="dns_concurrency", type=int,
+                        help="maximum number of concurrent DNS lookups for clients checked at the same time "
+                             "(default: %i, 0 looks up each client on its own)" % DEFAULT_DNS_CONCURRENCY,
+                        default=arg_defaults["dns_concurrency"])
     parser.add_argument("--version", dest="version",
                         help="show version and exit",
                         action="store_true", default=arg_defaults["version"])
@@ -81,26 +136,180 @@ def create_argparser():
     return parser, arg_defaults
 
 
-def run_forever(dyndnsclients):
+def run_forever(dyndnsclients, workers=1, timeout=None, state_store=None, netlink_events=False, dns_concurrency=0):
     """
     Run an endless loop accross the given dynamic dns clients.
 
+    Sleeps until the next client is due instead of polling all of them.
+
     :param dyndnsclients: list of DynDnsClients
+    :param workers: maximum number of clients checked concurrently
+    :param timeout: seconds a check may take before its HTTP requests time out
+    :param state_store: optional StateStore to save after checks
+    :param netlink_events: wake up clients on address and route changes
+    :param dns_concurrency: maximum number of concurrent DNS lookups of due clients
+    """
+    scheduler = Scheduler(dyndnsclients, workers=workers, timeout=timeout, state_store=state_store,
+                          dns_concurrency=dns_concurrency)
+    monitor = None
+    if netlink_events:
+        monitor = watch_netlink(scheduler, dyndnsclients)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if monitor is not None:
+            monitor.stop()
+    return 0
+
+
+def _log_level(args):
+    if args.debug:
+        args.verbose_count = 5  # some high number
+    return max(int(logging.WARNING / 10) - args.verbose_count, 0) * 10
+
+
+def run_clients(collected_configs, args, plugins, state_file=None, status_callback=None):
+    """
+    Synchronize the configured clients and keep them updated if requested.
+
+    :param collected_configs: dict of client name to configuration
+    :param args: parsed command line arguments
+    :param plugins: initialized plugin manager
+    :param state_file: file to persist state in, defaults to args.state_file
+    :param status_callback: optional callable taking the list of clients, called
+        after the initial sync and then periodically from a background thread
+    :return: exit code
     """
-    while True:
+    # requests is only imported when clients are run, not for e.g. --help:
+    from .common import http
+
+    http.configure(pool_maxsize=args.http_pool_size or max(http.DEFAULT_POOL_MAXSIZE, args.workers))
+    detection_cache = None
+    if args.detection_cache > 0:
+        detection_cache = DetectionCache(max_age=args.detection_cache)
+    state_store = None
+    if state_file or args.state_file:
+        state_store = StateStore(state_file or args.state_file)
+        health.TRACKER.attach(state_store)
+    dyndnsclients = []
+    for thisconfig in collected_configs:
+        logging.debug("Initializing client for '%s'", thisconfig)
+        # done with options, bring on the dancing girls
+        dyndnsclient = getDynDnsClientForConfig(
+            collected_configs[thisconfig], plugins=plugins, detection_cache=detection_cache,
+            state_store=state_store)
+        if dyndnsclient is None:
+            return 1
+        dyndnsclients.append(dyndnsclient)
+
+    # do an initial synchronization, before going into endless loop.
+    # Clients checked recently by a previous process can be skipped:
+    due = [dyndnsclient for dyndnsclient in dyndnsclients if dyndnsclient.needs_check()]
+    started = time.time()
+    failed = sync_all(due, workers=args.workers, jitter=args.startup_jitter, dns_concurrency=args.dns_concurrency)
+    logging.info("Initial sync of %i client(s) done in %.2f seconds, %i failed, %i still fresh",
+                 len(due), time.time() - started, failed, len(dyndnsclients) - len(due))
+    if state_store is not None:
         try:
-            # Do small sleeps in the main loop, needs_check() is cheap and does
-            # the rest.
-            time.sleep(15)
-            for dyndnsclient in dyndnsclients:
-                dyndnsclient.check()
-        except KeyboardInterrupt:
-            break
-        except Exception as exc:
-            logging.critical("An exception occurred in the dyndns loop", exc_info=exc)
+            state_store.save()
+        except OSError as exc:
+            logging.error("Saving the state to '%s' failed", state_store.filename, exc_info=exc)
+    if status_callback is not None:
+        status_callback(dyndnsclients)
+
+    run_forever_callable = partial(run_forever, dyndnsclients,
+                                   workers=args.workers, timeout=args.check_timeout,
+                                   state_store=state_store, netlink_events=args.netlink_events,
+                                   dns_concurrency=args.dns_concurrency)
+
+    if args.daemon:
+        import daemonocle
+        daemon = daemonocle.Daemon(worker=run_forever_callable)
+        daemon.do_action("start")
+        args.loop = True
+
+    if args.loop:
+        if status_callback is not None:
+            _report_periodically(status_callback, dyndnsclients)
+        run_forever_callable()
+    elif failed:
+        return 1
+
     return 0
 
 
+def _report_periodically(status_callback, dyndnsclients, interval=STATUS_INTERVAL):
+    def report():
+        while True:
+            time.sleep(interval)
+            status_callback(dyndnsclients)
+
+    threading.Thread(target=report, name="status", daemon=True).start()
+
+
+def run_shard(index, collected_configs, status_queue, args):
+    """
+    Run the clients of one shard and exit, this is the entry point of a worker process.
+
+    :param index: index of the shard
+    :param collected_configs: dict of client name to configuration of this shard
+    :param status_queue: queue to put (index, status) tuples on, or None
+    :param args: parsed command line arguments
+    """
+    if not logging.getLogger().handlers:
+        # not inherited from the supervisor, e.g. when the worker was spawned:
+        init_logging(_log_level(args), log_json=args.log_json)
+    plugins = DefaultPluginManager()
+    plugins.load_plugins()
+    plugins.configure(args)
+    plugins.initialize()
+
+    def report_status(dyndnsclients):
+        status_queue.put((index, client_status(dyndnsclients)))
+
+    state_file = None
+    if args.state_file:
+        state_file = "%s.%i" % (args.state_file, index)
+    args.daemon = False  # the supervisor is daemonized, not its workers
+    sys.exit(run_clients(collected_configs, args, plugins, state_file=state_file,
+                         status_callback=report_status if status_queue is not None else None))
+
+
+def run_sharded(collected_configs, args):
+    """
+    Run the clients in args.shards worker processes supervised by this process.
+
+    :param collected_configs: dict of client name to configuration
+    :param args: parsed command line arguments
+    :return: exit code
+    """
+    supervisor = Supervisor(collected_configs, args.shards, partial(run_shard, args=args),
+                            restart=args.loop or args.daemon)
+    if args.daemon:
+        import daemonocle
+        daemon = daemonocle.Daemon(worker=supervisor.run)
+        daemon.do_action("start")
+        return 0
+    return supervisor.run()
+
+
+def _needs_plugin_arguments(argv):
+    """
+    Return True if the updater and detector command line options are needed.
+
+    Registering them imports every updater and detector module, which is
+    avoided when a config file is used and none of the options are given.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-c", "--config", dest="config")
+    args, _ = parser.parse_known_args(argv)
+    if not args.config:
+        return True
+    return any(arg.startswith(("--updater", "--detector", "-h", "--help")) for arg in argv)
+
+
 def init_logging(log_level, log_json=False):
     """Configure logging framework."""
     if log_json:
@@ -124,12 +333,13 @@ def main():
     plugins.load_plugins()
 
     parser, _ = create_argparser()
-    # add the updater protocol options to the CLI:
-    for kls in updater_classes():
-        kls.register_arguments(parser)
+    if _needs_plugin_arguments(sys.argv[1:]):
+        # add the updater protocol options to the CLI:
+        for kls in updater_classes():
+            kls.register_arguments(parser)
 
-    for kls in detector_classes():
-        kls.register_arguments(parser)
+        for kls in detector_classes():
+            kls.register_arguments(parser)
 
     # add the plugin options to the CLI:
     from os import environ
@@ -137,11 +347,7 @@ def main():
 
     args = parser.parse_args()
 
-    if args.debug:
-        args.verbose_count = 5  # some high number
-
-    log_level = max(int(logging.WARNING / 10) - args.verbose_count, 0) * 10
-    init_logging(log_level, log_json=args.log_json)
+    init_logging(_log_level(args), log_json=args.log_json)
     # logging.debug("args %r", args)
 
     if args.version:
@@ -173,31 +379,15 @@ def main():
         }
         collected_configs["cmdline"].update(parsed_args)
 
-    plugins.configure(args)
-    plugins.initialize()
+    if args.dns_resolver:
+        for collected_config in collected_configs.values():
+            collected_config.setdefault("dns_resolver", args.dns_resolver)
 
     logging.debug("collected_configs: %r", collected_configs)
-    dyndnsclients = []
-    for thisconfig in collected_configs:
-        logging.debug("Initializing client for '%s'", thisconfig)
-        # done with options, bring on the dancing girls
-        dyndnsclient = getDynDnsClientForConfig(
-            collected_configs[thisconfig], plugins=plugins)
-        if dyndnsclient is None:
-            return 1
-        # do an initial synchronization, before going into endless loop:
-        dyndnsclient.sync()
-        dyndnsclients.append(dyndnsclient)
-
-    run_forever_callable = partial(run_forever, dyndnsclients)
+    if args.shards > 1:
+        # plugins are initialized in the worker processes:
+        return run_sharded(collected_configs, args)
 
-    if args.daemon:
-        import daemonocle
-        daemon = daemonocle.Daemon(worker=run_forever_callable)
-        daemon.do_action("start")
-        args.loop = True
-
-    if args.loop:
-        run_forever_callable()
-
-    return 0
+    plugins.configure(args)
+    plugins.initialize()
+    return run_clients(collected_configs, args, plugins)
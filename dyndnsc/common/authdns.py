@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""
+Resolve hostnames by asking the authoritative nameservers of their zone.
+
+Unlike socket.getaddrinfo(), answers do not pass through nscd or recursive
+resolver caches, so an update is visible as soon as the provider published
+it, and every query has an explicit timeout.
+"""
+
+import logging
+from socket import AF_INET, AF_INET6, AF_UNSPEC
+import threading
+import time
+
+from . import dnswire
+
+LOG = logging.getLogger(__name__)
+
+_RDTYPES = {
+    AF_INET: (dnswire.A,),
+    AF_INET6: (dnswire.AAAA,),
+    AF_UNSPEC: (dnswire.A, dnswire.AAAA),
+}
+
+
+class ResolutionError(Exception):
+    """None of the authoritative nameservers answered."""
+
+
+class AuthoritativeResolver(object):
+    """
+    Query the authoritative nameservers of a zone directly.
+
+    The zone of a hostname and the addresses of its nameservers are looked
+    up through the recursive resolver once and cached for the TTL of the NS
+    records. Queries are sent with dnswire, over UDP with a per nameserver
+    timeout and repeated over TCP if the answer was truncated.
+    """
+
+    def __init__(self, timeout=2.0, port=53, resolver=None, timefunc=time.time):
+        """
+        Initialize.
+
+        :param timeout: seconds to wait for the answer of a single nameserver
+        :param port: port the authoritative nameservers listen on
+        :param resolver: dns.resolver.Resolver used to find the nameservers,
+            by default one using the system configuration, created when the
+            first nameservers are looked up
+        :param timefunc: callable returning the current time in seconds
+        """
+        self.timeout = timeout
+        self.port = port
+        self._resolver = resolver
+        self._client = dnswire.Client(timeout)
+        self._timefunc = timefunc
+        self._lock = threading.Lock()
+        self._zones = {}  # hostname -> (expires, zone)
+        self._nameservers = {}  # zone -> (expires, addresses)
+
+    def _cached(self, cache, key):
+        with self._lock:
+            entry = cache.get(key)
+        if entry is not None and self._timefunc() < entry[0]:
+            return entry[1]
+        return None
+
+    def _get_resolver(self):
+        if self._resolver is None:
+            import dns.resolver
+
+            self._resolver = dns.resolver.Resolver()
+            self._resolver.lifetime = self.timeout * 2
+        return self._resolver
+
+    def _lookup_nameservers(self, zone):
+        """Return the nameserver addresses of zone and the smallest TTL involved."""
+        import dns.exception
+        import dns.rdatatype
+
+        answer = self._get_resolver().resolve(zone, dns.rdatatype.NS)
+        ttl = answer.rrset.ttl
+        addresses = []
+        for rdata in answer:
+            for rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA):
+                try:
+                    addresses_answer = self._get_resolver().resolve(rdata.target, rdtype)
+                except dns.exception.DNSException as exc:
+                    LOG.debug("Could not resolve nameserver '%s'", rdata.target, exc_info=exc)
+                    continue
+                ttl = min(ttl, addresses_answer.rrset.ttl)
+                addresses.extend(address.address for address in addresses_answer)
+        return addresses, ttl
+
+    def _lookup(self, hostname, zone):
+        """Look up the zone of hostname unless known and the addresses of its nameservers, and cache them."""
+        # dnspython is only imported when nothing is cached:
+        import dns.exception
+        import dns.resolver
+
+        try:
+            if zone is None:
+                zone = dns.resolver.zone_for_name(hostname, resolver=self._get_resolver())
+            with self._lock:
+                entry = self._nameservers.get(zone)
+            if entry is None or self._timefunc() >= entry[0]:
+                addresses, ttl = self._lookup_nameservers(zone)
+                if not addresses:
+                    raise ResolutionError("No nameserver addresses found for zone '%s'" % zone)
+                LOG.debug("Nameservers of zone '%s' for %i seconds: %r", zone, ttl, addresses)
+                entry = (self._timefunc() + ttl, addresses)
+        except dns.exception.DNSException as exc:
+            raise ResolutionError("Could not find the nameservers of '%s': %s" % (hostname, exc))
+        with self._lock:
+            self._nameservers[zone] = entry
+            # remember the zone of hostname as long as its nameservers:
+            self._zones[hostname] = (entry[0], zone)
+        return entry[1]
+
+    def nameservers(self, hostname):
+        """
+        Return the addresses of the authoritative nameservers of hostname.
+
+        :param hostname: fully qualified hostname
+        :return: list of IP addresses
+        :raises ResolutionError: if the nameservers could not be looked up
+        """
+        zone = self._cached(self._zones, hostname)
+        addresses = None if zone is None else self._cached(self._nameservers, zone)
+        if addresses is None:
+            addresses = self._lookup(hostname, zone)
+        return addresses
+
+    def query_many(self, hostname, rdtypes):
+        """
+        Return the addresses of the records of each of rdtypes of hostname.
+
+        The queries for all rdtypes are sent to a nameserver at once. The
+        nameservers are tried one after the other until all were answered.
+
+        :param hostname: fully qualified hostname
+        :param rdtypes: sequence of dnswire.A and dnswire.AAAA
+        :return: dictionary mapping each of rdtypes to a list of IP
+            addresses, empty if there are no such records
+        :raises ResolutionError: if no nameserver answered
+        """
+        results = {}
+        for nameserver in self.nameservers(hostname):
+            missing = [rdtype for rdtype in rdtypes if rdtype not in results]
+            queries = [dnswire.Query(nameserver, hostname, rdtype, port=self.port) for rdtype in missing]
+            try:
+                answers = self._client.query_many(queries)
+            except OSError as exc:
+                LOG.debug("Nameserver '%s' failed to answer for '%s'", nameserver, hostname, exc_info=exc)
+                continue
+            for rdtype, answer in zip(missing, answers):
+                if answer is None:
+                    LOG.debug("Nameserver '%s' failed to answer for '%s'", nameserver, hostname)
+                elif answer.rcode not in (dnswire.NOERROR, dnswire.NXDOMAIN):
+                    LOG.debug("Nameserver '%s' answered rcode %i for '%s'", nameserver, answer.rcode, hostname)
+                else:
+                    # CNAME chains within the zone are part of the answer section:
+                    results[rdtype] = answer.values(rdtype)
+            if len(results) == len(rdtypes):
+                return results
+        raise ResolutionError("No nameserver answered for '%s'" % hostname)
+
+    def query(self, hostname, rdtype):
+        """
+        Return the addresses of the rdtype records of hostname, see query_many().
+
+        :param hostname: fully qualified hostname
+        :param rdtype: dnswire.A or dnswire.AAAA
+        :return: list of IP addresses, empty if there are no such records
+        :raises ResolutionError: if no nameserver answered
+        """
+        return self.query_many(hostname, (rdtype,))[rdtype]
+
+    def resolve(self, hostname, family=AF_UNSPEC):
+        """
+        Resolve hostname to one or more IP addresses.
+
+        :param hostname: fully qualified hostname
+        :param family: AF_INET or AF_INET6 or AF_UNSPEC (default)
+        :return: tuple of unique IP addresses
+        :raises ResolutionError: if the authoritative nameservers could not be queried
+        """
+        results = self.query_many(hostname, _RDTYPES[family])
+        return tuple(sorted({address for addresses in results.values() for address in addresses}))
+
+
+_lock = threading.Lock()
+_shared = None
+
+
+def get_resolver():
+    """Return the AuthoritativeResolver shared by all detectors, creating it if needed."""
+    global _shared
+    with _lock:
+        if _shared is None:
+            _shared = AuthoritativeResolver()
+        return _shared
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""Exponential backoff with jitter."""
+
+import random
+
+
+class Backoff(object):
+    """
+    Compute growing delays between retries of a failing operation.
+
+    The n-th consecutive failure yields a delay drawn uniformly from the
+    upper half of min(cap, base * factor ** (n - 1)), so that many clients
+    failing at the same time do not retry in lockstep.
+    """
+
+    def __init__(self, base=60, cap=21600, factor=2, randfunc=random.uniform):
+        """
+        Initialize.
+
+        :param base: delay in seconds after the first failure
+        :param cap: maximum delay in seconds
+        :param factor: growth of the delay per consecutive failure
+        :param randfunc: callable(a, b) returning a random number between a and b
+        """
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self._randfunc = randfunc
+        self.failures = 0
+
+    def failure(self):
+        """
+        Record a failure.
+
+        :return: seconds to wait before the next attempt
+        """
+        self.failures += 1
+        delay = min(self.cap, self.base * self.factor ** (self.failures - 1))
+        return self._randfunc(delay / 2.0, delay)
+
+    def reset(self):
+        """Record a success."""
+        self.failures = 0
@@ -8,3 +8,7 @@ REQUEST_HEADERS_DEFAULT = {
     # dyndns2 standard requires that we set our own user agent:
     "User-Agent": "python-dyndnsc/%s" % __version__,
 }
+
+# connection pools of the shared HTTP session, see common.http:
+HTTP_POOL_CONNECTIONS = 10  # number of hosts to keep connection pools for
+HTTP_POOL_MAXSIZE = 10  # number of connections to keep per host
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+"""
+Deadlines of the work done by a thread, e.g. a single check of a client.
+
+The deadline is kept per thread, callables handed to other threads are
+wrapped with propagate() so that they are bound by the same deadline.
+"""
+
+import contextlib
+import functools
+import threading
+import time
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def _until(point):
+    previous = getattr(_local, "deadline", None)
+    if point is not None:
+        _local.deadline = point if previous is None else min(previous, point)
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def deadline(seconds):
+    """
+    Limit the time the work of the current thread within the block may take.
+
+    Nested deadlines never extend the enclosing one.
+
+    :param seconds: seconds from now, None does not limit the work
+    """
+    return _until(None if seconds is None else time.monotonic() + seconds)
+
+
+def remaining():
+    """Return the seconds left until the deadline of the current thread, None without a deadline."""
+    point = getattr(_local, "deadline", None)
+    if point is None:
+        return None
+    return point - time.monotonic()
+
+
+def propagate(func):
+    """
+    Return a callable running func within the deadline of the current thread.
+
+    :param func: callable to be run on another thread
+    """
+    point = getattr(_local, "deadline", None)
+    if point is None:
+        return func
+
+    @functools.wraps(func)
+    def bounded(*args, **kwargs):
+        with _until(point):
+            return func(*args, **kwargs)
+
+    return bounded
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+
+"""
+Minimal DNS client speaking the wire format directly.
+
+Only the small subset of RFC 1035 needed by the detectors is implemented:
+queries for A, AAAA and TXT records of the IN or CH class, sent over UDP and
+repeated over TCP if the answer was truncated. All queries of a batch are in
+flight at the same time on a single non-blocking socket per address family.
+"""
+
+from collections import namedtuple
+import logging
+import random
+import select
+import socket
+import struct
+import time
+
+LOG = logging.getLogger(__name__)
+
+# record types and classes:
+A = 1
+CNAME = 5
+TXT = 16
+AAAA = 28
+RDTYPES = {"A": A, "TXT": TXT, "AAAA": AAAA}
+IN = 1
+CH = 3
+RDCLASSES = {"IN": IN, "CH": CH}
+
+# response codes:
+NOERROR = 0
+SERVFAIL = 2
+NXDOMAIN = 3
+REFUSED = 5
+
+# header flags:
+FLAG_QR = 0x8000
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+
+_HEADER = struct.Struct("!HHHHHH")  # id, flags, qdcount, ancount, nscount, arcount
+_QUESTION = struct.Struct("!HH")  # type, class
+_RECORD = struct.Struct("!HHIH")  # type, class, ttl, rdlength
+_LENGTH = struct.Struct("!H")  # length prefix of messages over TCP
+
+# queries do not advertise EDNS, so conforming nameservers answer with at most
+# 512 bytes over UDP, the larger buffer copes with those that do not:
+_MAX_UDP_SIZE = 4096
+
+RESOLV_CONF = "/etc/resolv.conf"
+
+
+class DnsWireError(Exception):
+    """A query could not be answered or the answer could not be parsed."""
+
+
+class Query(namedtuple("Query", "nameserver qname rdtype rdclass port")):
+    """
+    A single question to a nameserver.
+
+    :param nameserver: IP address of the nameserver
+    :param qname: name to ask for
+    :param rdtype: record type, e.g. A
+    :param rdclass: record class, IN (default) or CH
+    :param port: port of the nameserver, 53 by default
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, nameserver, qname, rdtype, rdclass=IN, port=53):
+        """Create a query, see the class documentation."""
+        return super(Query, cls).__new__(cls, nameserver, qname, rdtype, rdclass, port)
+
+
+class Answer(namedtuple("Answer", "rcode truncated records")):
+    """
+    A parsed response.
+
+    :param rcode: response code, e.g. NOERROR or NXDOMAIN
+    :param truncated: True if the TC flag was set
+    :param records: tuple of (rdtype, ttl, value) tuples of the answer
+        section, value is the address of A and AAAA records, the joined
+        strings of TXT records and None otherwise
+    """
+
+    __slots__ = ()
+
+    def values(self, rdtype):
+        """Return the values of the records of rdtype in the answer section."""
+        return [value for record_type, _, value in self.records if record_type == rdtype]
+
+
+def encode_name(name):
+    """Return the wire format of the (absolute) domain name."""
+    try:
+        labels = name.rstrip(".").encode("idna").split(b".") if name.strip(".") else []
+    except UnicodeError as exc:
+        raise DnsWireError("Invalid name '%s': %s" % (name, exc))
+    wire = bytearray()
+    for label in labels:
+        if not 0 < len(label) < 64:
+            raise DnsWireError("Invalid label in name '%s'" % name)
+        wire.append(len(label))
+        wire += label
+    wire.append(0)
+    return bytes(wire)
+
+
+def encode_query(qid, qname, rdtype, rdclass=IN, recursion=True):
+    """
+    Return the wire format of a query.
+
+    :param qid: 16 bit message id
+    :param qname: name to ask for
+    :param rdtype: record type
+    :param rdclass: record class
+    :param recursion: set the RD flag asking for recursion
+    """
+    flags = FLAG_RD if recursion else 0
+    return _HEADER.pack(qid, flags, 1, 0, 0, 0) + encode_name(qname) + _QUESTION.pack(rdtype, rdclass)
+
+
+def _skip_name(data, offset):
+    """Return the offset following the possibly compressed name at offset."""
+    while True:
+        if offset >= len(data):
+            raise DnsWireError("Name exceeds the message")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length & 0xC0:
+            raise DnsWireError("Invalid label type 0x%02x" % length)
+        if length == 0:
+            return offset + 1
+        offset += 1 + length
+
+
+def _rdata_value(rdtype, rdata):
+    if rdtype == A and len(rdata) == 4:
+        return socket.inet_ntop(socket.AF_INET, rdata)
+    if rdtype == AAAA and len(rdata) == 16:
+        return socket.inet_ntop(socket.AF_INET6, rdata)
+    if rdtype == TXT:
+        strings, offset = [], 0
+        while offset < len(rdata):
+            length = rdata[offset]
+            strings.append(rdata[offset + 1:offset + 1 + length])
+            offset += 1 + length
+        return b"".join(strings).decode("ascii", "replace")
+    return None
+
+
+def decode_response(data):
+    """
+    Parse the header and the answer section of a response.
+
+    :param data: bytes of the response
+    :return: tuple of the message id and an Answer
+    :raises DnsWireError: if data is not a valid response
+    """
+    if len(data) < _HEADER.size:
+        raise DnsWireError("Response too short")
+    qid, flags, qdcount, ancount, _, _ = _HEADER.unpack_from(data)
+    if not flags & FLAG_QR:
+        raise DnsWireError("Not a response")
+    offset = _HEADER.size
+    try:
+        for _ in range(qdcount):
+            offset = _skip_name(data, offset) + _QUESTION.size
+        if offset > len(data):
+            raise DnsWireError("Question exceeds the message")
+        records = []
+        for _ in range(ancount):
+            offset = _skip_name(data, offset)
+            rdtype, _, ttl, rdlength = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            if offset + rdlength > len(data):
+                raise DnsWireError("Record exceeds the message")
+            records.append((rdtype, ttl, _rdata_value(rdtype, data[offset:offset + rdlength])))
+            offset += rdlength
+    except struct.error:
+        raise DnsWireError("Truncated response")
+    return qid, Answer(flags & 0x000F, bool(flags & FLAG_TC), tuple(records))
+
+
+def system_nameservers(path=RESOLV_CONF):
+    """
+    Return the addresses of the recursive nameservers configured in resolv.conf.
+
+    Where there is no resolv.conf, e.g. on Windows, the configuration is
+    taken from dnspython, which is only imported in that case.
+
+    :param path: path of resolv.conf
+    :return: list of IP addresses
+    """
+    try:
+        with open(path) as conf:
+            lines = conf.readlines()
+    except OSError:
+        import dns.resolver
+        try:
+            return list(dns.resolver.Resolver().nameservers)
+        except dns.resolver.NoResolverConfiguration:
+            lines = []
+    nameservers = [fields[1] for fields in (line.split() for line in lines)
+                   if len(fields) > 1 and fields[0] == "nameserver"]
+    # like the C library, use a nameserver on the local machine if none is configured:
+    return nameservers or ["127.0.0.1"]
+
+
+def _family(nameserver):
+    return socket.AF_INET6 if ":" in nameserver else socket.AF_INET
+
+
+def _packed(address):
+    """Return the binary form of address, so that differently written addresses compare equal."""
+    address = address.split("%", 1)[0]
+    return socket.inet_pton(_family(address), address)
+
+
+def _recv_exactly(sock, length):
+    data = b""
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise DnsWireError("Connection closed by the nameserver")
+        data += chunk
+    return data
+
+
+class Client(object):
+    """
+    Send queries and wait for their answers.
+
+    Queries are matched to responses by message id, nameserver and question,
+    so that unrelated or spoofed datagrams are ignored.
+    """
+
+    def __init__(self, timeout=2.0):
+        """
+        Initialize.
+
+        :param timeout: seconds to wait for the answers of a batch of queries
+        """
+        self.timeout = timeout
+        self._random = random.SystemRandom()
+
+    def _tcp(self, query, wire):
+        """Send the query over TCP and return the Answer."""
+        with socket.create_connection((query.nameserver, query.port), timeout=self.timeout) as sock:
+            sock.sendall(_LENGTH.pack(len(wire)) + wire)
+            length = _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))[0]
+            return decode_response(_recv_exactly(sock, length))[1]
+
+    def query_many(self, queries):
+        """
+        Send all queries at once and return their answers.
+
+        Truncated answers are repeated over TCP once all UDP answers arrived.
+
+        :param queries: list of Query instances
+        :return: list of an Answer for every query, None for queries that
+            were not answered in time
+        """
+        answers = [None] * len(queries)
+        sockets = {}
+        pending = {}  # (id, packed nameserver, port) -> (index, question)
+        wires = []
+        try:
+            for index, query in enumerate(queries):
+                family = _family(query.nameserver)
+                if family not in sockets:
+                    sockets[family] = socket.socket(family, socket.SOCK_DGRAM)
+                    sockets[family].setblocking(False)
+                qid = self._random.getrandbits(16)
+                while (qid, _packed(query.nameserver), query.port) in pending:
+                    qid = self._random.getrandbits(16)
+                wire = encode_query(qid, query.qname, query.rdtype, query.rdclass)
+                wires.append(wire)
+                try:
+                    sockets[family].sendto(wire, (query.nameserver, query.port))
+                except OSError as exc:
+                    LOG.debug("Could not send query to '%s'", query.nameserver, exc_info=exc)
+                    continue
+                pending[(qid, _packed(query.nameserver), query.port)] = (index, wire[_HEADER.size:])
+            deadline = time.monotonic() + self.timeout
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    LOG.debug("No answer to %i queries within %s seconds", len(pending), self.timeout)
+                    break
+                readable, _, _ = select.select(list(sockets.values()), [], [], remaining)
+                for sock in readable:
+                    self._receive(sock, pending, answers)
+        finally:
+            for sock in sockets.values():
+                sock.close()
+        for index, answer in enumerate(answers):
+            if answer is not None and answer.truncated:
+                LOG.debug("Truncated answer from '%s', retrying over TCP", queries[index].nameserver)
+                try:
+                    answers[index] = self._tcp(queries[index], wires[index])
+                except (DnsWireError, OSError) as exc:
+                    LOG.debug("TCP query to '%s' failed", queries[index].nameserver, exc_info=exc)
+                    answers[index] = None
+        return answers
+
+    @staticmethod
+    def _receive(sock, pending, answers):
+        """Read all datagrams available on sock and store the expected answers."""
+        while True:
+            try:
+                data, address = sock.recvfrom(_MAX_UDP_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as exc:
+                # e.g. ICMP port unreachable reported by a previous send
+                LOG.debug("Receiving failed", exc_info=exc)
+                return
+            try:
+                qid, answer = decode_response(data)
+            except DnsWireError as exc:
+                LOG.debug("Ignoring invalid datagram from '%s': %s", address[0], exc)
+                continue
+            key = (qid, _packed(address[0]), address[1])
+            if key not in pending or not data.startswith(pending[key][1], _HEADER.size):
+                LOG.debug("Ignoring unexpected datagram from '%s'", address[0])
+                continue
+            answers[pending.pop(key)[0]] = answer
+
+    def query(self, nameserver, qname, rdtype, rdclass=IN, port=53):
+        """
+        Send a single query and return its answer.
+
+        :raises DnsWireError: if the nameserver did not answer in time
+        """
+        answer = self.query_many([Query(nameserver, qname, rdtype, rdclass, port)])[0]
+        if answer is None:
+            raise DnsWireError("No answer from '%s' for '%s'" % (nameserver, qname))
+        return answer
+
+    async def aquery(self, nameserver, qname, rdtype, rdclass=IN, port=53):
+        """
+        Send a single query like query(), using the running event loop.
+
+        :raises DnsWireError: if the nameserver did not answer in time
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        qid = self._random.getrandbits(16)
+        wire = encode_query(qid, qname, rdtype, rdclass)
+        future = loop.create_future()
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(qid, wire[_HEADER.size:], future),
+                remote_addr=(nameserver, port), family=_family(nameserver))
+        except OSError as exc:
+            raise DnsWireError("Could not send query to '%s': %s" % (nameserver, exc))
+        try:
+            transport.sendto(wire)
+            answer = await asyncio.wait_for(future, self.timeout)
+        except (asyncio.TimeoutError, OSError) as exc:
+            raise DnsWireError("No answer from '%s' for '%s': %r" % (nameserver, qname, exc))
+        finally:
+            transport.close()
+        if answer.truncated:
+            LOG.debug("Truncated answer from '%s', retrying over TCP", nameserver)
+            try:
+                answer = await asyncio.wait_for(self._atcp(nameserver, port, wire), self.timeout)
+            except (asyncio.TimeoutError, OSError) as exc:
+                raise DnsWireError("TCP query to '%s' failed: %r" % (nameserver, exc))
+        return answer
+
+    @staticmethod
+    async def _atcp(nameserver, port, wire):
+        import asyncio
+
+        reader, writer = await asyncio.open_connection(nameserver, port)
+        try:
+            writer.write(_LENGTH.pack(len(wire)) + wire)
+            length = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))[0]
+            return decode_response(await reader.readexactly(length))[1]
+        except asyncio.IncompleteReadError:
+            raise DnsWireError("Connection closed by '%s'" % nameserver)
+        finally:
+            writer.close()
+
+
+class _DatagramProtocol(object):
+    """
+    Resolve future with the answer to the query with qid and question.
+
+    Implements asyncio.DatagramProtocol without subclassing it, so that
+    asyncio is only imported when queries are sent using an event loop.
+    """
+
+    def __init__(self, qid, question, future):
+        self.qid = qid
+        self.question = question
+        self.future = future
+
+    def connection_made(self, transport):
+        pass
+
+    def connection_lost(self, exc):
+        pass
+
+    def datagram_received(self, data, addr):
+        try:
+            qid, answer = decode_response(data)
+        except DnsWireError as exc:
+            LOG.debug("Ignoring invalid datagram from '%s': %s", addr[0], exc)
+            return
+        if qid == self.qid and data.startswith(self.question, _HEADER.size) and not self.future.done():
+            self.future.set_result(answer)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+"""Track the health of remote endpoints and prefer the healthy ones."""
+
+import logging
+import random
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+STATE_SECTION = "endpoints"
+
+
+class EndpointHealth(object):
+    """Latency, error rate and circuit breaker state of a single endpoint."""
+
+    def __init__(self, latency=None, error_rate=0.0, failures=0, open_until=None, disagreements=0):
+        """
+        Initialize.
+
+        :param latency: moving average of the latency in seconds, None if unknown
+        :param error_rate: moving average of failed requests, between 0 and 1
+        :param failures: number of consecutive failures
+        :param open_until: point in time until which the endpoint is not used
+        :param disagreements: number of answers contradicting a quorum of other endpoints
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.failures = failures
+        self.open_until = open_until
+        self.disagreements = disagreements
+
+    def as_dict(self):
+        """Return the state as JSON serializable dictionary."""
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "failures": self.failures,
+            "open_until": self.open_until,
+            "disagreements": self.disagreements,
+        }
+
+
+class HealthTracker(object):
+    """
+    Keep track of the health of endpoints such as webcheck URLs.
+
+    Latency and error rate are exponentially weighted moving averages. After
+    a number of consecutive failures, the circuit breaker of an endpoint
+    opens and the endpoint is skipped for cooldown seconds. Afterwards, it
+    is given another chance and the breaker opens again on the next failure.
+
+    Endpoints are chosen randomly, weighted by their success rate divided by
+    their latency, so that fast and reliable endpoints are preferred without
+    starving the others of the requests needed to measure them.
+    """
+
+    def __init__(self, alpha=0.3, failure_threshold=3, cooldown=3600, default_latency=1.0,
+                 timefunc=time.time, randfunc=random.random):
+        """
+        Initialize.
+
+        :param alpha: weight of a new measurement in the moving averages
+        :param failure_threshold: consecutive failures opening the circuit breaker
+        :param cooldown: seconds an endpoint is skipped once its breaker opened
+        :param default_latency: latency in seconds assumed for unknown endpoints
+        :param timefunc: callable returning the current time in seconds
+        :param randfunc: callable returning a random float between 0 and 1
+        """
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.default_latency = default_latency
+        self._timefunc = timefunc
+        self._randfunc = randfunc
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._state_store = None
+
+    def attach(self, state_store):
+        """
+        Load the persisted health of endpoints and persist all further changes.
+
+        :param state_store: StateStore instance
+        """
+        with self._lock:
+            for endpoint, state in state_store.items(STATE_SECTION).items():
+                try:
+                    self._endpoints[endpoint] = EndpointHealth(**state)
+                except TypeError:
+                    LOG.debug("Ignoring invalid health state %r of '%s'", state, endpoint)
+            self._state_store = state_store
+
+    def get(self, endpoint):
+        """Return the EndpointHealth of endpoint."""
+        with self._lock:
+            return self._endpoints.setdefault(endpoint, EndpointHealth())
+
+    def record(self, endpoint, ok, latency=None):
+        """
+        Record the outcome of a request to endpoint.
+
+        :param endpoint: endpoint identifier, e.g. an URL
+        :param ok: True if the request succeeded
+        :param latency: seconds the request took
+        """
+        with self._lock:
+            health = self._endpoints.setdefault(endpoint, EndpointHealth())
+            health.error_rate += self.alpha * ((0.0 if ok else 1.0) - health.error_rate)
+            if latency is not None:
+                if health.latency is None:
+                    health.latency = latency
+                else:
+                    health.latency += self.alpha * (latency - health.latency)
+            if ok:
+                health.failures = 0
+                health.open_until = None
+            else:
+                health.failures += 1
+                if health.failures >= self.failure_threshold:
+                    health.open_until = self._timefunc() + self.cooldown
+                    LOG.info("Skipping '%s' for %s seconds after %i consecutive failures",
+                             endpoint, self.cooldown, health.failures)
+            state_store = self._state_store
+            state = health.as_dict()
+        if state_store is not None:
+            state_store.set(endpoint, state, section=STATE_SECTION)
+
+    def record_disagreement(self, endpoint):
+        """
+        Record that endpoint answered differently than a quorum of other endpoints.
+
+        :param endpoint: endpoint identifier, e.g. an URL
+        """
+        with self._lock:
+            health = self._endpoints.setdefault(endpoint, EndpointHealth())
+            health.disagreements += 1
+            LOG.info("'%s' disagreed with the quorum %i time(s)", endpoint, health.disagreements)
+            state_store = self._state_store
+            state = health.as_dict()
+        if state_store is not None:
+            state_store.set(endpoint, state, section=STATE_SECTION)
+
+    def available(self, endpoint):
+        """Return False while the circuit breaker of endpoint is open."""
+        open_until = self.get(endpoint).open_until
+        return open_until is None or self._timefunc() >= open_until
+
+    def weight(self, endpoint):
+        """Return the selection weight of endpoint, higher is better."""
+        health = self.get(endpoint)
+        latency = self.default_latency if health.latency is None else health.latency
+        # never let an endpoint drop out completely, it might have recovered:
+        return max(1.0 - health.error_rate, 0.01) / max(latency, 0.01)
+
+    def choose(self, endpoints, count=1, key=None):
+        """
+        Choose count endpoints randomly, weighted by their health.
+
+        Endpoints with an open circuit breaker are only chosen if no other
+        endpoints are left.
+
+        :param endpoints: sequence of endpoints
+        :param count: number of endpoints to choose
+        :param key: callable returning the endpoint identifier of an item of
+            endpoints, by default the items are the identifiers
+        :return: list of at most count distinct items of endpoints
+        """
+        key = key or (lambda item: item)
+        available = [item for item in endpoints if self.available(key(item))]
+        chosen = self._sample(available, count, key)
+        if len(chosen) < count:
+            unavailable = [item for item in endpoints if item not in available]
+            chosen.extend(self._sample(unavailable, count - len(chosen), key))
+        return chosen
+
+    def _sample(self, candidates, count, key):
+        candidates = list(candidates)
+        weights = [self.weight(key(item)) for item in candidates]
+        chosen = []
+        while candidates and len(chosen) < count:
+            target = self._randfunc() * sum(weights)
+            index = 0
+            while index < len(candidates) - 1 and target >= weights[index]:
+                target -= weights[index]
+                index += 1
+            chosen.append(candidates.pop(index))
+            weights.pop(index)
+        return chosen
+
+
+# shared by all detectors of this process:
+TRACKER = HealthTracker()
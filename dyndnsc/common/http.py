@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared HTTP session for all detectors and updaters.
+
+Connections are kept alive and pooled per host, so that e.g. a webcheck and
+an update against the same service reuse one connection, including its TLS
+handshake.
+"""
+
+import logging
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import constants, deadlines
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = constants.HTTP_POOL_CONNECTIONS
+DEFAULT_POOL_MAXSIZE = constants.HTTP_POOL_MAXSIZE
+
+_lock = threading.Lock()
+_sessions = {}  # address family or None -> requests.Session
+_pool_connections = DEFAULT_POOL_CONNECTIONS
+_pool_maxsize = DEFAULT_POOL_MAXSIZE
+
+
+def configure(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """
+    Configure the connection pools of the shared session.
+
+    Closes the current session, the next request uses a new one.
+
+    :param pool_connections: number of hosts to keep connection pools for
+    :param pool_maxsize: number of connections to keep per host, should be at
+        least the number of concurrent requests to a single host
+    """
+    global _pool_connections, _pool_maxsize
+    with _lock:
+        _pool_connections = pool_connections
+        _pool_maxsize = pool_maxsize
+    close()
+
+
+class FamilyAdapter(HTTPAdapter):
+    """
+    HTTPAdapter connecting over a single address family only.
+
+    Sockets are bound to the wildcard address of the family before they
+    connect, so that urllib3 skips the addresses of the other family right
+    away instead of trying to connect to them.
+    """
+
+    def __init__(self, family, **kwargs):
+        """
+        Initialize.
+
+        :param family: AF_INET or AF_INET6
+        :param kwargs: passed on to HTTPAdapter
+        """
+        self.family = family
+        super(FamilyAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        """Create the pool manager, binding its connections to the address family."""
+        kwargs["source_address"] = ("::" if self.family == socket.AF_INET6 else "0.0.0.0", 0)
+        super(FamilyAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+def get_session(family=None):
+    """
+    Return the shared requests.Session, creating it if needed.
+
+    :param family: AF_INET or AF_INET6 for a session connecting over this
+        address family only, None for any address family
+    """
+    with _lock:
+        if family not in _sessions:
+            LOG.debug("Creating HTTP session for family %r with %i pools of %i connections",
+                      family, _pool_connections, _pool_maxsize)
+            session = requests.Session()
+            session.headers.update(constants.REQUEST_HEADERS_DEFAULT)
+            if family is None:
+                adapter = HTTPAdapter(pool_connections=_pool_connections, pool_maxsize=_pool_maxsize)
+            else:
+                adapter = FamilyAdapter(family, pool_connections=_pool_connections, pool_maxsize=_pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[family] = session
+        return _sessions[family]
+
+
+def close():
+    """Close all pooled connections of the shared sessions."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+# limits the requests sent by the current thread, see deadlines.deadline():
+deadline = deadlines.deadline
+
+
+def timeout(default=None):
+    """
+    Return the timeout for a request sent by the current thread now.
+
+    :param default: timeout in seconds without a deadline, None for no timeout
+    :return: the smaller of default and the seconds left until the deadline
+    :raises requests.Timeout: if the deadline passed
+    """
+    left = deadlines.remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise requests.exceptions.Timeout("Deadline passed before sending the request")
+    return left if default is None else min(default, left)
+
+
+def get(url, family=None, **kwargs):
+    """
+    Send a GET request using the shared session.
+
+    The timeout is cut down to the deadline of the current thread, see deadline().
+
+    :param url: URL
+    :param family: AF_INET or AF_INET6 to connect over this address family
+        only, None for any address family
+    :param kwargs: passed on to requests.Session.get()
+    :return: requests.Response
+    """
+    kwargs["timeout"] = timeout(kwargs.get("timeout"))
+    return get_session(family).get(url, **kwargs)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""Snapshot of the addresses of all network interfaces, shared by the iface detectors."""
+
+import ipaddress
+import logging
+import socket
+import threading
+import time
+
+from . import netlink
+
+LOG = logging.getLogger(__name__)
+
+# seconds a snapshot is used, long enough to serve all detectors of a round of checks:
+DEFAULT_MAX_AGE = 1.0
+
+
+def _prefixlen(netmask):
+    """Return the prefix length of a netifaces netmask like '255.255.255.0' or 'ffff:ffff::/32'."""
+    if "/" in netmask:
+        return int(netmask.rsplit("/", 1)[1])
+    return bin(int(ipaddress.ip_address(netmask))).count("1")
+
+
+def _netifaces_addresses():
+    """Return the addresses of all interfaces by name, as reported by netifaces."""
+    import netifaces
+    interfaces = {}
+    for name in netifaces.interfaces():
+        try:
+            index = socket.if_nametoindex(name)
+        except (AttributeError, OSError):
+            index = None
+        addresses = interfaces[name] = []
+        for family, netifaces_family in ((socket.AF_INET, netifaces.AF_INET), (socket.AF_INET6, netifaces.AF_INET6)):
+            for pair in netifaces.ifaddresses(name).get(netifaces_family, ()):
+                # link local ipv6 addresses carry the scope, e.g. 'fe80::1%eth0':
+                address = pair.get("addr", "").split("%", 1)[0]
+                try:
+                    interface = ipaddress.ip_interface(address)
+                    if pair.get("netmask"):
+                        interface = ipaddress.ip_interface((interface.ip, _prefixlen(pair["netmask"])))
+                except (TypeError, ValueError) as exc:
+                    LOG.debug("Found invalid IP '%s' on interface '%s'!?", pair.get("addr"), name, exc_info=exc)
+                    continue
+                addresses.append(netlink.InterfaceAddress(index, family, interface, 0, None, None))
+    return interfaces
+
+
+def _netlink_addresses():
+    """Return the addresses of all interfaces by name, using a single rtnetlink dump."""
+    names = dict(socket.if_nameindex())
+    interfaces = {name: [] for name in names.values()}
+    for address in netlink.dump_addresses():
+        if address.index in names:
+            interfaces[names[address.index]].append(address)
+    return interfaces
+
+
+class AddressSnapshot(object):
+    """
+    Keep the addresses of all network interfaces for a short time.
+
+    On Linux, the addresses of all interfaces are taken with a single
+    rtnetlink RTM_GETADDR dump, already parsed into InterfaceAddress tuples
+    with their prefix, flags and lifetimes. Elsewhere, or if rtnetlink
+    fails, netifaces is used instead. All detectors checked within max_age
+    seconds are served from the same snapshot.
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE, timefunc=time.monotonic):
+        """
+        Initialize.
+
+        :param max_age: seconds a snapshot is used
+        :param timefunc: callable returning the current time in seconds
+        """
+        self.max_age = max_age
+        self._timefunc = timefunc
+        self._lock = threading.Lock()
+        self._taken = None
+        self._interfaces = None  # name -> list of InterfaceAddress
+        self.snapshots = 0
+
+    def invalidate(self):
+        """Take a new snapshot on the next lookup, e.g. because addresses changed."""
+        with self._lock:
+            self._interfaces = None
+
+    def _take(self):
+        if netlink.available():
+            try:
+                return _netlink_addresses()
+            except OSError as exc:
+                LOG.debug("rtnetlink address dump failed, falling back to netifaces", exc_info=exc)
+        return _netifaces_addresses()
+
+    def interfaces(self):
+        """Return a dictionary mapping interface names to lists of InterfaceAddress."""
+        with self._lock:
+            now = self._timefunc()
+            if self._interfaces is None or now - self._taken >= self.max_age:
+                self._interfaces = self._take()
+                self._taken = now
+                self.snapshots += 1
+            return self._interfaces
+
+    def addresses(self, iface, family):
+        """
+        Return the addresses of the family assigned to the interface.
+
+        :param iface: interface name
+        :param family: AF_INET or AF_INET6
+        :return: list of InterfaceAddress, None if there is no such interface
+        """
+        addresses = self.interfaces().get(iface)
+        if addresses is None:
+            return None
+        return [address for address in addresses if address.family == family]
+
+
+# shared by all detectors of this process:
+SNAPSHOT = AddressSnapshot()
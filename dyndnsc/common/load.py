@@ -31,3 +31,27 @@ def find_class(name, classes):
     if cls is None:
         raise ValueError("No class named '%s' could be found" % name)
     return cls
+
+
+def load_builtin_class(name, builtins):
+    """Return class identified by configuration key ``name``, importing only its module.
+
+    :param name: configuration key
+    :param builtins: iterable of (configuration key, module name, class name) tuples
+    """
+    name = name.lower()
+    for key, module_name, class_name in builtins:
+        if key == name:
+            cls = load_class(module_name, class_name)
+            if cls is not None:
+                return cls
+            break
+    raise ValueError("No class named '%s' could be found" % name)
+
+
+def load_builtin_classes(builtins):
+    """Return set of all classes that can be imported.
+
+    :param builtins: iterable of (configuration key, module name, class name) tuples
+    """
+    return {plug for plug in (load_class(m, c) for _, m, c in builtins) if plug is not None}
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+"""
+Minimal Linux rtnetlink client for address and route change notifications.
+
+Only the small subset of rtnetlink needed to learn about changed addresses
+and routes and to dump the addresses of all interfaces is implemented, see
+rtnetlink(7).
+"""
+
+import errno
+import ipaddress
+import itertools
+import logging
+import os
+import socket
+import struct
+import threading
+from collections import namedtuple
+
+LOG = logging.getLogger(__name__)
+
+NETLINK_ROUTE = 0
+
+# multicast groups, see linux/rtnetlink.h:
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+
+# message types:
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+
+# message flags:
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+# address attributes, see linux/if_addr.h:
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_CACHEINFO = 6
+IFA_FLAGS = 8
+
+# address flags:
+IFA_F_TEMPORARY = 0x01  # IFA_F_SECONDARY for ipv4
+IFA_F_DEPRECATED = 0x20
+IFA_F_TENTATIVE = 0x40
+IFA_F_PERMANENT = 0x80
+
+INFINITY_LIFE_TIME = 0xFFFFFFFF
+
+ADDR_EVENTS = (RTM_NEWADDR, RTM_DELADDR)
+ROUTE_EVENTS = (RTM_NEWROUTE, RTM_DELROUTE)
+
+_NLMSGHDR = struct.Struct("=LHHLL")  # length, type, flags, seq, pid
+_IFADDRMSG = struct.Struct("=BBBBi")  # family, prefixlen, flags, scope, index
+_RTMSG = struct.Struct("=BBBBBBBBI")  # family, dst_len, src_len, tos, table, protocol, scope, type, flags
+_RTATTR = struct.Struct("=HH")  # length, type
+_IFA_CACHEINFO = struct.Struct("=IIII")  # preferred, valid, cstamp, tstamp
+_NLMSGERR = struct.Struct("=i")  # negative errno
+
+_sequence = itertools.count(1)
+
+
+class NetlinkEvent(namedtuple("NetlinkEvent", "type family index")):
+    """
+    An address or route change.
+
+    :param type: message type, one of RTM_NEWADDR, RTM_DELADDR, RTM_NEWROUTE, RTM_DELROUTE
+    :param family: address family
+    :param index: interface index for address events, None for route events
+    """
+
+
+class InterfaceAddress(namedtuple("InterfaceAddress", "index family interface flags preferred valid")):
+    """
+    An address assigned to a network interface.
+
+    :param index: interface index
+    :param family: address family
+    :param interface: ipaddress.IPv4Interface or IPv6Interface, the address
+        and the prefix of its network
+    :param flags: IFA_F_* flags
+    :param preferred: remaining preferred lifetime in seconds, None if forever
+    :param valid: remaining valid lifetime in seconds, None if forever
+    """
+
+    __slots__ = ()
+
+    @property
+    def address(self):
+        """Return the address as string."""
+        return str(self.interface.ip)
+
+    @property
+    def temporary(self):
+        """Return True for temporary ipv6 addresses, see RFC 4941."""
+        return self.family == socket.AF_INET6 and bool(self.flags & IFA_F_TEMPORARY)
+
+    @property
+    def deprecated(self):
+        """Return True if the address should not be used for new connections."""
+        return bool(self.flags & IFA_F_DEPRECATED) or self.preferred == 0
+
+    @property
+    def tentative(self):
+        """Return True if duplicate address detection has not finished yet."""
+        return bool(self.flags & IFA_F_TENTATIVE)
+
+
+def available():
+    """Return True if rtnetlink is available on this system."""
+    return hasattr(socket, "AF_NETLINK")
+
+
+def align(length):
+    """Return length rounded up to the netlink alignment of 4 bytes."""
+    return (length + 3) & ~3
+
+
+def iter_messages(data):
+    """
+    Split a netlink datagram into its messages.
+
+    :param data: bytes received from a netlink socket
+    :return: generator of (type, flags, seq, payload) tuples
+    """
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, flags, seq, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size or offset + length > len(data):
+            LOG.debug("Truncated netlink message at offset %i", offset)
+            return
+        yield msg_type, flags, seq, data[offset + _NLMSGHDR.size:offset + length]
+        offset += align(length)
+
+
+def parse_events(data):
+    """
+    Parse the address and route change events in a netlink datagram.
+
+    :param data: bytes received from a netlink socket
+    :return: list of NetlinkEvent
+    """
+    events = []
+    for msg_type, _, _, payload in iter_messages(data):
+        if msg_type in ADDR_EVENTS and len(payload) >= _IFADDRMSG.size:
+            family, _, _, _, index = _IFADDRMSG.unpack_from(payload)
+            events.append(NetlinkEvent(msg_type, family, index))
+        elif msg_type in ROUTE_EVENTS and len(payload) >= _RTMSG.size:
+            family = _RTMSG.unpack_from(payload)[0]
+            events.append(NetlinkEvent(msg_type, family, None))
+    return events
+
+
+def iter_attributes(data, offset=0):
+    """
+    Split the routing attributes following offset in a message payload.
+
+    :return: generator of (type, payload) tuples
+    """
+    while offset + _RTATTR.size <= len(data):
+        length, attr_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size or offset + length > len(data):
+            return
+        yield attr_type, data[offset + _RTATTR.size:offset + length]
+        offset += align(length)
+
+
+def _lifetime(seconds):
+    return None if seconds == INFINITY_LIFE_TIME else seconds
+
+
+def parse_addresses(data):
+    """
+    Parse the RTM_NEWADDR messages in a netlink datagram.
+
+    :param data: bytes received from a netlink socket
+    :return: list of InterfaceAddress
+    """
+    addresses = []
+    for msg_type, _, _, payload in iter_messages(data):
+        if msg_type != RTM_NEWADDR or len(payload) < _IFADDRMSG.size:
+            continue
+        family, prefixlen, flags, _, index = _IFADDRMSG.unpack_from(payload)
+        if family not in (socket.AF_INET, socket.AF_INET6):
+            continue
+        attributes = dict(iter_attributes(payload, _IFADDRMSG.size))
+        # IFA_ADDRESS is the peer of point to point links, IFA_LOCAL is ours:
+        packed = attributes.get(IFA_LOCAL, attributes.get(IFA_ADDRESS))
+        if packed is None or len(packed) != (4 if family == socket.AF_INET else 16):
+            continue
+        if len(attributes.get(IFA_FLAGS, b"")) >= 4:
+            flags = struct.unpack_from("=I", attributes[IFA_FLAGS])[0]
+        preferred = valid = None
+        if len(attributes.get(IFA_CACHEINFO, b"")) >= _IFA_CACHEINFO.size:
+            cacheinfo = _IFA_CACHEINFO.unpack_from(attributes[IFA_CACHEINFO])
+            preferred, valid = _lifetime(cacheinfo[0]), _lifetime(cacheinfo[1])
+        interface = ipaddress.ip_interface((ipaddress.ip_address(packed), prefixlen))
+        addresses.append(InterfaceAddress(index, family, interface, flags, preferred, valid))
+    return addresses
+
+
+def dump_addresses(family=socket.AF_UNSPEC):
+    """
+    Return the addresses of all interfaces using a single RTM_GETADDR dump.
+
+    :param family: AF_INET, AF_INET6 or AF_UNSPEC (default) for both
+    :return: list of InterfaceAddress in the order reported by the kernel
+    :raises OSError: if the dump failed
+    """
+    seq = next(_sequence)
+    request = _IFADDRMSG.pack(family, 0, 0, 0, 0)
+    header = _NLMSGHDR.pack(_NLMSGHDR.size + len(request), RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, seq, 0)
+    addresses = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as sock:
+        sock.settimeout(5)
+        sock.bind((0, 0))
+        sock.send(header + request)
+        while True:
+            data = sock.recv(65536)
+            addresses.extend(parse_addresses(data))
+            for msg_type, _, msg_seq, payload in iter_messages(data):
+                if msg_seq != seq:
+                    continue
+                if msg_type == NLMSG_DONE:
+                    return addresses
+                if msg_type == NLMSG_ERROR and len(payload) >= _NLMSGERR.size:
+                    error = -_NLMSGERR.unpack_from(payload)[0]
+                    if error:
+                        raise OSError(error, os.strerror(error))
+
+
+class NetlinkMonitor(object):
+    """
+    Listen for rtnetlink notifications in a background thread.
+
+    The callback is called from that thread with a NetlinkEvent, or with
+    None if notifications were lost and any state might have changed.
+    """
+
+    def __init__(self, groups, callback):
+        """
+        Initialize.
+
+        :param groups: bitmask of RTMGRP_* multicast groups to subscribe to
+        :param callback: callable taking a NetlinkEvent or None
+        """
+        self.groups = groups
+        self.callback = callback
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        """Open the netlink socket and start listening."""
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self._sock.bind((0, self.groups))
+        self._sock.settimeout(1)  # so that stop() is noticed
+        self._thread = threading.Thread(target=self._run, name="netlink", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop listening."""
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+
+    def _run(self):
+        while True:
+            sock = self._sock
+            if sock is None:
+                break  # stopped
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError as exc:
+                if self._sock is None:
+                    break  # closed by stop()
+                if exc.errno == errno.ENOBUFS:
+                    LOG.debug("netlink receive buffer overrun, notifications were lost")
+                    self._dispatch(None)
+                    continue
+                LOG.error("netlink monitor failed", exc_info=exc)
+                break
+            for event in parse_events(data):
+                self._dispatch(event)
+
+    def _dispatch(self, event):
+        try:
+            self.callback(event)
+        except Exception as exc:
+            LOG.error("Exception in netlink event handler", exc_info=exc)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""Run several equivalent blocking calls at once and use the fastest answer."""
+
+from concurrent import futures
+import logging
+import time
+
+from . import deadlines
+
+LOG = logging.getLogger(__name__)
+
+
+def _not_none(result):
+    return result is not None
+
+
+def first(calls, accept=_not_none, timeout=None):
+    """
+    Run the calls concurrently and return the first acceptable result.
+
+    Calls that did not start yet are cancelled as soon as an acceptable
+    result is known, calls already running are abandoned and their results
+    ignored. Exceptions raised by a call count as unacceptable results.
+    The calls run within the deadline of the calling thread.
+
+    :param calls: list of callables without arguments
+    :param accept: callable returning True for acceptable results, by
+        default anything but None is acceptable
+    :param timeout: seconds to wait for an acceptable result
+    :return: the first acceptable result or None
+    """
+    return quorum(calls, 1, accept=accept, timeout=timeout)[0]
+
+
+def quorum(calls, needed, accept=_not_none, timeout=None):
+    """
+    Run the calls concurrently and return the first result returned by needed calls.
+
+    Like first(), remaining calls are cancelled or abandoned as soon as the
+    outcome is known, i.e. the latency is bounded by the fastest calls that
+    agree. Results must be hashable.
+
+    :param calls: list of callables without arguments
+    :param needed: number of calls that must agree on a result
+    :param accept: callable returning True for acceptable results, by
+        default anything but None is acceptable
+    :param timeout: seconds to wait for a quorum
+    :return: tuple of the agreed result or None and a dictionary mapping the
+        index of each completed call to its result, None for exceptions
+    """
+    answers = {}
+    if not calls or needed > len(calls):
+        return None, answers
+    executor = futures.ThreadPoolExecutor(max_workers=len(calls))
+    pending = {executor.submit(deadlines.propagate(call)): index for index, call in enumerate(calls)}
+    votes = {}
+    try:
+        for future in futures.as_completed(pending, timeout=timeout):
+            result, accepted = None, False
+            try:
+                result = future.result()
+                accepted = accept(result)
+            except Exception as exc:
+                LOG.debug("Raced call failed", exc_info=exc)
+            answers[pending[future]] = result
+            if accepted:
+                votes[result] = votes.get(result, 0) + 1
+                if votes[result] >= needed:
+                    return result, answers
+            if max(votes.values(), default=0) + len(calls) - len(answers) < needed:
+                LOG.debug("No quorum of %i possible anymore: %r", needed, answers)
+                break
+    except futures.TimeoutError:
+        LOG.debug("No quorum of %i within %s seconds: %r", needed, timeout, answers)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+    return None, answers
+
+
+def staggered(calls, delay, accept=_not_none, timeout=None, linger=0):
+    """
+    Start the calls one after another and return the first acceptable result.
+
+    The next call is started delay seconds after the previous one, or as
+    soon as all running calls failed, in the spirit of the "Happy Eyeballs"
+    algorithm of RFC 8305. Calls listed first are thereby preferred without
+    waiting for them when they are slow.
+
+    :param calls: list of callables without arguments, in order of preference
+    :param delay: seconds to wait before starting the next call
+    :param accept: callable returning True for acceptable results, by
+        default anything but None is acceptable
+    :param timeout: seconds to wait for an acceptable result
+    :param linger: if greater than 0, the calls not started yet when an
+        acceptable result is known are still started delay seconds after
+        the previous one, and the results of all calls are collected for up
+        to linger seconds after the last one started
+    :return: tuple of the first acceptable result or None and a dictionary
+        mapping the index of each completed call to its result
+    """
+    answers = {}
+    if not calls:
+        return None, answers
+    deadline = None if timeout is None else time.monotonic() + timeout
+    executor = futures.ThreadPoolExecutor(max_workers=len(calls))
+    pending = {}
+    winner = None
+    last_start = None
+
+    def start():
+        nonlocal last_start
+        index = len(answers) + len(pending)
+        pending[executor.submit(deadlines.propagate(calls[index]))] = index
+        last_start = time.monotonic()
+
+    def collect(done):
+        found = None
+        for future in done:
+            index = pending.pop(future)
+            try:
+                answers[index] = future.result()
+                if found is None and accept(answers[index]):
+                    found = answers[index]
+            except Exception as exc:
+                LOG.debug("Raced call failed", exc_info=exc)
+                answers.setdefault(index, None)
+        return found
+
+    def remaining(wait):
+        if deadline is None:
+            return wait
+        left = max(deadline - time.monotonic(), 0)
+        return left if wait is None else min(wait, left)
+
+    try:
+        while pending or len(answers) + len(pending) < len(calls):
+            started = len(answers) + len(pending)
+            if not pending and started < len(calls):
+                start()
+                continue
+            wait = remaining(delay if started < len(calls) else None)
+            done, _ = futures.wait(pending, timeout=wait, return_when=futures.FIRST_COMPLETED)
+            winner = collect(done)
+            if winner is not None:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                LOG.debug("No acceptable result within %s seconds", timeout)
+                break
+            if not done:
+                # the calls running are slow, start the next one:
+                start()
+        while winner is not None and linger > 0:
+            started = len(answers) + len(pending)
+            if started < len(calls):
+                # keep the schedule, so that the other calls are answered as well:
+                wait = last_start + delay - time.monotonic()
+                if wait <= 0:
+                    start()
+                    continue
+            elif pending:
+                wait = last_start + linger - time.monotonic()
+            else:
+                break
+            wait = remaining(wait)
+            if wait <= 0:
+                break
+            if pending:
+                collect(futures.wait(pending, timeout=wait, return_when=futures.FIRST_COMPLETED)[0])
+            else:
+                time.sleep(wait)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+    return winner, answers
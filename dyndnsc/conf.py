@@ -81,6 +81,7 @@ def collect_config(cfg):
         {
             "client_name": {
                 "detector": ("detector_name", detector_opts),
+                "detector6": ("detector_name", detector_opts),  # dual stack only
                 "updater": [
                     ("updater_name", updater_opts),
                     ...
@@ -94,10 +95,13 @@ def collect_config(cfg):
     collected_configs = {}
     _updater_str = "updater"
     _detector_str = "detector"
+    _detector6_str = "detector6"
     _dash = "-"
     for client_name, client_cfg_dict in _iraw_client_configs(cfg):
         detector_name = None
         detector_options = {}
+        detector6_name = None
+        detector6_options = {}
         updater_name = None
         updater_options = {}
         collected_config = {}
@@ -105,6 +109,11 @@ def collect_config(cfg):
             if k.startswith(_detector_str + _dash):
                 detector_options[
                     k.replace(_detector_str + _dash, "")] = client_cfg_dict[k]
+            elif k.startswith(_detector6_str + _dash):
+                detector6_options[
+                    k.replace(_detector6_str + _dash, "")] = client_cfg_dict[k]
+            elif k == _detector6_str:
+                detector6_name = client_cfg_dict.get(k)
             elif k == _updater_str:
                 updater_name = client_cfg_dict.get(k)
             elif k == _detector_str:
@@ -118,6 +127,8 @@ def collect_config(cfg):
 
         collected_config[_detector_str] = [(detector_name, detector_options)]
         collected_config[_updater_str] = [(updater_name, updater_options)]
+        if detector6_name is not None:
+            collected_config[_detector6_str] = [(detector6_name, detector6_options)]
 
         collected_configs[client_name] = collected_config
     return collected_configs
@@ -2,18 +2,24 @@
 
 """Module containing dyndnsc core logic."""
 
+import contextlib
+import hashlib
+import json
 import logging
 from logging import NullHandler
+from collections import Counter, OrderedDict
 import time
 
 
 from .plugins.manager import NullPluginManager
-from .updater.base import UpdateProtocol
+from .updater.base import UpdateProtocol, UPDATE_OK, UPDATE_FATAL
 from .updater.manager import get_updater_class
-from .detector.dns import IPDetector_DNS
+from .detector.dns import IPDetector_DNS, resolve_many, DEFAULT_CONCURRENCY
+from .detector.dualstack import IPDetector_DualStack, IPDetector_DualStackDNS
 from .detector.null import IPDetector_Null
-from .detector.base import IPDetector
+from .detector.base import IPDetector, AF_INET, AF_INET6
 from .detector.manager import get_detector_class
+from .common.backoff import Backoff
 
 
 # Set default logging handler to avoid "No handler found" warnings.
@@ -22,14 +28,36 @@ logging.getLogger(__name__).addHandler(NullHandler())
 LOG = logging.getLogger(__name__)
 
 
+def _update(updater, ip):
+    """Update the remote service to ip, which is an (ipv4, ipv6) tuple for dual stack clients."""
+    if isinstance(ip, tuple):
+        return updater.update_dualstack(*ip)
+    return updater.update(ip)
+
+
+def _update_many(updaters, ip):
+    """Update several updaters sharing a batch_key() to ip, see _update()."""
+    if isinstance(ip, tuple):
+        return type(updaters[0]).update_many_dualstack(updaters, *ip)
+    return type(updaters[0]).update_many(updaters, ip)
+
+
 class DynDnsClient(object):
     """This class represents a client to the dynamic dns service."""
 
-    def __init__(self, updater=None, detector=None, plugins=None, detect_interval=300):
+    def __init__(self, updater=None, detector=None, plugins=None, detect_interval=300, detection_cache=None,
+                 state_store=None, dns_resolver="system", config_digest=None):
         """
         Initialize.
 
         :param detect_interval: amount of time in seconds that can elapse between checks
+        :param detection_cache: optional DetectionCache shared with other clients
+        :param state_store: optional StateStore to persist state across restarts
+        :param dns_resolver: resolver used to look up the hostname, 'system'
+            or 'authoritative', see IPDetector_DNS
+        :param config_digest: digest of the updater configuration, a pause or
+            retry delay restored from the state store only applies as long as
+            the updater is configured the same
         """
         if updater is None:
             raise ValueError("No updater specified")
@@ -50,37 +78,220 @@ class DynDnsClient(object):
         else:
             self.plugins = plugins
         hostname = self.updater.hostname  # this is kind of a kludge
-        self.dns = IPDetector_DNS(hostname=hostname, family=self.detector.af())
+        if isinstance(self.detector, IPDetector_DualStack):
+            # A and AAAA records are resolved together:
+            self.dns = IPDetector_DualStackDNS(hostname=hostname, resolver=dns_resolver)
+        else:
+            self.dns = IPDetector_DNS(hostname=hostname, family=self.detector.af(), resolver=dns_resolver)
+        self.detection_cache = detection_cache
         self.ipchangedetection_sleep = int(detect_interval)  # check every n seconds if our IP changed
         self.forceipchangedetection_sleep = int(detect_interval) * 5  # force check every n seconds if our IP changed
         self.lastcheck = None
         self.lastforce = None
         self.status = 0
+        # failed updates are retried with growing delays, fatal ones never:
+        self.backoff = Backoff(base=self.ipchangedetection_sleep)
+        self.retry_at = None
+        self.paused = False
+        self.config_digest = config_digest
+        self.state_store = state_store
+        self._synced = (None, None)  # (ip, timestamp) of last successful sync
+        self._restored = False
+        # detector and DNS results of the running check, see observing():
+        self._observations = None
+        # number of detections, DNS lookups and results reused within a check:
+        self.stats = Counter()
+        if self.state_store is not None:
+            self._restore_state()
         LOG.debug("DynDnsClient initializer done")
 
-    def sync(self):
+    def state_key(self):
         """
-        Synchronize the registered IP with the detected IP (if needed).
+        Return the key of the state of this client in the state store.
 
-        This can be expensive, mostly depending on the detector, but also
-        because updating the dynamic ip in itself is costly. Therefore, this
-        method should usually only be called on startup or when the state changes.
+        Clients updating the A and the AAAA record of the same hostname
+        must not share their state, so the key names the address family.
+        """
+        if isinstance(self.detector, IPDetector_DualStack):
+            return "%s/dualstack" % self.updater.hostname
+        family = {AF_INET: "ipv4", AF_INET6: "ipv6"}.get(self.detector.af())
+        if family is None:
+            return self.updater.hostname
+        return "%s/%s" % (self.updater.hostname, family)
+
+    def _restore_state(self):
+        """Load the state persisted by a previous process."""
+        state = self.state_store.get(self.state_key())
+        if not state:
+            return
+        self.lastcheck = state.get("checked")
+        self.lastforce = state.get("forced")
+        self.status = state.get("status", 0)
+        synced_ip = state.get("ip")
+        if isinstance(synced_ip, list):
+            synced_ip = tuple(synced_ip)  # dual stack, stored as JSON array
+        self._synced = (synced_ip, state.get("synced"))
+        self._restored = True
+        LOG.debug("%s: restored state %r", self.updater.hostname, state)
+        if state.get("config") != self.config_digest:
+            # e.g. the credentials were corrected, so try again right away:
+            return
+        self.backoff.failures = state.get("failures", 0)
+        self.retry_at = state.get("retry")
+        if state.get("paused"):
+            LOG.error("%s: update failed with '%s' before restarting, updates stay paused "
+                      "until the configuration changes", self.updater.hostname, self.status)
+            self.paused = True
+
+    def _save_state(self):
+        """Hand the current state to the state store, if any."""
+        if self.state_store is None:
+            return
+        self.state_store.set(self.state_key(), {
+            "checked": self.lastcheck,
+            "forced": self.lastforce,
+            "status": self.status,
+            "ip": self._synced[0],
+            "synced": self._synced[1],
+            "paused": self.paused,
+            "retry": self.retry_at,
+            "failures": self.backoff.failures,
+            "config": self.config_digest,
+        })
+
+    def _synced_recently(self, detected_ip):
+        """
+        Return True if detected_ip was synced by a previous process recently.
+
+        Only applies to the first sync after restoring the state: afterwards,
+        a change in DNS must always be corrected.
+        """
+        if not self._restored:
+            return False
+        self._restored = False
+        synced_ip, synced = self._synced
+        return (synced_ip == detected_ip and synced is not None and
+                time.time() - synced < self.forceipchangedetection_sleep)
+
+    @contextlib.contextmanager
+    def observing(self):
+        """
+        Run the detector and look up the DNS at most once in this context.
+
+        A check() first looks for a state change and then syncs, both of
+        which need the detected IP and the DNS. Within this context, the
+        results of the first detection and lookup are reused.
         """
-        detected_ip = self.detector.detect()
+        self._observations = {}
+        try:
+            yield
+        finally:
+            self._observations = None
+
+    def _observed(self, key):
+        """Return True if key was observed within the running check and count the reuse."""
+        if self._observations is None or key not in self._observations:
+            return False
+        self.stats["reused"] += 1
+        return True
+
+    def _observe(self, key, value):
+        if self._observations is not None:
+            self._observations[key] = value
+        return value
+
+    def _detect(self):
+        """Run the detector, possibly reusing a result of another client or of the running check."""
+        if self._observed("detector"):
+            return self._observations["detector"]
+        self.stats["detections"] += 1
+        if self.detection_cache is None:
+            return self._observe("detector", self.detector.detect())
+        return self._observe("detector", self.detection_cache.detect(self.detector))
+
+    def _lookup_dns(self):
+        """Look up the DNS, possibly reusing the result of the running check."""
+        if self._observed("dns"):
+            return self._observations["dns"]
+        self.stats["dns_lookups"] += 1
+        return self._observe("dns", self.dns.detect())
+
+    def _pending_update(self):
+        """
+        Detect the IP and compare it to the DNS.
+
+        :return: the IP the remote service must be updated to or None
+        """
+        detected_ip = self._detect()
+        if self._needs_dns_comparison(detected_ip):
+            return self._compare_dns(detected_ip, self._lookup_dns())
+        self._save_state()
+        return None
+
+    def _needs_dns_comparison(self, detected_ip):
+        """Return True if the DNS must be looked up to decide whether detected_ip needs an update."""
         if detected_ip is None:
             LOG.debug("Couldn't detect the current IP using detector %r", self.detector.configuration_key)
             # we don't have a value to set it to, so don't update! Still shouldn't happen though
-        elif self.dns.detect() != detected_ip:
+            return False
+        if self._synced_recently(detected_ip):
+            LOG.debug("%s: detected IP '%s' was synced at %s, nothing to do",
+                      self.updater.hostname, detected_ip, self._synced[1])
+            return False
+        return True
+
+    def _compare_dns(self, detected_ip, dns_ip):
+        """
+        Compare the detected IP to the DNS.
+
+        :return: the IP the remote service must be updated to or None
+        """
+        if isinstance(detected_ip, tuple):
+            # keep the address of a family that could not be detected:
+            dns_ips = dns_ip or (None, None)
+            detected_ip = tuple(dns if ip is None else ip for ip, dns in zip(detected_ip, dns_ips))
+        if dns_ip != detected_ip:
             LOG.info("%s: dns IP '%s' does not match detected IP '%s', updating",
-                     self.updater.hostname, self.dns.get_current_value(), detected_ip)
-            self.status = self.updater.update(detected_ip)
-            self.plugins.after_remote_ip_update(detected_ip, self.status)
+                     self.updater.hostname, dns_ip, detected_ip)
+            return detected_ip
+        self.status = 0
+        self._synced = (detected_ip, time.time())
+        self.backoff.reset()
+        LOG.debug("%s: nothing to do, dns '%s' equals detection '%s'",
+                  self.updater.hostname, dns_ip, detected_ip)
+        self._save_state()
+        return None
+
+    def _updated(self, ip, status):
+        """Record the outcome of an update of the remote service."""
+        self.status = status
+        outcome = self.updater.classify(ip, status)
+        if outcome == UPDATE_OK:
+            self._synced = (ip, time.time())
+            self.backoff.reset()
+        elif outcome == UPDATE_FATAL:
+            LOG.error("%s: update failed with '%s', pausing updates until the configuration changes",
+                      self.updater.hostname, status)
+            self.paused = True
         else:
-            self.status = 0
-            LOG.debug("%s: nothing to do, dns '%s' equals detection '%s'",
-                      self.updater.hostname,
-                      self.dns.get_current_value(),
-                      self.detector.get_current_value())
+            delay = self.backoff.failure()
+            self.retry_at = time.time() + delay
+            LOG.warning("%s: update failed with '%s', retrying in %i seconds",
+                        self.updater.hostname, status, delay)
+        self._save_state()
+        self.plugins.after_remote_ip_update(ip, self.status)
+
+    def sync(self):
+        """
+        Synchronize the registered IP with the detected IP (if needed).
+
+        This can be expensive, mostly depending on the detector, but also
+        because updating the dynamic ip in itself is costly. Therefore, this
+        method should usually only be called on startup or when the state changes.
+        """
+        detected_ip = self._pending_update()
+        if detected_ip is not None:
+            self._updated(detected_ip, _update(self.updater, detected_ip))
 
     def has_state_changed(self):
         """
@@ -97,12 +308,15 @@ class DynDnsClient(object):
         self.lastcheck = time.time()
         # prefer offline state change detection:
         if self.detector.can_detect_offline():
-            self.detector.detect()
-        elif not self.dns.detect() == self.detector.get_current_value():
+            self._detect()
+        elif not self._lookup_dns() == self.detector.get_current_value():
             # The following produces traffic, but probably less traffic
             # overall than the detector
-            self.detector.detect()
+            self._detect()
+        return self._has_changed()
 
+    def _has_changed(self):
+        """Return True if the detector or the DNS changed in the last state change check."""
         if self.detector.has_changed():
             LOG.debug("detector changed")
             return True
@@ -119,12 +333,41 @@ class DynDnsClient(object):
         If this time has elapsed, a state change check through
         has_state_changed() should be performed and eventually a sync().
 
+        A client backing off after a failed update needs a check once its
+        retry time has come, a paused client never.
+
         :rtype: boolean
         """
+        if self.paused:
+            return False
+        if self.retry_at is not None:
+            return time.time() >= self.retry_at
         if self.lastcheck is None:
             return True
         return time.time() - self.lastcheck >= self.ipchangedetection_sleep
 
+    def request_check(self):
+        """Make the next call to check() look for a state change immediately."""
+        self.lastcheck = None
+
+    def next_check_time(self):
+        """
+        Return the point in time at which check() is due next.
+
+        The forced sync is only ever evaluated from within check(), so the
+        check interval alone determines when this client needs attention,
+        unless it is backing off after a failed update.
+
+        :return: seconds since the epoch or None if the client is paused
+        """
+        if self.paused:
+            return None
+        if self.retry_at is not None:
+            return self.retry_at
+        if self.lastcheck is None:
+            return time.time()
+        return self.lastcheck + self.ipchangedetection_sleep
+
     def needs_sync(self):
         """
         Check if enough time has elapsed to perform a sync().
@@ -139,6 +382,36 @@ class DynDnsClient(object):
             self.lastforce = time.time()
         return time.time() - self.lastforce >= self.forceipchangedetection_sleep
 
+    def _needs_sync_now(self, now=None):
+        """
+        Perform the state change check part of check().
+
+        :param now: optional timestamp recorded as time of this check, used to
+            keep the schedules of clients checked together aligned
+        :return: True if sync() must be called
+        """
+        if not self.needs_check():
+            return False
+        return self._after_state_check(self.has_state_changed(), now)
+
+    def _after_state_check(self, changed, now=None):
+        """Decide whether to sync, given the result of has_state_changed()."""
+        if now is not None:
+            self.lastcheck = now
+        retrying, self.retry_at = self.retry_at is not None, None
+        if changed:
+            LOG.debug("state changed, syncing...")
+        elif retrying:
+            LOG.debug("retrying failed update")
+            changed = True
+        elif self.needs_sync():
+            LOG.debug("forcing sync after %s seconds",
+                      self.forceipchangedetection_sleep)
+            self.lastforce = time.time()
+            changed = True
+        self._save_state()
+        return changed
+
     def check(self):
         """
         Check if the detector changed and call sync() accordingly.
@@ -146,25 +419,255 @@ class DynDnsClient(object):
         If the sleep time has elapsed, this method will see if the attached
         detector has had a state change and call sync() accordingly.
         """
-        if self.needs_check():
-            if self.has_state_changed():
-                LOG.debug("state changed, syncing...")
+        with self.observing():
+            if self._needs_sync_now():
                 self.sync()
-            elif self.needs_sync():
-                LOG.debug("forcing sync after %s seconds",
-                          self.forceipchangedetection_sleep)
-                self.lastforce = time.time()
-                self.sync()
-            else:
-                # nothing to be done
-                pass
 
 
-def getDynDnsClientForConfig(config, plugins=None):
+class AsyncDynDnsClient(object):
+    """
+    Dynamic dns client for use from within an asyncio event loop.
+
+    Wraps a DynDnsClient and offers coroutine versions of its check() and
+    sync() using the adetect() and aupdate() methods of the detector and
+    updater, so that many clients can be served by a single event loop. The
+    wrapped client keeps the state and can still be used by the thread based
+    code, but not at the same time.
+    """
+
+    def __init__(self, client=None, **kwargs):
+        """
+        Initialize.
+
+        :param client: DynDnsClient to wrap, by default one created with kwargs
+        """
+        self.client = DynDnsClient(**kwargs) if client is None else client
+
+    @property
+    def updater(self):
+        """Return the updater of the wrapped client."""
+        return self.client.updater
+
+    @property
+    def detector(self):
+        """Return the detector of the wrapped client."""
+        return self.client.detector
+
+    @property
+    def status(self):
+        """Return the status of the last update of the wrapped client."""
+        return self.client.status
+
+    @property
+    def stats(self):
+        """Return the detection and DNS lookup counters of the wrapped client."""
+        return self.client.stats
+
+    def needs_check(self):
+        """Return True if a check() is due, see DynDnsClient.needs_check()."""
+        return self.client.needs_check()
+
+    def next_check_time(self):
+        """Return the point in time at which check() is due next, see DynDnsClient.next_check_time()."""
+        return self.client.next_check_time()
+
+    def request_check(self):
+        """Make the next call to check() look for a state change immediately."""
+        self.client.request_check()
+
+    async def _adetect(self):
+        """Coroutine version of DynDnsClient._detect()."""
+        client = self.client
+        if client._observed("detector"):
+            return client._observations["detector"]
+        client.stats["detections"] += 1
+        if client.detection_cache is None:
+            return client._observe("detector", await client.detector.adetect())
+        return client._observe("detector", await client.detection_cache.adetect(client.detector))
+
+    async def _alookup_dns(self):
+        """Coroutine version of DynDnsClient._lookup_dns()."""
+        client = self.client
+        if client._observed("dns"):
+            return client._observations["dns"]
+        client.stats["dns_lookups"] += 1
+        return client._observe("dns", await client.dns.adetect())
+
+    async def _apending_update(self):
+        """Coroutine version of DynDnsClient._pending_update()."""
+        detected_ip = await self._adetect()
+        if self.client._needs_dns_comparison(detected_ip):
+            return self.client._compare_dns(detected_ip, await self._alookup_dns())
+        self.client._save_state()
+        return None
+
+    async def sync(self):
+        """Coroutine version of DynDnsClient.sync()."""
+        await async_clients([self])
+
+    async def has_state_changed(self):
+        """Coroutine version of DynDnsClient.has_state_changed()."""
+        client = self.client
+        client.lastcheck = time.time()
+        # prefer offline state change detection:
+        if client.detector.can_detect_offline() or await self._alookup_dns() != client.detector.get_current_value():
+            await self._adetect()
+        return client._has_changed()
+
+    async def check(self):
+        """Coroutine version of DynDnsClient.check()."""
+        if not self.needs_check():
+            return
+        with self.client.observing():
+            if self.client._after_state_check(await self.has_state_changed()):
+                await self.sync()
+
+
+def _batch_key(dyndnsclient):
+    key = dyndnsclient.updater.batch_key()
+    if key is None:
+        return id(dyndnsclient)  # a batch of its own
+    return (type(dyndnsclient.updater), key)
+
+
+def group_clients(dyndnsclients):
+    """
+    Group clients whose updates can be combined into a single request.
+
+    :param dyndnsclients: list of DynDnsClients
+    :return: list of lists of DynDnsClients
+    """
+    groups = OrderedDict()
+    for dyndnsclient in dyndnsclients:
+        groups.setdefault(_batch_key(dyndnsclient), []).append(dyndnsclient)
+    return list(groups.values())
+
+
+def sync_clients(dyndnsclients):
+    """
+    Synchronize the given clients, combining updates where possible.
+
+    Clients whose updaters share the same batch_key() and that need to be
+    updated to the same IP are updated using a single request to the remote
+    service.
+
+    :param dyndnsclients: list of DynDnsClients
+    """
+    batches = OrderedDict()
+    for dyndnsclient in dyndnsclients:
+        detected_ip = dyndnsclient._pending_update()
+        if detected_ip is None:
+            continue
+        batches.setdefault((_batch_key(dyndnsclient), detected_ip), []).append(dyndnsclient)
+
+    for (_, detected_ip), batch in batches.items():
+        if len(batch) == 1:
+            statuses = [_update(batch[0].updater, detected_ip)]
+        else:
+            LOG.info("Combining update of %i hostnames to '%s'", len(batch), detected_ip)
+            statuses = _update_many([dyndnsclient.updater for dyndnsclient in batch], detected_ip)
+        for dyndnsclient, status in zip(batch, statuses):
+            dyndnsclient._updated(detected_ip, status)
+
+
+def prime_dns(dyndnsclients, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Look up the DNS records of the given clients concurrently.
+
+    Identical lookups are done only once. The answers are used by the next
+    DNS lookup of each client, e.g. in the check() or sync() that follows.
+
+    :param dyndnsclients: list of DynDnsClients
+    :param concurrency: maximum number of lookups running at once
+    :return: number of lookups done
+    """
+    return resolve_many([dyndnsclient.dns for dyndnsclient in dyndnsclients], concurrency)
+
+
+def check_clients(dyndnsclients):
+    """
+    Run check() on the given clients, combining updates where possible.
+
+    :param dyndnsclients: list of DynDnsClients
+    """
+    now = time.time()
+    with contextlib.ExitStack() as stack:
+        for dyndnsclient in dyndnsclients:
+            stack.enter_context(dyndnsclient.observing())
+        sync_clients([dyndnsclient for dyndnsclient in dyndnsclients if dyndnsclient._needs_sync_now(now)])
+
+
+async def _aupdate(updater, ip):
+    """Coroutine version of _update()."""
+    if isinstance(ip, tuple):
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, _update, updater, ip)
+    return await updater.aupdate(ip)
+
+
+async def _aupdate_many(updaters, ip):
+    """Coroutine version of _update_many()."""
+    if isinstance(ip, tuple):
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, _update_many, updaters, ip)
+    return await type(updaters[0]).aupdate_many(updaters, ip)
+
+
+async def async_clients(asyncclients):
+    """
+    Coroutine version of sync_clients(), for AsyncDynDnsClients.
+
+    The clients are detected concurrently, the batches of clients whose
+    updates can be combined are updated concurrently using aupdate_many().
+
+    :param asyncclients: list of AsyncDynDnsClients
+    """
+    import asyncio
+    detected_ips = await asyncio.gather(*(asyncclient._apending_update() for asyncclient in asyncclients))
+    batches = OrderedDict()
+    for asyncclient, detected_ip in zip(asyncclients, detected_ips):
+        if detected_ip is None:
+            continue
+        batches.setdefault((_batch_key(asyncclient.client), detected_ip), []).append(asyncclient.client)
+
+    async def update(batch, detected_ip):
+        if len(batch) == 1:
+            statuses = [await _aupdate(batch[0].updater, detected_ip)]
+        else:
+            LOG.info("Combining update of %i hostnames to '%s'", len(batch), detected_ip)
+            statuses = await _aupdate_many([dyndnsclient.updater for dyndnsclient in batch], detected_ip)
+        for dyndnsclient, status in zip(batch, statuses):
+            dyndnsclient._updated(detected_ip, status)
+
+    await asyncio.gather(*(update(batch, detected_ip) for (_, detected_ip), batch in batches.items()))
+
+
+async def acheck_clients(asyncclients):
+    """
+    Coroutine version of check_clients(), for AsyncDynDnsClients.
+
+    :param asyncclients: list of AsyncDynDnsClients
+    """
+    import asyncio
+    now = time.time()
+    with contextlib.ExitStack() as stack:
+        for asyncclient in asyncclients:
+            stack.enter_context(asyncclient.client.observing())
+        due = [asyncclient for asyncclient in asyncclients if asyncclient.needs_check()]
+        changed = await asyncio.gather(*(asyncclient.has_state_changed() for asyncclient in due))
+        await async_clients([asyncclient for asyncclient, state_changed in zip(due, changed)
+                             if asyncclient.client._after_state_check(state_changed, now)])
+
+
+def getDynDnsClientForConfig(config, plugins=None, detection_cache=None, state_store=None,
+                             client_class=DynDnsClient):
     """Instantiate and return a complete and working dyndns client.
 
     :param config: a dictionary with configuration keys
     :param plugins: an object that implements PluginManager
+    :param detection_cache: optional DetectionCache shared between clients
+    :param state_store: optional StateStore shared between clients
+    :param client_class: DynDnsClient or AsyncDynDnsClient
     """
     initparams = {}
     if "interval" in config:
@@ -173,9 +676,21 @@ def getDynDnsClientForConfig(config, plugins=None):
     if plugins is not None:
         initparams["plugins"] = plugins
 
+    if detection_cache is not None:
+        initparams["detection_cache"] = detection_cache
+
+    if state_store is not None:
+        initparams["state_store"] = state_store
+
+    if config.get("dns_resolver"):
+        initparams["dns_resolver"] = config["dns_resolver"]
+
     if "updater" in config:
         for updater_name, updater_options in config["updater"]:
             initparams["updater"] = get_updater_class(updater_name)(**updater_options)
+        # identifies the configuration a persisted pause applies to:
+        initparams["config_digest"] = hashlib.sha256(
+            json.dumps(config["updater"], sort_keys=True, default=str).encode("utf-8")).hexdigest()
 
     # find class and instantiate the detector:
     if "detector" in config:
@@ -189,4 +704,15 @@ def getDynDnsClientForConfig(config, plugins=None):
         thedetector = klass(**detector_opts)
         initparams["detector"] = thedetector
 
-    return DynDnsClient(**initparams)
+    # a second detector for ipv6 makes a dual stack client:
+    if config.get("detector6") and "detector" in initparams:
+        detector_name, detector_opts = config["detector6"][-1]
+        try:
+            klass = get_detector_class(detector_name)
+        except KeyError as exc:
+            LOG.warning("Invalid change detector configuration: '%s'",
+                        detector_name, exc_info=exc)
+            return None
+        initparams["detector"] = IPDetector_DualStack(initparams["detector"], klass(**detector_opts))
+
+    return client_class(**initparams)
@@ -46,6 +46,38 @@ class IPDetector(Subject, DynamicCliMixin):
         """
         raise NotImplementedError("Abstract method, must be overridden")
 
+    async def adetect(self):
+        """
+        Detect the IP without blocking the event loop.
+
+        The default implementation runs detect() in the default executor of
+        the running loop.
+
+        Might be overwritten in subclass.
+
+        :return: ip address
+        """
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, self.detect)
+
+    def netlink_groups(self):
+        """
+        Return the rtnetlink groups whose events may change the detected IP.
+
+        Might be overwritten in subclass, the default of 0 means none.
+        """
+        return 0
+
+    def is_affected_by(self, event):
+        """
+        Return True if the rtnetlink event may change the detected IP.
+
+        Might be overwritten in subclass.
+
+        :param event: a dyndnsc.common.netlink.NetlinkEvent
+        """
+        return False
+
     def af(self):
         """
         Return the address family detected by this detector.
@@ -81,6 +113,20 @@ class IPDetector(Subject, DynamicCliMixin):
             LOG.debug("%s.set_current_value(%s)", self.__class__.__name__, value)
         return value
 
+    def cache_key(self):
+        """
+        Return a key identifying detectors that detect the same IP.
+
+        Detectors of the same class with equal options share the same key.
+        Returns None if the options cannot be used as a key.
+        """
+        opts = tuple(sorted((k, v) for k, v in vars(self).items() if k.startswith("opts_")))
+        try:
+            hash(opts)
+        except TypeError:
+            return None
+        return (self.__class__, opts)
+
     def has_changed(self):
         """Detect difference between old and current value."""
         return self.get_old_value() != self.get_current_value()
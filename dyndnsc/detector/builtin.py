@@ -1,25 +1,37 @@
 # -*- coding: utf-8 -*-
 
 """
-All built-in detector plugins are listed here and will be dynamically imported.
+All built-in detector plugins are listed here and will be imported on demand.
 
 If importing a plugin fails, it will be ignored.
 """
 
-from ..common.load import load_class as _load_plugin
+from ..common.load import load_builtin_class, load_builtin_classes
 
+# configuration key, module, class:
 _BUILTINS = (
-    ("dyndnsc.detector.command", "IPDetector_Command"),
-    ("dyndnsc.detector.dns", "IPDetector_DNS"),
-    ("dyndnsc.detector.dnswanip", "IPDetector_DnsWanIp"),
-    ("dyndnsc.detector.iface", "IPDetector_Iface"),
-    ("dyndnsc.detector.socket_ip", "IPDetector_Socket"),
-    ("dyndnsc.detector.rand", "IPDetector_Random"),
-    ("dyndnsc.detector.teredo", "IPDetector_Teredo"),
-    ("dyndnsc.detector.webcheck", "IPDetectorWebCheck"),
-    ("dyndnsc.detector.webcheck", "IPDetectorWebCheck6"),
-    ("dyndnsc.detector.webcheck", "IPDetectorWebCheck46"),
-    ("dyndnsc.detector.null", "IPDetector_Null")
+    ("command", "dyndnsc.detector.command", "IPDetector_Command"),
+    ("dns", "dyndnsc.detector.dns", "IPDetector_DNS"),
+    ("dnswanip", "dyndnsc.detector.dnswanip", "IPDetector_DnsWanIp"),
+    ("iface", "dyndnsc.detector.iface", "IPDetector_Iface"),
+    ("socket", "dyndnsc.detector.socket_ip", "IPDetector_Socket"),
+    ("random", "dyndnsc.detector.rand", "IPDetector_Random"),
+    ("teredo", "dyndnsc.detector.teredo", "IPDetector_Teredo"),
+    ("webcheck4", "dyndnsc.detector.webcheck", "IPDetectorWebCheck"),
+    ("webcheck6", "dyndnsc.detector.webcheck", "IPDetectorWebCheck6"),
+    ("webcheck46", "dyndnsc.detector.webcheck", "IPDetectorWebCheck46"),
+    ("null", "dyndnsc.detector.null", "IPDetector_Null")
 )
 
-PLUGINS = {plug for plug in (_load_plugin(m, c) for m, c in _BUILTINS) if plug is not None}
+
+def get_plugin(name):
+    """Return the plugin class for configuration key ``name``, importing only its module."""
+    return load_builtin_class(name, _BUILTINS)
+
+
+def __getattr__(name):
+    """Import all plugins when ``PLUGINS`` is accessed for the first time."""
+    if name == "PLUGINS":
+        globals()["PLUGINS"] = plugins = load_builtin_classes(_BUILTINS)
+        return plugins
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
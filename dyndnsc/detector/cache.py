@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+"""Module containing a cache to share detection results between detectors."""
+
+import logging
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+
+class DetectionCache(object):
+    """
+    Share detection results between detectors with identical configuration.
+
+    Detectors are considered identical if their cache_key() is equal. Within
+    max_age seconds, only the first of them actually runs detect(), the others
+    reuse its result.
+    """
+
+    def __init__(self, max_age=60, timefunc=time.time):
+        """
+        Initialize.
+
+        :param max_age: seconds a detection result can be reused
+        :param timefunc: callable returning the current time in seconds
+        """
+        self._max_age = max_age
+        self._timefunc = timefunc
+        self._entries = {}  # key -> (timestamp, ip)
+        self._locks = {}  # key -> lock, so that one key is detected only once
+        self._lock = threading.Lock()
+        self._tasks = {}  # key -> task detecting it, for adetect()
+        self.hits = 0
+        self.misses = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fresh(self, key, detector):
+        entry = self._entries.get(key)
+        if entry is None or self._timefunc() - entry[0] >= self._max_age:
+            return False
+        self.hits += 1
+        LOG.debug("Reusing detected IP '%s' for %r", entry[1], key)
+        detector.set_current_value(entry[1])
+        return True
+
+    def _store(self, key, theip):
+        if theip is None:
+            # don't share failures, let the next detector try again:
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = (self._timefunc(), theip)
+
+    def detect(self, detector):
+        """
+        Return a fresh detection result for the detector.
+
+        Either reuses a cached result or calls detector.detect(). The
+        detector's current value is updated in both cases.
+
+        :param detector: IPDetector instance
+        :return: ip address
+        """
+        key = detector.cache_key()
+        if key is None:
+            return detector.detect()
+        with self._key_lock(key):
+            if self._fresh(key, detector):
+                return detector.get_current_value()
+            self.misses += 1
+            theip = detector.detect()
+            self._store(key, theip)
+            return theip
+
+    async def adetect(self, detector):
+        """
+        Return a fresh detection result for the detector, like detect().
+
+        Must only be used from a single event loop, concurrent calls for the
+        same key wait for the detection already in progress.
+
+        :param detector: IPDetector instance
+        :return: ip address
+        """
+        import asyncio
+        key = detector.cache_key()
+        if key is None:
+            return await detector.adetect()
+        if self._fresh(key, detector):
+            return detector.get_current_value()
+        task = self._tasks.get(key)
+        if task is not None:
+            self.hits += 1
+            return detector.set_current_value(await asyncio.shield(task))
+        self.misses += 1
+        task = self._tasks[key] = asyncio.ensure_future(detector.adetect())
+        try:
+            theip = await task
+        finally:
+            del self._tasks[key]
+        self._store(key, theip)
+        return theip
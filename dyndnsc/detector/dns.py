@@ -2,13 +2,42 @@
 
 """Module containing logic for dns based detectors."""
 
+from collections import OrderedDict
+from concurrent import futures
 import socket
 import logging
+import time
 
 from .base import IPDetector, AF_INET, AF_INET6, AF_UNSPEC
+from ..common import deadlines
 
 LOG = logging.getLogger(__name__)
 
+RESOLVERS = ("system", "authoritative")
+
+# default number of concurrent lookups of resolve_many():
+DEFAULT_CONCURRENCY = 16
+# seconds during which answers handed to IPDetector_DNS.prime() are used:
+PRIMED_MAX_AGE = 30
+
+
+def _check_family(family):
+    if family != AF_UNSPEC and family not in (AF_INET, AF_INET6):
+        raise ValueError("Invalid family '%s'" % family)
+
+
+def _addresses(addrinfo, family):
+    if family == AF_UNSPEC:
+        return tuple({item[4][0] for item in addrinfo if item[0] in (AF_INET, AF_INET6)})
+    return tuple({item[4][0] for item in addrinfo})
+
+
+def _log_gaierror(exc):
+    # EAI_NODATA and EAI_NONAME are expected if this name is not (yet)
+    # present in DNS
+    if exc.errno not in (socket.EAI_NODATA, socket.EAI_NONAME):
+        LOG.debug("socket.getaddrinfo() raised an exception", exc_info=exc)
+
 
 def resolve(hostname, family=AF_UNSPEC):
     """
@@ -21,23 +50,30 @@ def resolve(hostname, family=AF_UNSPEC):
     :param family: AF_INET or AF_INET6 or AF_UNSPEC (default)
     :return: tuple of unique IP addresses
     """
-    af_ok = (AF_INET, AF_INET6)
-    if family != AF_UNSPEC and family not in af_ok:
-        raise ValueError("Invalid family '%s'" % family)
-    ips = ()
+    _check_family(family)
     try:
         addrinfo = socket.getaddrinfo(hostname, None, family)
     except socket.gaierror as exc:
-        # EAI_NODATA and EAI_NONAME are expected if this name is not (yet)
-        # present in DNS
-        if exc.errno not in (socket.EAI_NODATA, socket.EAI_NONAME):
-            LOG.debug("socket.getaddrinfo() raised an exception", exc_info=exc)
-    else:
-        if family == AF_UNSPEC:
-            ips = tuple({item[4][0] for item in addrinfo if item[0] in af_ok})
-        else:
-            ips = tuple({item[4][0] for item in addrinfo})
-    return ips
+        _log_gaierror(exc)
+        return ()
+    return _addresses(addrinfo, family)
+
+
+async def aresolve(hostname, family=AF_UNSPEC):
+    """
+    Resolve hostname like resolve(), using the running event loop.
+
+    :param family: AF_INET or AF_INET6 or AF_UNSPEC (default)
+    :return: tuple of unique IP addresses
+    """
+    import asyncio
+    _check_family(family)
+    try:
+        addrinfo = await asyncio.get_running_loop().getaddrinfo(hostname, None, family=family)
+    except socket.gaierror as exc:
+        _log_gaierror(exc)
+        return ()
+    return _addresses(addrinfo, family)
 
 
 class IPDetector_DNS(IPDetector):
@@ -45,20 +81,27 @@ class IPDetector_DNS(IPDetector):
 
     configuration_key = "dns"
 
-    def __init__(self, hostname=None, family=None, *args, **kwargs):
+    def __init__(self, hostname=None, family=None, resolver="system", *args, **kwargs):
         """
         Initialize.
 
         :param hostname: host name to query from DNS
         :param family: IP address family (default: '' (ANY), also possible: 'INET', 'INET6')
+        :param resolver: 'system' (default) to resolve through the operating
+            system, 'authoritative' to query the nameservers of the zone directly
         """
         super(IPDetector_DNS, self).__init__(*args, family=family, **kwargs)
 
         self.opts_hostname = hostname
+        self.opts_resolver = resolver or "system"
+        self._primed = None  # (timestamp, addresses), see prime()
 
         if self.opts_hostname is None:
             raise ValueError(
                 "IPDetector_DNS(): a hostname to be queried in DNS must be specified!")
+        if self.opts_resolver not in RESOLVERS:
+            raise ValueError("IPDetector_DNS(): unknown resolver '%s', please use one of %s" %
+                             (self.opts_resolver, ", ".join(RESOLVERS)))
 
     def can_detect_offline(self):
         """Return false, as this detector generates dns traffic.
@@ -67,17 +110,116 @@ class IPDetector_DNS(IPDetector):
         """
         return False
 
+    def _resolve(self, family):
+        """Resolve the hostname using the configured resolver."""
+        if self.opts_resolver == "authoritative":
+            from ..common import authdns
+            try:
+                return authdns.get_resolver().resolve(self.opts_hostname, family)
+            except authdns.ResolutionError as exc:
+                LOG.info("%s, falling back to the system resolver", exc)
+        return resolve(self.opts_hostname, family)
+
+    async def _aresolve(self, family):
+        """Resolve the hostname like _resolve(), using the running event loop."""
+        import asyncio
+        if self.opts_resolver == "authoritative":
+            # dnspython's blocking resolver is used, so that the nameservers are cached only once:
+            return await asyncio.get_running_loop().run_in_executor(None, self._resolve, family)
+        return await aresolve(self.opts_hostname, family)
+
+    def lookup_key(self):
+        """Return a key identifying detectors that resolve the same records the same way."""
+        return (self.opts_hostname, self.opts_family, self.opts_resolver)
+
+    def prime(self, addresses):
+        """
+        Make the next lookup use the given answer instead of resolving again.
+
+        The answer is used only once and only within PRIMED_MAX_AGE seconds.
+
+        :param addresses: tuple of IP addresses as returned by resolve()
+        """
+        self._primed = (time.time(), addresses)
+
+    def _take_primed(self):
+        """Return the primed addresses and forget them, None if there are none."""
+        primed, self._primed = self._primed, None
+        if primed is None or time.time() - primed[0] >= PRIMED_MAX_AGE:
+            return None
+        return primed[1]
+
+    def _lookup(self):
+        """Return the addresses of the hostname, primed or resolved."""
+        addresses = self._take_primed()
+        if addresses is None:
+            addresses = self._resolve(self.opts_family)
+        return addresses
+
+    async def _alookup(self):
+        """Return the addresses of the hostname like _lookup(), using the running event loop."""
+        addresses = self._take_primed()
+        if addresses is None:
+            addresses = await self._aresolve(self.opts_family)
+        return addresses
+
     def detect(self):
         """
-        Resolve the hostname to an IP address through the operating system.
+        Resolve the hostname to an IP address.
 
         Depending on the 'family' option, either ipv4 or ipv6 resolution is
-        carried out.
+        carried out. Depending on the 'resolver' option, the operating system
+        or the authoritative nameservers are asked.
 
         If multiple IP addresses are found, the first one is returned.
 
         :return: ip address
         """
-        theip = next(iter(resolve(self.opts_hostname, self.opts_family)), None)
+        theip = next(iter(self._lookup()), None)
+        self.set_current_value(theip)
+        return theip
+
+    async def adetect(self):
+        """
+        Resolve the hostname like detect(), using the running event loop.
+
+        :return: ip address
+        """
+        theip = next(iter(await self._alookup()), None)
         self.set_current_value(theip)
         return theip
+
+
+def resolve_many(detectors, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Resolve the hostnames of many IPDetector_DNS instances concurrently.
+
+    Detectors with the same lookup_key() share a single lookup. The answers
+    are handed to the detectors using prime(), so that their next detect()
+    does not need to resolve anymore.
+
+    :param detectors: iterable of IPDetector_DNS instances
+    :param concurrency: maximum number of lookups running at once
+    :return: number of lookups done
+    """
+    groups = OrderedDict()
+    for detector in detectors:
+        groups.setdefault(detector.lookup_key(), []).append(detector)
+    if not groups:
+        return 0
+
+    def lookup(group):
+        try:
+            return group[0]._resolve(group[0].opts_family)
+        except Exception as exc:
+            LOG.warning("Looking up '%s' failed", group[0].opts_hostname, exc_info=exc)
+            return None
+
+    with futures.ThreadPoolExecutor(max_workers=max(min(int(concurrency), len(groups)), 1)) as executor:
+        for group, addresses in zip(groups.values(), executor.map(deadlines.propagate(lookup), groups.values())):
+            if addresses is None:
+                continue  # the detectors resolve on their own
+            for detector in group:
+                detector.prime(addresses)
+    LOG.debug("Resolved %i hostname(s) for %i detector(s)", len(groups), sum(len(group) for group in groups.values()))
+    return len(groups)
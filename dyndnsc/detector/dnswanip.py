@@ -6,15 +6,288 @@ See also https://www.cyberciti.biz/faq/how-to-find-my-public-ip-address-from-com
 """
 from __future__ import absolute_import
 
+from functools import partial
+import ipaddress
 import logging
-
-import dns.resolver
+import threading
+import time
 
 from .base import IPDetector, AF_INET, AF_INET6
+from ..common import dnswire, race
 
 LOG = logging.getLogger(__name__)
 
 
+# provider -> family -> nameservers ("@", names or addresses) and the query
+# answered with the address of the client, "rdclass" defaults to IN:
+_PROVIDERS = {
+    "opendns": {
+        AF_INET: {
+            "@": ("resolver1.opendns.com", "resolver2.opendns.com"),
+            "qname": "myip.opendns.com",
+            "rdtype": "A",
+        },
+        AF_INET6: {
+            "@": ("resolver1.ipv6-sandbox.opendns.com", "resolver2.ipv6-sandbox.opendns.com"),
+            "qname": "myip.opendns.com",
+            "rdtype": "AAAA",
+        },
+    },
+    "google": {
+        AF_INET: {
+            "@": ("ns1.google.com", "ns2.google.com", "ns3.google.com", "ns4.google.com"),
+            "qname": "o-o.myaddr.l.google.com",
+            "rdtype": "TXT",
+        },
+        AF_INET6: {
+            "@": ("ns1.google.com", "ns2.google.com", "ns3.google.com", "ns4.google.com"),
+            "qname": "o-o.myaddr.l.google.com",
+            "rdtype": "TXT",
+        },
+    },
+    "cloudflare": {
+        AF_INET: {
+            "@": ("1.1.1.1", "1.0.0.1"),
+            "qname": "whoami.cloudflare",
+            "rdtype": "TXT",
+            "rdclass": "CH",
+        },
+        AF_INET6: {
+            "@": ("2606:4700:4700::1111", "2606:4700:4700::1001"),
+            "qname": "whoami.cloudflare",
+            "rdtype": "TXT",
+            "rdclass": "CH",
+        },
+    },
+    "akamai": {
+        AF_INET: {
+            "@": ("ns1-1.akamaitech.net",),
+            "qname": "whoami.akamai.net",
+            "rdtype": "A",
+        },
+    },
+}
+
+# record types of the addresses of the nameservers per family:
+_ADDRESS_RDTYPES = {AF_INET: dnswire.A, AF_INET6: dnswire.AAAA}
+
+# how to combine the answers of several providers:
+MODES = ("first", "majority")
+
+
+def _is_address(text):
+    try:
+        ipaddress.ip_address(text)
+    except ValueError:
+        return False
+    return True
+
+
+def providers(family=AF_INET):
+    """Return the names of the providers supporting the address family."""
+    return sorted(name for name, specs in _PROVIDERS.items() if family in specs)
+
+
+class WanIpResolver(object):
+    """
+    Query the special records of the providers, keeping their nameservers cached.
+
+    The addresses of the provider nameservers are looked up through the
+    recursive nameservers of the system once and cached for their TTL, so
+    that a detection usually costs a single UDP exchange with explicit
+    timeout. All queries are sent with dnswire.
+    """
+
+    def __init__(self, timeout=2.0, nameservers=None, timefunc=time.time):
+        """
+        Initialize.
+
+        :param timeout: seconds to wait for the answer of a single nameserver
+        :param nameservers: addresses of the recursive nameservers used to
+            look up the provider nameservers, by default those configured
+            in resolv.conf at the time of the lookup
+        :param timefunc: callable returning the current time in seconds
+        """
+        self.timeout = timeout
+        self._recursive = nameservers
+        self._client = dnswire.Client(timeout)
+        self._timefunc = timefunc
+        self._lock = threading.Lock()
+        self._nameservers = {}  # (provider, family) -> (expires, addresses)
+
+    def _recursive_nameservers(self):
+        if self._recursive is not None:
+            return self._recursive
+        return dnswire.system_nameservers()
+
+    def _cached_nameservers(self, key):
+        with self._lock:
+            entry = self._nameservers.get(key)
+        if entry is not None and self._timefunc() < entry[0]:
+            return entry[1]
+        return None
+
+    def _store_nameservers(self, key, literals, answers, rdtype):
+        addresses = list(literals) + [address for answer in answers for address in answer.values(rdtype)]
+        if not addresses:
+            raise dnswire.DnsWireError("Could not look up any nameserver of %r" % (key,))
+        # nameservers given as addresses never expire:
+        ttl = min((ttl for answer in answers for record_type, ttl, _ in answer.records if record_type == rdtype),
+                  default=float("inf"))
+        LOG.debug("Nameservers of %r for %s seconds: %r", key, ttl, addresses)
+        with self._lock:
+            self._nameservers[key] = (self._timefunc() + ttl, addresses)
+        return addresses
+
+    def nameservers(self, family=AF_INET, provider="opendns"):
+        """
+        Return the addresses of the nameservers of the provider.
+
+        The names of all nameservers are looked up at once, the recursive
+        nameservers are tried one after the other until all were answered.
+        Names that could not be looked up are skipped.
+
+        :param family: address family
+        :param provider: key of _PROVIDERS
+        :return: list of IP addresses
+        :raises DnsWireError: if no nameserver name could be looked up
+        """
+        addresses = self._cached_nameservers((provider, family))
+        if addresses is None:
+            servers = _PROVIDERS[provider][family]["@"]
+            rdtype = _ADDRESS_RDTYPES[family]
+            names = [dnsservername for dnsservername in servers if not _is_address(dnsservername)]
+            answers = {}
+            for recursive in self._recursive_nameservers():
+                missing = [name for name in names if name not in answers]
+                if not missing:
+                    break
+                try:
+                    results = self._client.query_many([dnswire.Query(recursive, name, rdtype) for name in missing])
+                except OSError as exc:
+                    LOG.debug("Nameserver '%s' failed to answer", recursive, exc_info=exc)
+                    continue
+                answers.update((name, answer) for name, answer in zip(missing, results)
+                               if answer is not None and answer.values(rdtype))
+            if len(answers) < len(names):
+                LOG.warning("Could not look up the nameservers %r of '%s', skipping them",
+                            [name for name in names if name not in answers], provider)
+            addresses = self._store_nameservers(
+                (provider, family), filter(_is_address, servers), answers.values(), rdtype)
+        return addresses
+
+    async def _alookup(self, name, rdtype):
+        for recursive in self._recursive_nameservers():
+            try:
+                answer = await self._client.aquery(recursive, name, rdtype)
+            except dnswire.DnsWireError as exc:
+                LOG.debug("Nameserver '%s' failed to answer", recursive, exc_info=exc)
+                continue
+            if answer.values(rdtype):
+                return answer
+        raise dnswire.DnsWireError("Could not look up '%s'" % name)
+
+    async def anameservers(self, family=AF_INET, provider="opendns"):
+        """Return the addresses of the nameservers of the provider like nameservers(), using the running event loop."""
+        import asyncio
+
+        addresses = self._cached_nameservers((provider, family))
+        if addresses is None:
+            servers = _PROVIDERS[provider][family]["@"]
+            rdtype = _ADDRESS_RDTYPES[family]
+            names = [dnsservername for dnsservername in servers if not _is_address(dnsservername)]
+            results = await asyncio.gather(*(self._alookup(name, rdtype) for name in names), return_exceptions=True)
+            answers = []
+            for name, result in zip(names, results):
+                if isinstance(result, dnswire.DnsWireError):
+                    LOG.warning("Could not look up the nameserver '%s' of '%s', skipping it", name, provider)
+                elif isinstance(result, BaseException):
+                    raise result
+                else:
+                    answers.append(result)
+            addresses = self._store_nameservers((provider, family), filter(_is_address, servers), answers, rdtype)
+        return addresses
+
+    @staticmethod
+    def _address(answer, spec, family):
+        """Return the first address of the family in the answer or None."""
+        version = 4 if family == AF_INET else 6
+        for text in answer.values(dnswire.RDTYPES[spec["rdtype"]]):
+            try:
+                if ipaddress.ip_address(text).version == version:
+                    return text
+            except ValueError:
+                # e.g. the "edns0-client-subnet" TXT record of google
+                LOG.debug("Ignoring answer '%s'", text)
+        return None
+
+    def find_ip(self, family=AF_INET, provider="opendns"):
+        """
+        Find the publicly visible IP address, see find_ip().
+
+        The nameservers are tried one after the other until one answers
+        with NOERROR.
+
+        :param family: address family
+        :param provider: key of _PROVIDERS
+        :return: IP address or None
+        """
+        spec = _PROVIDERS[provider][family]
+        try:
+            nameservers = self.nameservers(family, provider)
+        except dnswire.DnsWireError as exc:
+            LOG.warning("Could not look up the nameservers of '%s'", provider, exc_info=exc)
+            return None
+        rdtype, rdclass = dnswire.RDTYPES[spec["rdtype"]], dnswire.RDCLASSES[spec.get("rdclass", "IN")]
+        for nameserver in nameservers:
+            try:
+                answer = self._client.query(nameserver, spec["qname"], rdtype, rdclass)
+            except (dnswire.DnsWireError, OSError) as exc:
+                LOG.debug("Nameserver '%s' failed to answer", nameserver, exc_info=exc)
+                continue
+            if answer.rcode != dnswire.NOERROR:
+                LOG.debug("Nameserver '%s' answered with rcode %i", nameserver, answer.rcode)
+                continue
+            return self._address(answer, spec, family)
+        LOG.warning("None of the nameservers of '%s' answered: %r", provider, nameservers)
+        return None
+
+    async def afind_ip(self, family=AF_INET, provider="opendns"):
+        """Find the publicly visible IP address like find_ip(), using the running event loop."""
+        spec = _PROVIDERS[provider][family]
+        try:
+            nameservers = await self.anameservers(family, provider)
+        except dnswire.DnsWireError as exc:
+            LOG.warning("Could not look up the nameservers of '%s'", provider, exc_info=exc)
+            return None
+        rdtype, rdclass = dnswire.RDTYPES[spec["rdtype"]], dnswire.RDCLASSES[spec.get("rdclass", "IN")]
+        for nameserver in nameservers:
+            try:
+                answer = await self._client.aquery(nameserver, spec["qname"], rdtype, rdclass)
+            except (dnswire.DnsWireError, OSError) as exc:
+                LOG.debug("Nameserver '%s' failed to answer", nameserver, exc_info=exc)
+                continue
+            if answer.rcode != dnswire.NOERROR:
+                LOG.debug("Nameserver '%s' answered with rcode %i", nameserver, answer.rcode)
+                continue
+            return self._address(answer, spec, family)
+        LOG.warning("None of the nameservers of '%s' answered: %r", provider, nameservers)
+        return None
+
+
+_lock = threading.Lock()
+_shared = None
+
+
+def get_resolver():
+    """Return the WanIpResolver shared by all detectors, creating it if needed."""
+    global _shared
+    with _lock:
+        if _shared is None:
+            _shared = WanIpResolver()
+        return _shared
+
+
 def find_ip(family=AF_INET, provider="opendns"):
     """Find the publicly visible IP address of the current system.
 
@@ -22,38 +295,20 @@ def find_ip(family=AF_INET, provider="opendns"):
     return the IP address of the requester rather than some other address.
 
     :param family: address family, optional, default AF_INET (ipv4)
-    :param flavour: selector for public infrastructure provider, optional
+    :param provider: selector for public infrastructure provider, optional
+    :return: IP address or None
     """
-    dnswanipproviders = {
-        "opendns": {
-            AF_INET: {
-                "@": ("resolver1.opendns.com", "resolver2.opendns.com"),
-                "qname": "myip.opendns.com",
-                "rdtype": "A",
-            },
-            AF_INET6: {
-                "@": ("resolver1.ipv6-sandbox.opendns.com", "resolver2.ipv6-sandbox.opendns.com"),
-                "qname": "myip.opendns.com",
-                "rdtype": "AAAA",
-            },
-        },
-    }
+    return get_resolver().find_ip(family, provider)
 
-    dnswanipprovider = dnswanipproviders[provider]  # only option as of now
 
-    resolver = dns.resolver.Resolver()
-    # first, get the IPs of the DNS servers:
-    nameservers = []
-    for dnsservername in dnswanipprovider[family]["@"]:
-        _answers = resolver.query(qname=dnsservername, rdtype=dnswanipprovider[family]["rdtype"])
-        nameservers.extend([rdata.address for rdata in _answers])
-    # specify the nameservers to be used:
-    resolver.nameservers = nameservers
-    # finally, attempt to discover our WAN IP by querying the DNS:
-    answers = resolver.query(qname=dnswanipprovider[family]["qname"], rdtype=dnswanipprovider[family]["rdtype"])
-    for rdata in answers:
-        return rdata.address
-    return None
+async def afind_ip(family=AF_INET, provider="opendns"):
+    """Find the publicly visible IP address like find_ip(), using the running event loop.
+
+    :param family: address family, optional, default AF_INET (ipv4)
+    :param provider: selector for public infrastructure provider, optional
+    :return: IP address or None
+    """
+    return await get_resolver().afind_ip(family, provider)
 
 
 class IPDetector_DnsWanIp(IPDetector):
@@ -61,16 +316,33 @@ class IPDetector_DnsWanIp(IPDetector):
 
     configuration_key = "dnswanip"
 
-    def __init__(self, family=None, *args, **kwargs):
+    def __init__(self, family=None, provider="opendns", mode="first", *args, **kwargs):
         """
         Initialize.
 
         :param family: IP address family (default: '' (ANY), also possible: 'INET', 'INET6')
+        :param provider: comma separated names of the providers to query,
+            see providers() (default: 'opendns')
+        :param mode: with several providers, 'first' (default) uses the first
+            answer, 'majority' an answer returned by most of them
         """
         if family is None:
             family = AF_INET
         super(IPDetector_DnsWanIp, self).__init__(*args, family=family, **kwargs)
 
+        self.opts_provider = tuple(name.strip() for name in str(provider).split(",") if name.strip())
+        self.opts_mode = mode
+        supported = providers(self.opts_family)
+        for name in self.opts_provider:
+            if name not in supported:
+                raise ValueError("IPDetector_DnsWanIp(): provider '%s' does not support this address family, "
+                                 "please use one of %s" % (name, ", ".join(supported)))
+        if not self.opts_provider:
+            raise ValueError("IPDetector_DnsWanIp(): at least one provider must be specified")
+        if self.opts_mode not in MODES:
+            raise ValueError("IPDetector_DnsWanIp(): unknown mode '%s', please use one of %s" %
+                             (self.opts_mode, ", ".join(MODES)))
+
     def can_detect_offline(self):
         """Return false, as this detector generates dns traffic.
 
@@ -83,10 +355,34 @@ class IPDetector_DnsWanIp(IPDetector):
         Detect the WAN IP of the current process through DNS.
 
         Depending on the 'family' option, either ipv4 or ipv6 resolution is
-        carried out.
+        carried out. Several providers are queried at once, using the first
+        answer or the answer of a majority of them depending on the 'mode'
+        option.
+
+        :return: ip address
+        """
+        if len(self.opts_provider) == 1:
+            theip = find_ip(family=self.opts_family, provider=self.opts_provider[0])
+        else:
+            calls = [partial(find_ip, self.opts_family, provider) for provider in self.opts_provider]
+            if self.opts_mode == "majority":
+                theip, answers = race.quorum(calls, len(calls) // 2 + 1)
+                if theip is None:
+                    LOG.warning("No majority of DNS providers agreed on an address: %r",
+                                {self.opts_provider[index]: answer for index, answer in answers.items()})
+            else:
+                theip = race.first(calls)
+        self.set_current_value(theip)
+        return theip
+
+    async def adetect(self):
+        """
+        Detect the WAN IP like detect(), using the running event loop.
 
         :return: ip address
         """
-        theip = find_ip(family=self.opts_family)
+        if len(self.opts_provider) > 1:
+            return await super(IPDetector_DnsWanIp, self).adetect()
+        theip = await afind_ip(family=self.opts_family, provider=self.opts_provider[0])
         self.set_current_value(theip)
         return theip
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""Module containing detectors for the ipv4 and ipv6 address of a dual stack host."""
+
+from concurrent import futures
+import logging
+
+from .base import IPDetector, AF_INET, AF_INET6, AF_UNSPEC
+from .dns import IPDetector_DNS
+from ..common import deadlines
+
+LOG = logging.getLogger(__name__)
+
+
+class IPDetector_DualStack(IPDetector):
+    """
+    Combine an ipv4 and an ipv6 detector into one.
+
+    The detected value is a tuple (ipv4, ipv6), either of which is None if
+    the corresponding detector failed, or None if both failed.
+    """
+
+    configuration_key = "dualstack"
+
+    def __init__(self, detector4, detector6, *args, **kwargs):
+        """
+        Initialize.
+
+        :param detector4: IPDetector detecting the ipv4 address
+        :param detector6: IPDetector detecting the ipv6 address
+        """
+        super(IPDetector_DualStack, self).__init__(*args, family=AF_UNSPEC, **kwargs)
+
+        if detector4.af() == AF_INET6 or detector6.af() == AF_INET:
+            raise ValueError("IPDetector_DualStack(): detectors of address families %r and %r cannot be combined" %
+                             (detector4.af(), detector6.af()))
+        self.detector4 = detector4
+        self.detector6 = detector6
+
+    def can_detect_offline(self):
+        """Return True if both detectors can detect offline."""
+        return self.detector4.can_detect_offline() and self.detector6.can_detect_offline()
+
+    def netlink_groups(self):
+        """Return the rtnetlink groups of both detectors."""
+        return self.detector4.netlink_groups() | self.detector6.netlink_groups()
+
+    def is_affected_by(self, event):
+        """Return True if the rtnetlink event may change either address."""
+        return self.detector4.is_affected_by(event) or self.detector6.is_affected_by(event)
+
+    def cache_key(self):
+        """Return a key made of the keys of both detectors."""
+        keys = (self.detector4.cache_key(), self.detector6.cache_key())
+        if None in keys:
+            return None
+        return (self.__class__,) + keys
+
+    def _combine(self, ipv4, ipv6):
+        theips = None if ipv4 is None and ipv6 is None else (ipv4, ipv6)
+        self.set_current_value(theips)
+        return theips
+
+    def detect(self):
+        """
+        Run both detectors and return the tuple of their results.
+
+        Detectors generating traffic run concurrently.
+
+        :return: (ipv4, ipv6) tuple or None
+        """
+        if self.detector4.can_detect_offline() or self.detector6.can_detect_offline():
+            return self._combine(self.detector4.detect(), self.detector6.detect())
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            ipv4 = executor.submit(deadlines.propagate(self.detector4.detect))
+            ipv6 = executor.submit(deadlines.propagate(self.detector6.detect))
+            return self._combine(ipv4.result(), ipv6.result())
+
+    async def adetect(self):
+        """
+        Run both detectors concurrently in the running event loop.
+
+        :return: (ipv4, ipv6) tuple or None
+        """
+        import asyncio
+        return self._combine(*await asyncio.gather(self.detector4.adetect(), self.detector6.adetect()))
+
+
+def _split(addresses):
+    """Return the first ipv4 and the first ipv6 address of addresses as a tuple, or None."""
+    ipv4 = next((address for address in addresses if ":" not in address), None)
+    ipv6 = next((address for address in addresses if ":" in address), None)
+    if ipv4 is None and ipv6 is None:
+        return None
+    return (ipv4, ipv6)
+
+
+class IPDetector_DualStackDNS(IPDetector_DNS):
+    """Resolve the A and AAAA records of a hostname in a single resolution."""
+
+    configuration_key = "dualstackdns"
+
+    def __init__(self, hostname=None, resolver="system", *args, **kwargs):
+        """
+        Initialize.
+
+        :param hostname: host name to query from DNS
+        :param resolver: 'system' (default) or 'authoritative', see IPDetector_DNS
+        """
+        super(IPDetector_DualStackDNS, self).__init__(hostname, None, resolver, *args, **kwargs)
+
+    def detect(self):
+        """
+        Resolve the hostname to its ipv4 and ipv6 address.
+
+        :return: (ipv4, ipv6) tuple or None
+        """
+        return self.set_current_value(_split(sorted(self._lookup())))
+
+    async def adetect(self):
+        """
+        Resolve the hostname like detect(), using the running event loop.
+
+        :return: (ipv4, ipv6) tuple or None
+        """
+        return self.set_current_value(_split(sorted(await self._alookup())))
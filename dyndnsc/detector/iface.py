@@ -1,17 +1,22 @@
 # -*- coding: utf-8 -*-
 
-"""Module providing IP detection functionality based on netifaces."""
+"""Module providing IP detection functionality based on the addresses of local interfaces."""
 
 import logging
+import socket
 
-import netifaces
-
-from .base import IPDetector, AF_INET6
-from ..common.six import ipaddress, ipnetwork
+from .base import IPDetector, AF_INET, AF_INET6
+from ..common.six import ipnetwork
+from ..common import ifaddrs, netlink
 
 LOG = logging.getLogger(__name__)
 
 
+def _preference(address):
+    """Sort key putting stable, usable addresses first."""
+    return (address.tentative, address.deprecated, address.temporary)
+
+
 def _default_interface():
     """Return the default interface name for common operating systems."""
     import platform
@@ -27,7 +32,10 @@ class IPDetector_Iface(IPDetector):
     """
     IPDetector to detect an IP address assigned to a local interface.
 
-    This is roughly equivalent to using `ifconfig` or `ipconfig`.
+    This is roughly equivalent to using `ifconfig` or `ipconfig`. The
+    addresses are served from the snapshot of all interfaces shared by all
+    detectors, see dyndnsc.common.ifaddrs. Addresses that are tentative,
+    deprecated or temporary are only used if no other address matches.
     """
 
     configuration_key = "iface"
@@ -63,34 +71,35 @@ class IPDetector_Iface(IPDetector):
         """Return true, as this detector only queries local data."""
         return True
 
+    def netlink_groups(self):
+        """Return the rtnetlink group for address changes of our family."""
+        if self.opts_family == AF_INET6:
+            return netlink.RTMGRP_IPV6_IFADDR
+        return netlink.RTMGRP_IPV4_IFADDR
+
+    def is_affected_by(self, event):
+        """Return True for address changes on our interface."""
+        if event.type not in netlink.ADDR_EVENTS:
+            return False
+        if event.family != (AF_INET6 if self.opts_family == AF_INET6 else AF_INET):
+            return False
+        try:
+            return event.index == socket.if_nametoindex(self.opts_iface)
+        except OSError:
+            return False  # interface does not exist (yet)
+
     def _detect(self):
-        """Use the netifaces module to detect ifconfig information."""
+        """Look up the addresses of the interface in the shared snapshot."""
         theip = None
-        try:
-            if self.opts_family == AF_INET6:
-                addrlist = netifaces.ifaddresses(self.opts_iface)[netifaces.AF_INET6]
-            else:
-                addrlist = netifaces.ifaddresses(self.opts_iface)[netifaces.AF_INET]
-        except ValueError as exc:
-            LOG.error("netifaces choked while trying to get network interface"
-                      " information for interface '%s'", self.opts_iface,
-                      exc_info=exc)
-        else:  # now we have a list of addresses as returned by netifaces
-            for pair in addrlist:
-                try:
-                    detip = ipaddress(pair["addr"])
-                except (TypeError, ValueError) as exc:
-                    LOG.debug("Found invalid IP '%s' on interface '%s'!?",
-                              pair["addr"], self.opts_iface, exc_info=exc)
-                    continue
-                if self.netmask is not None:
-                    if detip in self.netmask:
-                        theip = pair["addr"]
-                    else:
-                        continue
-                else:
-                    theip = pair["addr"]
-                break  # we use the first IP found
+        family = AF_INET6 if self.opts_family == AF_INET6 else AF_INET
+        addresses = ifaddrs.SNAPSHOT.addresses(self.opts_iface, family)
+        if addresses is None:
+            LOG.error("Could not find network interface '%s'", self.opts_iface)
+        else:
+            for address in sorted(addresses, key=_preference):
+                if self.netmask is None or address.interface.ip in self.netmask:
+                    theip = address.address
+                    break  # we use the first IP found
         # theip can still be None at this point!
         self.set_current_value(theip)
         return theip
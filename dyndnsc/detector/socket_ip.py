@@ -4,8 +4,9 @@
 
 import logging
 
-from .base import IPDetector, AF_INET6
+from .base import IPDetector, AF_INET, AF_INET6
 from ..common.detect_ip import detect_ip, IPV4, IPV6_PUBLIC, GetIpException
+from ..common import netlink
 
 LOG = logging.getLogger(__name__)
 
@@ -29,6 +30,16 @@ class IPDetector_Socket(IPDetector):
         # but unsure if it gives the wanted IPs if system is offline
         return False
 
+    def netlink_groups(self):
+        """Return the rtnetlink groups for address and route changes of our family."""
+        if self.opts_family == AF_INET6:
+            return netlink.RTMGRP_IPV6_IFADDR | netlink.RTMGRP_IPV6_ROUTE
+        return netlink.RTMGRP_IPV4_IFADDR | netlink.RTMGRP_IPV4_ROUTE
+
+    def is_affected_by(self, event):
+        """Return True for any address or route change of our family."""
+        return event.family == (AF_INET6 if self.opts_family == AF_INET6 else AF_INET)
+
     def detect(self):
         """Detect the IP address."""
         if self.opts_family == AF_INET6:
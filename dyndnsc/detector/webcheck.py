@@ -2,67 +2,149 @@
 
 """Module containing logic for webcheck based detectors."""
 
+from functools import partial
+import json
 import logging
-from random import choice
+from operator import itemgetter
 import re
+import time
 
 import requests
 
 from .base import IPDetector, AF_INET, AF_INET6, AF_UNSPEC
 from ..common.six import ipaddress
-from ..common import constants
+from ..common import constants, health, http, race
 
 LOG = logging.getLogger(__name__)
 
 
-def _get_ip_from_url(url, parser, timeout=10):
+# responses larger than this are not read any further:
+MAX_BODY_SIZE = 64 * 1024
+_CHUNK_SIZE = 4096
+
+
+def _iter_lines(req, limit=MAX_BODY_SIZE):
+    """
+    Yield the lines of a streamed response body, reading at most limit bytes.
+
+    :param req: requests.Response, requested with stream=True
+    :param limit: maximum number of bytes to read
+    """
+    encoding = req.encoding or "utf-8"
+    pending = b""
+    size = 0
+    for chunk in req.iter_content(chunk_size=_CHUNK_SIZE):
+        size += len(chunk)
+        truncated = size > limit
+        if truncated:
+            LOG.warning("Response of '%s' is larger than %i bytes, ignoring the rest", req.url, limit)
+            chunk = chunk[:len(chunk) - (size - limit)]
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b"\r").decode(encoding, "replace")
+        if truncated:
+            break
+    if pending:
+        yield pending.rstrip(b"\r").decode(encoding, "replace")
+
+
+def _matches_family(theip, family):
+    """Return True if theip is an address of family, any address matches AF_UNSPEC."""
+    if family == AF_UNSPEC:
+        return True
+    try:
+        return ipaddress(theip).version == (4 if family == AF_INET else 6)
+    except ValueError:
+        return False
+
+
+def _get_ip_from_url(url, parser, timeout=10, family=AF_UNSPEC):
     LOG.debug("Querying IP address from '%s'", url)
+    started = time.monotonic()
+    theip = None
     try:
-        req = requests.get(url, headers=constants.REQUEST_HEADERS_DEFAULT, timeout=timeout)
+        req = http.get(url, family=None if family == AF_UNSPEC else family,
+                       headers=constants.REQUEST_HEADERS_DEFAULT, timeout=timeout, stream=True)
+        try:
+            if req.status_code == 200:
+                lines = _iter_lines(req)
+                if hasattr(parser, "parse_lines"):
+                    theip = parser.parse_lines(lines)
+                else:
+                    theip = parser("\n".join(lines))
+                # read the rest of the (limited) body, so the connection goes back to the pool:
+                for _ in lines:
+                    pass
+            else:
+                LOG.debug("Wrong http status code for '%s': %i", url, req.status_code)
+        finally:
+            # only discards the connection if the body was not read completely:
+            req.close()
     except requests.exceptions.RequestException as exc:
         LOG.debug("webcheck failed for url '%s'", url, exc_info=exc)
-        return None
-    else:
-        if req.status_code == 200:
-            return parser(req.text)
-        else:
-            LOG.debug("Wrong http status code for '%s': %i", url, req.status_code)
-    return None
+    if theip is not None and not _matches_family(theip, family):
+        LOG.debug("Ignoring address '%s' of the wrong family from '%s'", theip, url)
+        theip = None
+    health.TRACKER.record(url, theip is not None, time.monotonic() - started)
+    return theip
 
 
-def _parser_plain(text):
-    try:
-        return str(ipaddress(text.strip()))
-    except ValueError as exc:
-        LOG.warning("Error parsing IP address '%s':", text, exc_info=exc)
-        return None
+class TextParser(object):
+    """Parser needing the complete response text."""
 
+    def __init__(self, func):
+        """
+        Initialize.
 
-def _parser_line_regex(text, pattern="Current IP Address: (.*?)(<.*){0,1}$"):
-    regex = re.compile(pattern)
-    for line in text.splitlines():
-        match_obj = regex.search(line)
-        if match_obj is not None:
-            return str(ipaddress(match_obj.group(1)))
-    LOG.debug("Output '%s' could not be parsed", text)
-    return None
+        :param func: callable taking the response text and returning an IP or None
+        """
+        self.func = func
 
+    def __call__(self, text):
+        """Parse the response text."""
+        return self.func(text)
 
-def _parser_checkip_dns_he_net(text):
-    return _parser_line_regex(text, pattern="Your IP address is : (.*?)(<.*){0,1}$")
+    def parse_lines(self, lines):
+        """Parse the lines of a response."""
+        return self.func("\n".join(lines))
 
 
-def _parser_checkip(text):
-    return _parser_line_regex(text, pattern="Current IP Address: (.*?)(<.*){0,1}$")
+class LineRegexParser(object):
+    """Parser looking for the first line matching a regular expression."""
 
+    def __init__(self, pattern):
+        """
+        Initialize.
 
-def _parser_freedns_afraid(text):
-    return _parser_line_regex(text, pattern="Detected IP : (.*?)(<.*){0,1}$")
+        :param pattern: regular expression whose first group is the IP address
+        """
+        self.regex = re.compile(pattern)
+
+    def __call__(self, text):
+        """Parse the response text."""
+        return self.parse_lines(text.splitlines())
+
+    def parse_lines(self, lines):
+        """Parse the lines of a response, stopping at the first match."""
+        for line in lines:
+            match_obj = self.regex.search(line)
+            if match_obj is not None:
+                return str(ipaddress(match_obj.group(1)))
+        LOG.debug("Output could not be parsed using '%s'", self.regex.pattern)
+        return None
 
 
-def _parser_jsonip(text):
+def _plain(text):
+    try:
+        return str(ipaddress(text.strip()))
+    except ValueError as exc:
+        LOG.warning("Error parsing IP address '%s':", text, exc_info=exc)
+        return None
+
+
+def _jsonip(text):
     """Parse response text like the one returned by http://jsonip.com/."""
-    import json
     try:
         return str(json.loads(text).get("ip"))
     except ValueError as exc:
@@ -70,41 +152,100 @@ def _parser_jsonip(text):
         return None
 
 
+# parsers by name, as used in the detector-parser option:
+PARSERS = {
+    "plain": TextParser(_plain),
+    "checkip": LineRegexParser("Current IP Address: (.*?)(<.*){0,1}$"),
+    "checkip_dns_he_net": LineRegexParser("Your IP address is : (.*?)(<.*){0,1}$"),
+    "freedns_afraid": LineRegexParser("Detected IP : (.*?)(<.*){0,1}$"),
+    "jsonip": TextParser(_jsonip),
+}
+
+_parser_plain = PARSERS["plain"]
+_parser_checkip = PARSERS["checkip"]
+_parser_checkip_dns_he_net = PARSERS["checkip_dns_he_net"]
+_parser_freedns_afraid = PARSERS["freedns_afraid"]
+_parser_jsonip = PARSERS["jsonip"]
+
+
 class IPDetectorWebCheckBase(IPDetector):
     """Base Class for misc. web service based IP detection classes."""
 
     urls = None  # override in child class
     configuration_key = None
 
-    def __init__(self, url=None, parser=None, *args, **kwargs):
+    def __init__(self, url=None, parser=None, parallel=1, quorum=1, *args, **kwargs):
         """
         Initialize.
 
         :param url: URL to fetch and parse for IP detection
         :param parser: parser to use for above URL
+        :param parallel: number of built-in URLs to query at once, the
+            first valid answer wins (default: 1)
+        :param quorum: number of built-in URLs that must return the same
+            address for it to be accepted (default: 1)
         """
         super(IPDetectorWebCheckBase, self).__init__(*args, **kwargs)
 
         self.opts_url = url
         self.opts_parser = parser
+        self.opts_parallel = int(parallel)
+        self.opts_quorum = int(quorum)
+        if self.opts_parser is not None and self.opts_parser not in PARSERS:
+            raise ValueError("IPDetectorWebCheckBase(): unknown parser '%s', please use one of %s" %
+                             (self.opts_parser, ", ".join(sorted(PARSERS))))
+        if self.opts_parallel < 1:
+            raise ValueError("IPDetectorWebCheckBase(): parallel must be at least 1, not %r" % parallel)
+        if self.opts_quorum < 1:
+            raise ValueError("IPDetectorWebCheckBase(): quorum must be at least 1, not %r" % quorum)
+        if self.opts_quorum > 1 and (url or self.opts_quorum > len(self.urls or ())):
+            raise ValueError("IPDetectorWebCheckBase(): a quorum of %i needs as many built-in URLs" % self.opts_quorum)
 
     def can_detect_offline(self):
         """Return false, as this detector generates http traffic."""
         return False
 
+    def _candidates(self):
+        """Return the (url, parser name) tuples to query."""
+        if self.opts_url and self.opts_parser:
+            return [(self.opts_url, self.opts_parser)]
+        count = max(self.opts_parallel, self.opts_quorum)
+        return health.TRACKER.choose(self.urls, count=count, key=itemgetter(0))
+
+    def _detect_quorum(self, candidates, calls):
+        """Return the address returned by a quorum of the calls or None."""
+        theip, answers = race.quorum(calls, self.opts_quorum)
+        if theip is None:
+            LOG.warning("No quorum of %i webchecks agreed on an address: %r", self.opts_quorum,
+                        {candidates[index][0]: answer for index, answer in answers.items()})
+            return None
+        for index, answer in answers.items():
+            if answer is not None and answer != theip:
+                health.TRACKER.record_disagreement(candidates[index][0])
+        return theip
+
     def detect(self):
         """
         Try to contact a remote webservice and parse the returned output.
 
+        Webservices are chosen randomly, preferring fast and reliable ones
+        and skipping those that failed repeatedly. With parallel > 1, several
+        webservices are queried at once and the first answer that can be
+        parsed is used. With quorum > 1, an answer is only used once that
+        many webservices returned it. Detectors of a single address family
+        connect over that family only and ignore addresses of the other one,
+        as many webservices are reachable over both.
+
         Determine the IP address from the parsed output and return.
         """
-        if self.opts_url and self.opts_parser:
-            url = self.opts_url
-            parser = self.opts_parser
+        candidates = self._candidates()
+        calls = [partial(_get_ip_from_url, url, PARSERS[parser], family=self.af()) for url, parser in candidates]
+        if self.opts_quorum > 1:
+            theip = self._detect_quorum(candidates, calls)
+        elif len(calls) == 1:
+            theip = calls[0]()
         else:
-            url, parser = choice(self.urls)  # noqa: S311
-        parser = globals().get("_parser_" + parser)
-        theip = _get_ip_from_url(url, parser)
+            theip = race.first(calls)
         if theip is None:
             LOG.info("Could not detect IP using webcheck! Offline?")
         self.set_current_value(theip)
@@ -205,8 +346,66 @@ class IPDetectorWebCheck46(IPDetectorWebCheckBase):
         ("https://ident.me", "plain"),
     )
 
-    def __init__(self, *args, **kwargs):
-        """Initialize."""
+    # single stack URLs used for happy eyeballs:
+    family_urls = {
+        AF_INET: IPDetectorWebCheck.urls,
+        AF_INET6: IPDetectorWebCheck6.urls,
+    }
+
+    def __init__(self, prefer="INET6", stagger=0.25, *args, **kwargs):
+        """
+        Initialize.
+
+        :param prefer: address family to query first, INET6 (default) or INET
+        :param stagger: seconds to wait for the preferred family before
+            also querying the other one (default: 0.25)
+        """
         super(IPDetectorWebCheck46, self).__init__(*args, **kwargs)
 
         self.opts_family = AF_UNSPEC
+        self.opts_prefer = str(prefer).upper()
+        self.opts_stagger = float(stagger)
+        if self.opts_prefer not in ("INET", "INET6"):
+            raise ValueError("IPDetectorWebCheck46(): prefer must be INET or INET6, not %r" % prefer)
+        if self.opts_stagger < 0:
+            raise ValueError("IPDetectorWebCheck46(): stagger must not be negative, not %r" % stagger)
+        # the addresses of all families detected by the last detect() call:
+        self.addresses = {}
+
+    def _families(self):
+        """Return the address families in order of preference."""
+        if self.opts_prefer == "INET":
+            return [AF_INET, AF_INET6]
+        return [AF_INET6, AF_INET]
+
+    def detect(self):
+        """
+        Detect the address of the preferred family, or the other if it is faster.
+
+        Unless an URL, parallel or quorum option is given, single stack
+        webservices are raced "Happy Eyeballs" style (RFC 8305): the
+        preferred family is queried first and the other one after the
+        stagger delay, or right away if the first query failed. Each query
+        connects over its own family only, so a broken IPv6 path to a dual
+        stack webservice cannot stall the IPv4 query. The first
+        address detected is returned. The other family is queried after the
+        stagger delay even if the preferred one answered already, and its
+        answer is awaited for another stagger delay, so that the addresses
+        attribute holds both addresses on dual stack hosts.
+        """
+        if self.opts_url or self.opts_parallel > 1 or self.opts_quorum > 1:
+            self.addresses = {}
+            return super(IPDetectorWebCheck46, self).detect()
+        families = self._families()
+        candidates = [health.TRACKER.choose(self.family_urls[family], key=itemgetter(0))[0]
+                      for family in families]
+        # each family is queried over connections of that family only:
+        calls = [partial(_get_ip_from_url, url, PARSERS[parser], family=family)
+                 for family, (url, parser) in zip(families, candidates)]
+        theip, answers = race.staggered(calls, self.opts_stagger, linger=self.opts_stagger)
+        self.addresses = {families[index]: answer for index, answer in answers.items() if answer is not None}
+        LOG.debug("Happy eyeballs detected %r", self.addresses)
+        if theip is None:
+            LOG.info("Could not detect IP using webcheck! Offline?")
+        self.set_current_value(theip)
+        return theip
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+
+"""Module containing the scheduler that drives dynamic dns clients."""
+
+from concurrent import futures
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from .core import check_clients, group_clients, prime_dns, sync_clients
+from .common import deadlines, ifaddrs, netlink
+
+LOG = logging.getLogger(__name__)
+
+
+def _check(clients, timeout=None):
+    with deadlines.deadline(timeout):
+        if len(clients) == 1:
+            clients[0].check()
+        else:
+            check_clients(clients)
+
+
+def _sync(clients):
+    if len(clients) == 1:
+        clients[0].sync()
+    else:
+        sync_clients(clients)
+
+
+def sync_all(clients, workers=1, jitter=0, delayfunc=time.sleep, dns_concurrency=0, timefunc=time.monotonic):
+    """
+    Run sync() on all clients, e.g. for the initial synchronization.
+
+    Each sync is started at a random offset of up to jitter seconds from
+    the start, so that many clients configured for the same service do not
+    hit it all at once. The syncs are handed to the workers when their
+    offset is reached, the workers themselves never wait, so all syncs are
+    started within jitter seconds. Clients whose updates can be combined
+    are synced together.
+
+    :param clients: iterable of DynDnsClient instances
+    :param workers: maximum number of syncs running concurrently
+    :param jitter: maximum random delay in seconds before each sync
+    :param delayfunc: callable sleeping for the given amount of seconds
+    :param dns_concurrency: look up the DNS records of all clients up front
+        with this many concurrent lookups, 0 disables this. Only used
+        without jitter, which spreads the lookups on purpose.
+    :param timefunc: callable returning the current time in seconds
+    :return: number of clients whose sync raised an exception
+    """
+    clients = list(clients)
+    if dns_concurrency > 0 and not jitter and len(clients) > 1:
+        prime_dns(clients, dns_concurrency)
+    starts = sorted(((random.uniform(0, jitter), group) for group in group_clients(clients)),  # noqa: S311
+                    key=lambda start: start[0])
+    failed = 0
+    with futures.ThreadPoolExecutor(max_workers=max(int(workers), 1)) as executor:
+        started = timefunc()
+        pending = {}
+        for offset, group in starts:
+            delay = started + offset - timefunc()
+            if delay > 0:
+                delayfunc(delay)
+            pending[executor.submit(_sync, group)] = group
+        for future in futures.as_completed(pending):
+            exc = future.exception()
+            if exc is not None:
+                failed += len(pending[future])
+                LOG.error("Initial sync for '%s' failed",
+                          ",".join(client.updater.hostname for client in pending[future]), exc_info=exc)
+    return failed
+
+
+class Scheduler(object):
+    """
+    Run the checks of dynamic dns clients exactly when they become due.
+
+    Clients are kept in a priority queue keyed by the point in time at which
+    their next check() is due, so that the scheduler only wakes up when there
+    is actual work to be done.
+
+    With more than one worker, due checks run in threads of their own, at
+    most workers at a time, so that a slow detector or updater does not
+    stall the other clients. A check running longer than the timeout is
+    reported as late and no longer counted against the workers.
+
+    Clients that are due at the same time and whose updates can be combined
+    are checked together.
+
+    Clients can be woken up from other threads, e.g. when an event signals
+    that their IP may have changed.
+
+    The DNS lookups of clients due at the same time can be done up front,
+    concurrently and only once per hostname.
+    """
+
+    def __init__(self, clients, workers=1, timeout=None, state_store=None, timefunc=time.time, delayfunc=None,
+                 dns_concurrency=0):
+        """
+        Initialize.
+
+        :param clients: iterable of DynDnsClient instances
+        :param workers: maximum number of checks running concurrently
+        :param timeout: seconds a check may take, its HTTP requests time out
+            at this deadline and a check still running after it is reported
+            as late
+        :param state_store: optional StateStore saved after checks completed
+        :param dns_concurrency: maximum number of concurrent DNS lookups for
+            clients due at the same time, 0 disables looking them up up front
+        :param timefunc: callable returning the current time in seconds
+        :param delayfunc: callable sleeping for the given amount of seconds,
+            by default the scheduler waits on an event interrupted by wake()
+        """
+        self._timefunc = timefunc
+        self._delayfunc = delayfunc
+        self._workers = max(int(workers), 1)
+        self._timeout = timeout
+        self._state_store = state_store
+        self._dns_concurrency = dns_concurrency
+        self._running = {}  # future -> (clients, started, late)
+        self._queue = []
+        self._queued = {}  # client -> counter of its valid queue entry
+        self._paused = set()
+        self._counter = itertools.count()  # tie breaker for equal deadlines
+        self._lock = threading.Lock()
+        self._woken = set()
+        self._wakeup = threading.Event()
+        for client in clients:
+            self.schedule(client)
+
+    def __len__(self):
+        """Return the number of scheduled clients."""
+        return len(self._queued) + sum(len(clients) for clients, _, _ in self._running.values())
+
+    def schedule(self, client, deadline=None):
+        """
+        Add the client to the queue.
+
+        :param client: DynDnsClient instance
+        :param deadline: point in time, defaults to client.next_check_time()
+        """
+        if deadline is None:
+            deadline = client.next_check_time()
+        if deadline is None:
+            LOG.info("'%s' is paused and will not be checked anymore", client.updater.hostname)
+            self._queued.pop(client, None)
+            self._paused.add(client)
+            return
+        self._paused.discard(client)
+        counter = next(self._counter)
+        # an entry queued earlier for this client is now stale:
+        self._queued[client] = counter
+        heapq.heappush(self._queue, (deadline, counter, client))
+
+    def _pop_stale(self):
+        while self._queue and self._queued.get(self._queue[0][2]) != self._queue[0][1]:
+            heapq.heappop(self._queue)
+
+    def next_deadline(self):
+        """Return the earliest deadline in the queue or None if it is empty."""
+        self._pop_stale()
+        if not self._queue:
+            return None
+        return self._queue[0][0]
+
+    def wake(self, client):
+        """
+        Make the client check for a state change as soon as possible.
+
+        Can be called from any thread.
+
+        :param client: DynDnsClient instance
+        """
+        with self._lock:
+            self._woken.add(client)
+        self._wakeup.set()
+
+    def _process_wakeups(self):
+        with self._lock:
+            woken, self._woken = self._woken, set()
+        for client in woken:
+            LOG.debug("Woken up '%s'", client.updater.hostname)
+            client.request_check()
+            if client in self._queued:
+                self.schedule(client)
+            # running clients are scheduled according to request_check() when done
+
+    def _finish(self, clients, started, exc=None):
+        if exc is not None:
+            LOG.critical("An exception occurred in the dyndns loop", exc_info=exc)
+        for client in clients:
+            if exc is None:
+                self.schedule(client)
+            else:
+                # avoid busy looping on a client that keeps failing:
+                self.schedule(client, started + client.ipchangedetection_sleep)
+
+    def _active(self):
+        """Return the number of running checks that are not late."""
+        return sum(1 for (_, _, late) in self._running.values() if not late)
+
+    def _submit(self, clients, now):
+        future = futures.Future()
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                _check(clients, self._timeout)
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(None)
+
+        self._running[future] = (clients, now, False)
+        future.add_done_callback(lambda _: self._wakeup.set())
+        # a thread of its own, so that a hung check does not hold up a worker of a pool:
+        threading.Thread(target=run, name="dyndnsc-check", daemon=True).start()
+
+    def _reap(self, now):
+        for future, (clients, started, late) in list(self._running.items()):
+            if future.done():
+                del self._running[future]
+                self._finish(clients, started, future.exception())
+            elif not late and self._timeout is not None and now - started >= self._timeout:
+                LOG.warning("Check for '%s' is still running after %s seconds, not counting it as a worker anymore",
+                            ",".join(client.updater.hostname for client in clients), self._timeout)
+                self._running[future] = (clients, started, True)
+
+    def _next_wakeup(self):
+        wakeups = [started + self._timeout
+                   for (_, started, late) in self._running.values()
+                   if not late and self._timeout is not None]
+        deadline = self.next_deadline()
+        # with all workers busy, due clients wait until a check completes or is late:
+        if deadline is not None and self._active() < self._workers:
+            wakeups.append(deadline)
+        if not wakeups:
+            return None
+        return min(wakeups)
+
+    def _prime_dns(self, due):
+        # only clients with online detectors compare with the DNS in every check:
+        clients = [client for client in due if client.needs_check() and not client.detector.can_detect_offline()]
+        if len(clients) > 1:
+            try:
+                prime_dns(clients, self._dns_concurrency)
+            except Exception as exc:
+                LOG.warning("Looking up the DNS records of %i clients failed", len(clients), exc_info=exc)
+
+    def run_pending(self):
+        """
+        Check all clients that are due.
+
+        :return: seconds until the scheduler needs to run again or None if
+            nothing is due until a running check completes
+        """
+        self._process_wakeups()
+        now = self._timefunc()
+        self._reap(now)
+        due = []
+        while self.next_deadline() is not None and self.next_deadline() <= now:
+            client = heapq.heappop(self._queue)[2]
+            del self._queued[client]
+            due.append(client)
+        if self._dns_concurrency > 0:
+            self._prime_dns(due)
+        active = self._active()
+        for clients in group_clients(due):
+            if self._workers > 1:
+                if active < self._workers:
+                    self._submit(clients, now)
+                    active += 1
+                else:
+                    for client in clients:
+                        self.schedule(client, now)
+                continue
+            try:
+                _check(clients, self._timeout)
+            except Exception as exc:
+                self._finish(clients, now, exc)
+            else:
+                self._finish(clients, now)
+        if self._state_store is not None:
+            try:
+                self._state_store.save()
+            except OSError as exc:
+                # e.g. a full disk, the state is saved again on the next run:
+                LOG.error("Saving the state to '%s' failed", self._state_store.filename, exc_info=exc)
+        wakeup = self._next_wakeup()
+        if wakeup is None:
+            return None
+        return max(wakeup - self._timefunc(), 0)
+
+    def wait(self, delay):
+        """
+        Sleep for delay seconds, until a running check completes or wake() is called.
+
+        :param delay: seconds, None waits for a running check to complete
+        """
+        if self._delayfunc is not None and not self._running:
+            self._delayfunc(delay)
+        else:
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def shutdown(self):
+        """Stop tracking running checks without waiting for them, they complete in the background."""
+        self._running.clear()
+
+    def run(self):
+        """Check clients until the queue is empty, which is usually never."""
+        try:
+            while True:
+                delay = self.run_pending()
+                if delay is None and not self._running:
+                    if self._paused:
+                        LOG.error("All %i client(s) are paused, stopping: %s", len(self._paused),
+                                  ",".join(sorted(client.updater.hostname for client in self._paused)))
+                    break
+                LOG.debug("Waiting %s seconds until next check", delay)
+                self.wait(delay)
+        finally:
+            self.shutdown()
+
+
+def watch_netlink(scheduler, clients):
+    """
+    Wake up clients whose detectors are affected by rtnetlink events.
+
+    :param scheduler: Scheduler instance
+    :param clients: list of DynDnsClient instances
+    :return: the started NetlinkMonitor or None if there was nothing to watch
+    """
+    clients = [client for client in clients if client.detector.netlink_groups()]
+    if not clients:
+        LOG.info("None of the detectors can make use of netlink events")
+        return None
+    if not netlink.available():
+        LOG.warning("netlink events are not supported on this system")
+        return None
+    groups = 0
+    for client in clients:
+        groups |= client.detector.netlink_groups()
+
+    def on_event(event):
+        if event is None or event.type in netlink.ADDR_EVENTS:
+            ifaddrs.SNAPSHOT.invalidate()
+        for client in clients:
+            # event None means that events were lost:
+            if event is None or client.detector.is_affected_by(event):
+                scheduler.wake(client)
+
+    monitor = netlink.NetlinkMonitor(groups, on_event)
+    monitor.start()
+    return monitor
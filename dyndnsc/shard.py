@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""Run dynamic dns clients sharded across several worker processes."""
+
+import logging
+import multiprocessing
+import queue
+import time
+import zlib
+
+from .common.backoff import Backoff
+
+LOG = logging.getLogger(__name__)
+
+
+def shard_for(name, shards):
+    """
+    Return the shard a client belongs to.
+
+    The mapping only depends on the client name and the number of shards,
+    so a client stays in the same shard across restarts.
+
+    :param name: name of the client, i.e. its configuration section
+    :param shards: number of shards
+    :return: integer between 0 and shards - 1
+    """
+    return zlib.crc32(name.encode("utf-8")) % shards
+
+
+def split_configs(collected_configs, shards):
+    """
+    Split collected client configurations into shards.
+
+    :param collected_configs: dict of client name to configuration, see conf.collect_config()
+    :param shards: number of shards
+    :return: list of shards dicts, some of which may be empty
+    """
+    result = [{} for _ in range(shards)]
+    for name in sorted(collected_configs):
+        result[shard_for(name, shards)][name] = collected_configs[name]
+    return result
+
+
+def client_status(clients):
+    """
+    Summarize the state of the given clients.
+
+    :param clients: list of DynDnsClient instances
+    :return: dict with the numbers of clients, paused and backing off clients
+        as well as the total number of detections and DNS lookups
+    """
+    return {
+        "clients": len(clients),
+        "paused": sum(1 for client in clients if client.paused),
+        "retrying": sum(1 for client in clients if client.retry_at is not None),
+        "detections": sum(client.stats["detections"] for client in clients),
+        "dns_lookups": sum(client.stats["dns_lookups"] for client in clients),
+    }
+
+
+class Supervisor(object):
+    """
+    Start one worker process per shard and restart crashed workers.
+
+    Workers are started with target(index, configs, status_queue) and can
+    put (index, status) tuples onto status_queue, the latest status of every
+    shard is kept in the status attribute.
+    """
+
+    def __init__(self, collected_configs, shards, target, restart=True, min_uptime=300,
+                 context=None, timefunc=time.time):
+        """
+        Initialize.
+
+        :param collected_configs: dict of client name to configuration
+        :param shards: number of worker processes
+        :param target: callable run in the worker processes, must be picklable
+        :param restart: restart workers that crashed, i.e. exited with a
+            non-zero code or were killed by a signal. Workers exiting cleanly,
+            e.g. because all of their clients are paused, are not restarted
+        :param min_uptime: seconds a worker must have run for its restart backoff to be reset
+        :param context: multiprocessing context, defaults to the platform default
+        :param timefunc: callable returning the current time in seconds
+        """
+        self.shards = split_configs(collected_configs, shards)
+        self.target = target
+        self.restart = restart
+        self.min_uptime = min_uptime
+        self.status = {}
+        self.restarts = 0
+        self._context = context or multiprocessing.get_context()
+        self._timefunc = timefunc
+        self._status_queue = self._context.Queue()
+        self._processes = {}  # index -> (process, started)
+        self._restart_at = {}  # index -> point in time
+        self._backoff = {}  # index -> Backoff
+        self._exitcodes = {}
+
+    def _start(self, index):
+        process = self._context.Process(
+            target=self.target, args=(index, self.shards[index], self._status_queue),
+            name="dyndnsc-shard-%i" % index, daemon=True)
+        process.start()
+        LOG.info("Started shard %i with %i client(s) as pid %s", index, len(self.shards[index]), process.pid)
+        self._processes[index] = (process, self._timefunc())
+
+    def start(self):
+        """Start the workers of all non-empty shards."""
+        for index, configs in enumerate(self.shards):
+            if configs:
+                self._start(index)
+
+    def _reap(self, now):
+        for index, (process, started) in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            del self._processes[index]
+            self._exitcodes[index] = process.exitcode
+            if process.exitcode == 0:
+                # restarting would e.g. repeat the updates that paused its clients:
+                LOG.info("Shard %i (pid %s) exited cleanly", index, process.pid)
+                continue
+            if not self.restart:
+                continue
+            backoff = self._backoff.setdefault(index, Backoff(base=1, cap=300))
+            if now - started >= self.min_uptime:
+                backoff.reset()
+            delay = backoff.failure()
+            LOG.error("Shard %i (pid %s) exited with code %s, restarting in %.1f seconds",
+                      index, process.pid, process.exitcode, delay)
+            self._restart_at[index] = now + delay
+
+    def _collect(self, timeout):
+        while True:
+            try:
+                index, status = self._status_queue.get(timeout=timeout)
+            except queue.Empty:
+                return
+            self.status[index] = status
+            LOG.debug("Shard %i: %r", index, status)
+            timeout = 0  # only drain what is already there
+
+    def poll(self, timeout=1):
+        """
+        Collect status updates and restart workers that exited.
+
+        :param timeout: seconds to wait for a status update
+        :return: True as long as any worker is running or about to be restarted
+        """
+        self._collect(timeout)
+        now = self._timefunc()
+        self._reap(now)
+        for index, restart_at in list(self._restart_at.items()):
+            if restart_at <= now:
+                del self._restart_at[index]
+                self.restarts += 1
+                self._start(index)
+        return bool(self._processes or self._restart_at)
+
+    def stop(self):
+        """Terminate all workers."""
+        self._restart_at.clear()
+        for process, _ in self._processes.values():
+            process.terminate()
+        for index, (process, _) in list(self._processes.items()):
+            process.join()
+            self._exitcodes[index] = process.exitcode
+        self._processes.clear()
+
+    def run(self):
+        """
+        Run until all workers exited, with restarts only once all exited cleanly.
+
+        :return: 0 if all workers exited cleanly, 1 otherwise
+        """
+        self.start()
+        try:
+            while self.poll():
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        self._collect(0)
+        return 1 if any(self._exitcodes.values()) else 0
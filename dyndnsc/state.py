@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""Module containing the on-disk store for the state of dyndns clients."""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+LOG = logging.getLogger(__name__)
+
+
+class StateStore(object):
+    """
+    Persist the state of dynamic dns clients across restarts.
+
+    States are grouped in sections, the state of the clients themselves is
+    kept in the "clients" section.
+
+    The state is kept in memory and written to a JSON file by save(). The
+    file is replaced atomically, so that an interrupted write never leaves
+    a truncated file behind.
+    """
+
+    def __init__(self, filename):
+        """
+        Initialize and load the state from filename, if present.
+
+        :param filename: path of the JSON file
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._data = {"clients": {}}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """Load the state from disk, starting afresh if it is unreadable."""
+        try:
+            with open(self.filename, "r") as fobj:
+                data = json.load(fobj)
+        except FileNotFoundError:
+            LOG.debug("No state file '%s' yet", self.filename)
+            return
+        except (OSError, ValueError) as exc:
+            LOG.warning("Ignoring unreadable state file '%s'", self.filename, exc_info=exc)
+            return
+        if not isinstance(data, dict) or not all(isinstance(states, dict) for states in data.values()):
+            LOG.warning("Ignoring state file '%s' with unexpected content", self.filename)
+            return
+        data.setdefault("clients", {})
+        with self._lock:
+            self._data = data
+            self._dirty = False
+
+    def get(self, name, section="clients"):
+        """
+        Return the state stored for name.
+
+        :param name: key of the client, usually its hostname
+        :param section: name of the section holding the state
+        :return: dictionary, empty if nothing was stored
+        """
+        with self._lock:
+            return dict(self._data.get(section, {}).get(name, {}))
+
+    def items(self, section):
+        """
+        Return all states stored in section.
+
+        :param section: name of the section
+        :return: dictionary of name to state
+        """
+        with self._lock:
+            return {name: dict(state) for name, state in self._data.get(section, {}).items()}
+
+    def set(self, name, state, section="clients"):
+        """
+        Store the state for name, to be written by the next save().
+
+        :param name: key of the client, usually its hostname
+        :param state: dictionary of JSON serializable values
+        :param section: name of the section holding the state
+        """
+        with self._lock:
+            states = self._data.setdefault(section, {})
+            if states.get(name) != state:
+                states[name] = dict(state)
+                self._dirty = True
+
+    def save(self):
+        """Write the state to disk, if it changed since the last save()."""
+        with self._lock:
+            if not self._dirty:
+                return
+            content = json.dumps(self._data, indent=1, sort_keys=True)
+            self._dirty = False
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        tmpname = None
+        try:
+            fdesc, tmpname = tempfile.mkstemp(dir=dirname, prefix=".dyndnsc-state-")
+            with os.fdopen(fdesc, "w") as fobj:
+                fobj.write(content)
+                fobj.flush()
+                os.fsync(fobj.fileno())
+            os.replace(tmpname, self.filename)
+        except BaseException:
+            if tmpname is not None:
+                os.unlink(tmpname)
+            # so that the next save() tries again:
+            with self._lock:
+                self._dirty = True
+            raise
+        LOG.debug("Saved state to '%s'", self.filename)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for resolving through the authoritative nameservers."""
+
+import collections
+from socket import AF_INET, AF_INET6, AF_UNSPEC
+import socket
+import socketserver
+import struct
+import threading
+import unittest
+from unittest import mock
+
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+
+from dyndnsc.common import authdns
+
+ZONE = "example.test."
+RECORDS = {
+    (ZONE, "SOA"): "ns1.example.test. admin.example.test. 1 3600 600 86400 60",
+    (ZONE, "NS"): "ns1.example.test.",
+    ("ns1.example.test.", "A"): "127.0.0.1",
+    ("host.example.test.", "A"): "192.0.2.1",
+    ("host.example.test.", "AAAA"): "2001:db8::1",
+    ("big.example.test.", "A"): "192.0.2.2",
+}
+NAMES = {name for name, _ in RECORDS}
+
+
+class Nameserver(object):
+    """Authoritative nameserver for example.test answering over UDP and TCP."""
+
+    def __init__(self):
+        """Start serving on a free port of 127.0.0.1."""
+        self.queries = collections.Counter()
+        nameserver = self
+
+        class UDPHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                data, sock = self.request
+                sock.sendto(nameserver.answer(data, tcp=False), self.client_address)
+
+        class TCPHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                length = struct.unpack("!H", self.request.recv(2))[0]
+                wire = nameserver.answer(self.request.recv(length), tcp=True)
+                self.request.sendall(struct.pack("!H", len(wire)) + wire)
+
+        self.udp = socketserver.ThreadingUDPServer(("127.0.0.1", 0), UDPHandler)
+        self.port = self.udp.server_address[1]
+        self.tcp = socketserver.ThreadingTCPServer(("127.0.0.1", self.port), TCPHandler)
+        for server in (self.udp, self.tcp):
+            threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def answer(self, data, tcp):
+        """Return the wire format answer to the query in data."""
+        query = dns.message.from_wire(data)
+        question = query.question[0]
+        name, rdtype = question.name.to_text(), dns.rdatatype.to_text(question.rdtype)
+        self.queries[(name, rdtype)] += 1
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+        if name == "big.example.test." and not tcp:
+            response.flags |= dns.flags.TC
+        elif (name, rdtype) in RECORDS:
+            response.answer.append(dns.rrset.from_text(name, 60, "IN", rdtype, RECORDS[(name, rdtype)]))
+        else:
+            response.authority.append(dns.rrset.from_text(ZONE, 60, "IN", "SOA", RECORDS[(ZONE, "SOA")]))
+            if name not in NAMES:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+        return response.to_wire()
+
+    def close(self):
+        """Stop serving."""
+        for server in (self.udp, self.tcp):
+            server.shutdown()
+            server.server_close()
+
+
+class TestAuthoritativeResolver(unittest.TestCase):
+    """Test cases for AuthoritativeResolver."""
+
+    def setUp(self):
+        """Start a local nameserver and a resolver using it."""
+        self.nameserver = Nameserver()
+        self.now = 1000.0
+        self.resolver = self.get_resolver(self.nameserver.port)
+
+    def tearDown(self):
+        """Stop the local nameserver."""
+        self.nameserver.close()
+
+    def get_resolver(self, port, timeout=1):
+        """Return an AuthoritativeResolver finding the nameservers through the local nameserver."""
+        recursive = dns.resolver.Resolver(configure=False)
+        recursive.nameservers = ["127.0.0.1"]
+        recursive.port = self.nameserver.port
+        return authdns.AuthoritativeResolver(timeout=timeout, port=port, resolver=recursive,
+                                             timefunc=lambda: self.now)
+
+    def test_resolve(self):
+        """Test resolution and the caching of nameservers."""
+        self.assertEqual(("192.0.2.1", "2001:db8::1"), self.resolver.resolve("host.example.test", AF_UNSPEC))
+        self.assertEqual(("192.0.2.1",), self.resolver.resolve("host.example.test", AF_INET))
+        self.assertEqual(("2001:db8::1",), self.resolver.resolve("host.example.test", AF_INET6))
+        self.assertEqual((), self.resolver.resolve("missing.example.test", AF_INET))
+        self.assertEqual(1, self.nameserver.queries[(ZONE, "NS")])
+        self.assertEqual(1, self.nameserver.queries[("host.example.test.", "SOA")])
+        self.assertEqual(2, self.nameserver.queries[("host.example.test.", "A")])
+        # the nameservers are looked up again once their TTL expired:
+        self.now += 61
+        self.assertEqual(("192.0.2.1",), self.resolver.resolve("host.example.test", AF_INET))
+        self.assertEqual(2, self.nameserver.queries[(ZONE, "NS")])
+
+    def test_tcp_fallback(self):
+        """Test that truncated answers are repeated over TCP."""
+        self.assertEqual(("192.0.2.2",), self.resolver.resolve("big.example.test", AF_INET))
+        self.assertEqual(2, self.nameserver.queries[("big.example.test.", "A")])
+
+    def test_timeout(self):
+        """Test that silent nameservers time out."""
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(("127.0.0.1", 0))
+        try:
+            resolver = self.get_resolver(silent.getsockname()[1], timeout=0.2)
+            self.assertRaises(authdns.ResolutionError, resolver.resolve, "host.example.test", AF_INET)
+        finally:
+            silent.close()
+
+    def test_detector(self):
+        """Test IPDetector_DNS using the authoritative resolver."""
+        from dyndnsc.detector import dns as dns_detector
+        detector = dns_detector.IPDetector_DNS(hostname="host.example.test", family="INET", resolver="authoritative")
+        with mock.patch.object(authdns, "get_resolver", return_value=self.resolver):
+            self.assertEqual("192.0.2.1", detector.detect())
+            self.assertEqual(1, self.nameserver.queries[("host.example.test.", "A")])
+            # unreachable nameservers make the detector fall back to the system resolver:
+            with mock.patch.object(self.resolver, "query_many", side_effect=authdns.ResolutionError("failed")), \
+                    mock.patch.object(dns_detector, "resolve", return_value=("127.0.0.1",)):
+                self.assertEqual("127.0.0.1", detector.detect())
+        self.assertRaises(ValueError, dns_detector.IPDetector_DNS, hostname="example.com", resolver="nonexistent")
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the backoff."""
+
+import unittest
+
+from dyndnsc.common.backoff import Backoff
+
+
+class TestBackoff(unittest.TestCase):
+    """Test cases for Backoff."""
+
+    def test_backoff(self):
+        """Run tests for Backoff."""
+        backoff = Backoff(base=10, cap=50, randfunc=lambda low, high: (low, high))
+        self.assertEqual((5, 10), backoff.failure())
+        self.assertEqual((10, 20), backoff.failure())
+        self.assertEqual((20, 40), backoff.failure())
+        self.assertEqual((25, 50), backoff.failure())
+        self.assertEqual((25, 50), backoff.failure())
+        self.assertEqual(5, backoff.failures)
+        backoff.reset()
+        self.assertEqual(0, backoff.failures)
+        self.assertEqual((5, 10), backoff.failure())
+
+    def test_jitter(self):
+        """Test that delays are randomized within bounds."""
+        delays = {Backoff(base=10).failure() for _ in range(20)}
+        self.assertTrue(all(5 <= delay <= 10 for delay in delays))
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the DNS wire format client."""
+
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+import dns.message
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+
+from dyndnsc.common import dnswire
+
+from .test_authdns import Nameserver
+
+
+class TestWireFormat(unittest.TestCase):
+    """Test cases for encoding queries and decoding responses."""
+
+    def test_encode_query(self):
+        """Test that queries are understood by dnspython."""
+        query = dns.message.from_wire(dnswire.encode_query(4711, "whoami.cloudflare", dnswire.TXT, dnswire.CH))
+        self.assertEqual(4711, query.id)
+        self.assertEqual("whoami.cloudflare.", query.question[0].name.to_text())
+        self.assertEqual(dns.rdatatype.TXT, query.question[0].rdtype)
+        self.assertEqual(dns.rdataclass.CH, query.question[0].rdclass)
+        self.assertEqual(dnswire.encode_name("example.com."), dnswire.encode_name("example.com"))
+        self.assertEqual(b"\x00", dnswire.encode_name("."))
+        self.assertRaises(dnswire.DnsWireError, dnswire.encode_name, "a" * 64 + ".com")
+
+    def test_decode_response(self):
+        """Test parsing compressed A, AAAA, TXT and CNAME records."""
+        query = dns.message.make_query("www.example.test", "A")
+        response = dns.message.make_response(query)
+        response.answer.append(dns.rrset.from_text("www.example.test.", 60, "IN", "CNAME", "host.example.test."))
+        response.answer.append(dns.rrset.from_text("host.example.test.", 30, "IN", "A", "192.0.2.1", "192.0.2.2"))
+        response.answer.append(dns.rrset.from_text("host.example.test.", 30, "IN", "AAAA", "2001:db8::1"))
+        response.answer.append(dns.rrset.from_text("host.example.test.", 30, "IN", "TXT", '"192.0." "2.3"'))
+        qid, answer = dnswire.decode_response(response.to_wire())
+        self.assertEqual(query.id, qid)
+        self.assertEqual(dnswire.NOERROR, answer.rcode)
+        self.assertFalse(answer.truncated)
+        self.assertEqual((dnswire.CNAME, 60, None), answer.records[0])
+        self.assertEqual(["192.0.2.1", "192.0.2.2"], sorted(answer.values(dnswire.A)))
+        self.assertEqual(["2001:db8::1"], answer.values(dnswire.AAAA))
+        self.assertEqual(["192.0.2.3"], answer.values(dnswire.TXT))
+
+    def test_decode_invalid(self):
+        """Test that invalid responses are rejected."""
+        wire = dns.message.make_response(dns.message.make_query("example.test", "A")).to_wire()
+        self.assertRaises(dnswire.DnsWireError, dnswire.decode_response, wire[:5])
+        self.assertRaises(dnswire.DnsWireError, dnswire.decode_response, wire[:-3])
+        self.assertRaises(dnswire.DnsWireError, dnswire.decode_response, dnswire.encode_query(1, "example.test", 1))
+
+    def test_system_nameservers(self):
+        """Test reading the nameservers from resolv.conf."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "resolv.conf")
+            with open(path, "w") as conf:
+                conf.write("# comment\nsearch example.test\nnameserver 192.0.2.1\nnameserver  fe80::1%eth0 \n")
+            self.assertEqual(["192.0.2.1", "fe80::1%eth0"], dnswire.system_nameservers(path))
+            with open(path, "w") as conf:
+                conf.write("options ndots:2\n")
+            self.assertEqual(["127.0.0.1"], dnswire.system_nameservers(path))
+            with mock.patch("dns.resolver.Resolver") as resolver:
+                resolver.return_value.nameservers = ["192.0.2.2"]
+                self.assertEqual(["192.0.2.2"], dnswire.system_nameservers(os.path.join(directory, "missing")))
+
+
+class TestClient(unittest.TestCase):
+    """Test cases for Client against a local nameserver."""
+
+    def setUp(self):
+        """Start a local nameserver."""
+        self.nameserver = Nameserver()
+        self.client = dnswire.Client(timeout=1)
+
+    def tearDown(self):
+        """Stop the local nameserver."""
+        self.nameserver.close()
+
+    def query(self, qname, rdtype):
+        """Return a Query for the local nameserver."""
+        return dnswire.Query("127.0.0.1", qname, rdtype, port=self.nameserver.port)
+
+    def test_query_many(self):
+        """Test queries in flight at the same time and the TCP fallback."""
+        answers = self.client.query_many([
+            self.query("host.example.test", dnswire.A),
+            self.query("host.example.test", dnswire.AAAA),
+            self.query("big.example.test", dnswire.A),
+            self.query("missing.example.test", dnswire.A),
+        ])
+        self.assertEqual(["192.0.2.1"], answers[0].values(dnswire.A))
+        self.assertEqual(["2001:db8::1"], answers[1].values(dnswire.AAAA))
+        self.assertEqual(["192.0.2.2"], answers[2].values(dnswire.A))
+        self.assertFalse(answers[2].truncated)
+        self.assertEqual(2, self.nameserver.queries[("big.example.test.", "A")])
+        self.assertEqual(dnswire.NXDOMAIN, answers[3].rcode)
+
+    def test_timeout(self):
+        """Test that unanswered queries time out."""
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(("127.0.0.1", 0))
+        try:
+            client = dnswire.Client(timeout=0.2)
+            query = dnswire.Query("127.0.0.1", "host.example.test", dnswire.A, port=silent.getsockname()[1])
+            self.assertEqual([None, ["192.0.2.1"]], [
+                answer if answer is None else answer.values(dnswire.A)
+                for answer in client.query_many([query, self.query("host.example.test", dnswire.A)])])
+            self.assertRaises(dnswire.DnsWireError, client.query, *query)
+            self.assertRaises(dnswire.DnsWireError, asyncio.run, client.aquery(*query))
+        finally:
+            silent.close()
+
+    def test_aquery(self):
+        """Test queries using the event loop."""
+        async def run():
+            return await asyncio.gather(
+                self.client.aquery("127.0.0.1", "host.example.test", dnswire.AAAA, port=self.nameserver.port),
+                self.client.aquery("127.0.0.1", "big.example.test", dnswire.A, port=self.nameserver.port))
+
+        host, big = asyncio.run(run())
+        self.assertEqual(["2001:db8::1"], host.values(dnswire.AAAA))
+        self.assertEqual(["192.0.2.2"], big.values(dnswire.A))
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for endpoint health tracking."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from dyndnsc.common.health import HealthTracker
+from dyndnsc.state import StateStore
+
+
+class FakeClock(object):
+    """Clock that only advances when told to."""
+
+    def __init__(self):
+        """Initialize."""
+        self.now = 1000.0
+
+    def time(self):
+        """Return the current fake time."""
+        return self.now
+
+
+class TestHealthTracker(unittest.TestCase):
+    """Test cases for HealthTracker."""
+
+    def test_record(self):
+        """Test the moving averages."""
+        tracker = HealthTracker(alpha=0.5)
+        tracker.record("a", True, 1.0)
+        self.assertEqual(1.0, tracker.get("a").latency)
+        self.assertEqual(0.0, tracker.get("a").error_rate)
+        tracker.record("a", False, 3.0)
+        self.assertEqual(2.0, tracker.get("a").latency)
+        self.assertEqual(0.5, tracker.get("a").error_rate)
+        self.assertEqual(1, tracker.get("a").failures)
+        tracker.record("a", True)
+        self.assertEqual(2.0, tracker.get("a").latency)
+        self.assertEqual(0.25, tracker.get("a").error_rate)
+        self.assertEqual(0, tracker.get("a").failures)
+
+    def test_circuit_breaker(self):
+        """Test that failing endpoints are skipped during the cooldown."""
+        clock = FakeClock()
+        tracker = HealthTracker(failure_threshold=2, cooldown=60, timefunc=clock.time)
+        tracker.record("dead", False, 10)
+        self.assertTrue(tracker.available("dead"))
+        tracker.record("dead", False, 10)
+        self.assertFalse(tracker.available("dead"))
+        self.assertEqual(["alive"] * 20, [tracker.choose(["dead", "alive"])[0] for _ in range(20)])
+        # unless nothing else is left:
+        self.assertEqual(["alive", "dead"], tracker.choose(["dead", "alive"], count=2))
+        clock.now += 60
+        self.assertTrue(tracker.available("dead"))
+        # a single failure after the cooldown opens the breaker again:
+        tracker.record("dead", False, 10)
+        self.assertFalse(tracker.available("dead"))
+        clock.now += 60
+        tracker.record("dead", True, 0.1)
+        tracker.record("dead", False, 0.1)
+        self.assertTrue(tracker.available("dead"))
+
+    def test_choose(self):
+        """Test that the selection is weighted by latency and errors."""
+        randoms = iter([0.0, 0.99, 0.5, 0.5, 0.5])
+        tracker = HealthTracker(randfunc=lambda: next(randoms))
+        tracker.record("fast", True, 0.1)
+        tracker.record("slow", True, 0.9)
+        # fast has weight 10, slow weight 1.1, unknown weight 1:
+        self.assertEqual(["fast"], tracker.choose(["fast", "slow", "unknown"]))
+        self.assertEqual(["unknown"], tracker.choose(["fast", "slow", "unknown"]))
+        self.assertEqual(["fast", "slow", "unknown"], sorted(tracker.choose(["fast", "slow", "unknown"], count=5)))
+        randoms = iter([0.5])
+        self.assertEqual([("fast", 1)], tracker.choose([("slow", 2), ("fast", 1)], key=lambda item: item[0]))
+        self.assertEqual([], tracker.choose([]))
+
+    def test_attach(self):
+        """Test that the health is persisted in a state store."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, "state.json")
+            store = StateStore(filename)
+            tracker = HealthTracker()
+            tracker.attach(store)
+            tracker.record("https://example.com/", True, 0.5)
+            store.save()
+
+            tracker = HealthTracker()
+            tracker.attach(StateStore(filename))
+            self.assertEqual(0.5, tracker.get("https://example.com/").latency)
+            self.assertEqual({}, StateStore(filename).get("https://example.com/"))
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the shared HTTP session."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socket
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from dyndnsc.common import constants, http
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Handler answering with the client port, i.e. the connection used."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: N802
+        """Answer with the port of the client."""
+        body = str(self.client_address[1]).encode("ascii")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Keep quiet."""
+
+
+class TestHttp(unittest.TestCase):
+    """Test cases for the shared HTTP session."""
+
+    def setUp(self):
+        """Start a local HTTP server."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        self.url = "http://127.0.0.1:%i/" % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        """Stop the local HTTP server."""
+        http.configure()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session(self):
+        """Test that the session is shared and sends our user agent."""
+        session = http.get_session()
+        self.assertTrue(session is http.get_session())
+        self.assertEqual(constants.REQUEST_HEADERS_DEFAULT["User-Agent"], session.headers["User-Agent"])
+        http.close()
+        self.assertFalse(session is http.get_session())
+
+    def test_configure(self):
+        """Test that the pool size can be configured."""
+        http.configure(pool_connections=2, pool_maxsize=3)
+        adapter = http.get_session().get_adapter(self.url)
+        self.assertEqual(2, adapter._pool_connections)
+        self.assertEqual(3, adapter._pool_maxsize)
+
+    def test_family(self):
+        """Test that sessions of an address family only connect over that family."""
+        session = http.get_session(socket.AF_INET)
+        self.assertFalse(session is http.get_session())
+        self.assertTrue(session is http.get_session(socket.AF_INET))
+        self.assertEqual(socket.AF_INET, session.get_adapter(self.url).family)
+        # the local server only listens on 127.0.0.1:
+        self.assertEqual(200, http.get(self.url, family=socket.AF_INET, timeout=5).status_code)
+        self.assertRaises(requests.exceptions.ConnectionError, http.get, self.url, family=socket.AF_INET6, timeout=5)
+
+    def test_deadline(self):
+        """Test that the timeout of requests is cut down to the deadline."""
+        with mock.patch.object(http.get_session(), "get") as get:
+            http.get(self.url, timeout=60)
+            self.assertEqual(60, get.call_args[1]["timeout"])
+            with http.deadline(5):
+                http.get(self.url, timeout=60)
+                self.assertTrue(0 < get.call_args[1]["timeout"] <= 5)
+                with http.deadline(10):
+                    http.get(self.url)
+                    self.assertTrue(get.call_args[1]["timeout"] <= 5)
+            with http.deadline(0):
+                self.assertRaises(requests.exceptions.Timeout, http.get, self.url)
+            with http.deadline(None):
+                http.get(self.url)
+                self.assertEqual(None, get.call_args[1]["timeout"])
+            self.assertEqual(4, get.call_count)
+        self.assertEqual(None, http.timeout())
+
+    def test_keep_alive(self):
+        """Test that consecutive requests reuse the connection."""
+        ports = {http.get(self.url, timeout=5).text for _ in range(3)}
+        self.assertEqual(1, len(ports))
+        http.close()
+        self.assertFalse(ports.issuperset({http.get(self.url, timeout=5).text}))
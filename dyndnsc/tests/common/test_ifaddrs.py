@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the interface address snapshot."""
+
+import ipaddress
+import socket
+import unittest
+from unittest import mock
+
+from dyndnsc.common import ifaddrs, netlink
+
+
+def _address(address, family=socket.AF_INET, flags=0):
+    return netlink.InterfaceAddress(1, family, ipaddress.ip_interface(address), flags, None, None)
+
+
+class TestAddressSnapshot(unittest.TestCase):
+    """Test cases for AddressSnapshot."""
+
+    def setUp(self):
+        """Set up a snapshot with a fake clock and fake addresses."""
+        self.now = 100.0
+        self.snapshot = ifaddrs.AddressSnapshot(max_age=1, timefunc=lambda: self.now)
+        self.interfaces = {
+            "eth0": [_address("192.0.2.1/24"), _address("2001:db8::1/64", socket.AF_INET6)],
+            "eth1": [],
+        }
+
+    def test_snapshot(self):
+        """Test that a single snapshot serves all lookups until it expires or is invalidated."""
+        with mock.patch.object(netlink, "available", return_value=True), \
+                mock.patch.object(ifaddrs, "_netlink_addresses", return_value=self.interfaces) as dump:
+            self.assertEqual(["192.0.2.1"], [a.address for a in self.snapshot.addresses("eth0", socket.AF_INET)])
+            self.assertEqual(["2001:db8::1"], [a.address for a in self.snapshot.addresses("eth0", socket.AF_INET6)])
+            self.assertEqual([], self.snapshot.addresses("eth1", socket.AF_INET))
+            self.assertEqual(None, self.snapshot.addresses("foo0", socket.AF_INET))
+            self.assertEqual(1, dump.call_count)
+            self.now += 1
+            self.snapshot.addresses("eth0", socket.AF_INET)
+            self.assertEqual(2, dump.call_count)
+            self.snapshot.invalidate()
+            self.snapshot.addresses("eth0", socket.AF_INET)
+            self.assertEqual(3, dump.call_count)
+            self.assertEqual(3, self.snapshot.snapshots)
+
+    def test_fallback(self):
+        """Test that netifaces is used if rtnetlink fails."""
+        with mock.patch.object(netlink, "available", return_value=True), \
+                mock.patch.object(ifaddrs, "_netlink_addresses", side_effect=OSError("denied")), \
+                mock.patch.object(ifaddrs, "_netifaces_addresses", return_value=self.interfaces) as fallback:
+            self.assertEqual(1, len(self.snapshot.addresses("eth0", socket.AF_INET)))
+            self.assertEqual(1, fallback.call_count)
+
+    def test_netifaces(self):
+        """Test parsing the addresses reported by netifaces."""
+        netifaces = mock.Mock(AF_INET=2, AF_INET6=10)
+        netifaces.interfaces.return_value = ["eth0"]
+        netifaces.ifaddresses.return_value = {
+            2: [{"addr": "192.0.2.1", "netmask": "255.255.255.0"}, {"addr": "invalid"}],
+            10: [{"addr": "fe80::1%eth0", "netmask": "ffff:ffff:ffff:ffff::/64"}, {"addr": "2001:db8::1"}],
+        }
+        with mock.patch.dict("sys.modules", netifaces=netifaces):
+            addresses = ifaddrs._netifaces_addresses()["eth0"]
+        self.assertEqual(["192.0.2.1/24", "fe80::1/64", "2001:db8::1/128"],
+                         [str(address.interface) for address in addresses])
+        self.assertEqual([socket.AF_INET, socket.AF_INET6, socket.AF_INET6], [address.family for address in addresses])
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the rtnetlink client."""
+
+import shutil
+import socket
+import struct
+import subprocess  # noqa: S404
+import sys
+import unittest
+
+import pytest
+
+from dyndnsc.common import netlink
+
+
+def _message(msg_type, payload):
+    length = 16 + len(payload)
+    return struct.pack("=LHHLL", length, msg_type, 0, 0, 0) + payload + b"\0" * (netlink.align(length) - length)
+
+
+def _can_unshare():
+    if not netlink.available() or shutil.which("unshare") is None or shutil.which("ip") is None:
+        return False
+    return subprocess.call(["unshare", "-n", "true"], stderr=subprocess.DEVNULL) == 0  # noqa: S603, S607
+
+
+class TestNetlink(unittest.TestCase):
+    """Test cases for rtnetlink parsing."""
+
+    def test_parse_events(self):
+        """Run tests for parse_events()."""
+        data = (
+            _message(netlink.RTM_NEWADDR,
+                     struct.pack("=BBBBi", socket.AF_INET, 24, 0, 0, 3) + b"\x08\0\x01\0\xc0\0\x02\x07") +
+            _message(netlink.RTM_DELROUTE, struct.pack("=BBBBBBBBI", socket.AF_INET6, 0, 0, 0, 254, 0, 0, 1, 0)) +
+            _message(netlink.NLMSG_DONE, b"\0\0\0\0")
+        )
+        self.assertEqual([
+            netlink.NetlinkEvent(netlink.RTM_NEWADDR, socket.AF_INET, 3),
+            netlink.NetlinkEvent(netlink.RTM_DELROUTE, socket.AF_INET6, None),
+        ], netlink.parse_events(data))
+
+    def test_parse_truncated(self):
+        """Test that truncated messages are ignored."""
+        data = _message(netlink.RTM_NEWADDR, struct.pack("=BBBBi", socket.AF_INET, 24, 0, 0, 3))
+        self.assertEqual([], netlink.parse_events(data[:-4]))
+        self.assertEqual([], netlink.parse_events(b""))
+
+    def test_parse_addresses(self):
+        """Run tests for parse_addresses()."""
+        def attribute(attr_type, payload):
+            padding = b"\0" * (netlink.align(len(payload)) - len(payload))
+            return struct.pack("=HH", 4 + len(payload), attr_type) + payload + padding
+
+        data = (
+            # point to point link, the local address differs from the peer address:
+            _message(netlink.RTM_NEWADDR, struct.pack("=BBBBi", socket.AF_INET, 32, netlink.IFA_F_PERMANENT, 0, 2) +
+                     attribute(netlink.IFA_ADDRESS, socket.inet_aton("192.0.2.1")) +
+                     attribute(netlink.IFA_LOCAL, socket.inet_aton("192.0.2.2"))) +
+            _message(netlink.RTM_NEWADDR, struct.pack("=BBBBi", socket.AF_INET6, 64, 0, 0, 3) +
+                     attribute(netlink.IFA_ADDRESS, socket.inet_pton(socket.AF_INET6, "2001:db8::1")) +
+                     attribute(netlink.IFA_CACHEINFO, struct.pack("=IIII", 0, 600, 0, 0)) +
+                     attribute(netlink.IFA_FLAGS, struct.pack("=I", netlink.IFA_F_TEMPORARY | 0x100))) +
+            _message(netlink.RTM_NEWADDR, struct.pack("=BBBBi", socket.AF_PACKET, 0, 0, 0, 3)) +
+            _message(netlink.NLMSG_DONE, b"\0\0\0\0")
+        )
+        ipv4, ipv6 = netlink.parse_addresses(data)
+        self.assertEqual((2, socket.AF_INET, "192.0.2.2/32"), (ipv4.index, ipv4.family, str(ipv4.interface)))
+        self.assertEqual("192.0.2.2", ipv4.address)
+        self.assertEqual((None, None), (ipv4.preferred, ipv4.valid))
+        self.assertFalse(ipv4.temporary or ipv4.deprecated or ipv4.tentative)
+        self.assertEqual("2001:db8::1/64", str(ipv6.interface))
+        self.assertEqual(netlink.IFA_F_TEMPORARY | 0x100, ipv6.flags)
+        self.assertEqual((0, 600), (ipv6.preferred, ipv6.valid))
+        self.assertTrue(ipv6.temporary and ipv6.deprecated)
+
+    @pytest.mark.skipif(not netlink.available(), reason="requires rtnetlink")
+    def test_dump_addresses(self):
+        """Test that the addresses of the loopback interface are dumped."""
+        addresses = netlink.dump_addresses()
+        self.assertIn("127.0.0.1", [address.address for address in addresses])
+        self.assertTrue(all(address.family == socket.AF_INET for address in netlink.dump_addresses(socket.AF_INET)))
+
+    @pytest.mark.skipif(not _can_unshare(), reason="requires permission to create a network namespace")
+    def test_monitor(self):
+        """Test that address changes are reported, in a private network namespace."""
+        code = """
+import subprocess, threading
+from dyndnsc.common import netlink
+seen = threading.Event()
+def callback(event):
+    if event is not None and event.type == netlink.RTM_NEWADDR and event.index == 1:
+        seen.set()
+monitor = netlink.NetlinkMonitor(netlink.RTMGRP_IPV4_IFADDR, callback)
+monitor.start()
+subprocess.check_call(["ip", "addr", "add", "192.0.2.7/32", "dev", "lo"])
+assert seen.wait(5), "no event received"
+monitor.stop()
+"""
+        proc = subprocess.run(["unshare", "-n", sys.executable, "-c", code],  # noqa: S603, S607
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(0, proc.returncode, proc.stdout)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for racing calls."""
+
+import threading
+import time
+import unittest
+
+from dyndnsc.common import deadlines, race
+
+
+def answer(value, delay=0):
+    """Return a call returning value after delay seconds."""
+    def call():
+        time.sleep(delay)
+        return value
+    return call
+
+
+def fail():
+    """Raise an exception."""
+    raise RuntimeError("boom")
+
+
+class TestRace(unittest.TestCase):
+    """Test cases for racing calls."""
+
+    def test_first(self):
+        """Run tests for first()."""
+        self.assertEqual(None, race.first([]))
+        self.assertEqual(1, race.first([answer(1)]))
+        started = time.time()
+        self.assertEqual("fast", race.first([answer("slow", 2), fail, answer(None), answer("fast", 0.1)]))
+        self.assertTrue(time.time() - started < 1)
+        self.assertEqual(None, race.first([fail, answer(None)]))
+        self.assertEqual(2, race.first([answer(1), answer(2, 0.1)], accept=lambda result: result == 2))
+
+    def test_deadline(self):
+        """Test that the calls run within the deadline of the calling thread."""
+        self.assertEqual(None, race.first([deadlines.remaining], accept=lambda result: True))
+        with deadlines.deadline(0.5):
+            self.assertTrue(0 < race.first([deadlines.remaining]) <= 0.5)
+            self.assertTrue(0 < race.quorum([deadlines.remaining], 1, accept=lambda result: True)[0] <= 0.5)
+            self.assertTrue(0 < race.staggered([deadlines.remaining], 0.1)[0] <= 0.5)
+
+    def test_quorum(self):
+        """Run tests for quorum()."""
+        started = time.time()
+        result, answers = race.quorum(
+            [answer("a", 0.1), answer("b"), fail, answer("a", 0.2), answer("a", 5)], 2)
+        self.assertEqual("a", result)
+        self.assertTrue(time.time() - started < 1)
+        self.assertEqual({0: "a", 1: "b", 2: None, 3: "a"}, answers)
+        # give up as soon as no quorum is possible anymore:
+        started = time.time()
+        result, answers = race.quorum([answer("a"), answer("b"), answer(None, 0.1), answer("c", 5)], 3)
+        self.assertEqual(None, result)
+        self.assertTrue(time.time() - started < 1)
+        self.assertEqual((None, {}), race.quorum([answer("a")], 2))
+
+    def test_staggered(self):
+        """Run tests for staggered()."""
+        self.assertEqual((None, {}), race.staggered([], 0.1))
+        # the first call answers within the delay, the second is never started:
+        started = []
+        calls = [answer("first", 0.1), lambda: started.append(True)]
+        self.assertEqual(("first", {0: "first"}), race.staggered(calls, 1))
+        self.assertEqual([], started)
+        # the first call is slow, the second one wins and the first is awaited for linger seconds:
+        result, answers = race.staggered([answer("slow", 0.3), answer("fast")], 0.1, linger=1)
+        self.assertEqual("fast", result)
+        self.assertEqual({0: "slow", 1: "fast"}, answers)
+        # with linger, calls not started yet are started on schedule and awaited:
+        begin = time.time()
+        result, answers = race.staggered([answer("first"), answer("second"), answer("third", 5)], 0.1, linger=0.3)
+        self.assertEqual("first", result)
+        self.assertEqual({0: "first", 1: "second"}, answers)
+        self.assertTrue(0.2 <= time.time() - begin < 1)
+        # failures start the next call right away:
+        begin = time.time()
+        self.assertEqual(("b", {0: None, 1: None, 2: "b"}), race.staggered([fail, answer(None), answer("b")], 5))
+        self.assertTrue(time.time() - begin < 1)
+        begin = time.time()
+        self.assertEqual(None, race.staggered([answer("a", 5)], 0.1, timeout=0.1)[0])
+        self.assertTrue(time.time() - begin < 1)
+
+    def test_timeout(self):
+        """Test that first() gives up after the timeout."""
+        release = threading.Event()
+        started = time.time()
+        self.assertEqual(None, race.first([lambda: release.wait(5)], timeout=0.1))
+        self.assertTrue(time.time() - started < 1)
+        release.set()
@@ -3,7 +3,14 @@
 """Tests for detectors."""
 
 
+import asyncio
+import subprocess
+import sys
+import time
 import unittest
+from unittest import mock
+
+import responses
 
 from dyndnsc.detector.base import AF_INET, AF_INET6, AF_UNSPEC
 
@@ -30,8 +37,37 @@ class TestPluginDetectors(unittest.TestCase):
         for cls in dyndnsc.detector.manager.detector_classes():
             self.assertTrue(hasattr(cls, "configuration_key"))
             self.assertTrue(hasattr(cls, "af"))
+            self.assertEqual(cls, dyndnsc.detector.manager.get_detector_class(cls.configuration_key))
         self.assertRaises(ValueError, dyndnsc.detector.manager.get_detector_class, "nonexistent")
 
+    def test_detector_lazy_import(self):
+        """Test that looking up a detector class only imports its own module."""
+        code = ("import sys\n"
+                "from dyndnsc.detector.manager import get_detector_class\n"
+                "get_detector_class('null')\n"
+                "assert 'dyndnsc.detector.null' in sys.modules\n"
+                "assert 'dyndnsc.detector.dnswanip' not in sys.modules\n"
+                "assert 'dyndnsc.detector.webcheck' not in sys.modules\n")
+        subprocess.check_call([sys.executable, "-c", code])
+
+    def test_dnspython_lazy_import(self):
+        """Test that the detectors querying nameservers directly do not import dnspython."""
+        code = ("import sys\n"
+                "import dyndnsc.detector.dnswanip, dyndnsc.common.authdns\n"
+                "assert 'dns' not in sys.modules\n"
+                "assert 'asyncio' not in sys.modules\n")
+        subprocess.check_call([sys.executable, "-c", code])
+
+    def test_asyncio_lazy_import(self):
+        """Test that asyncio and requests are only imported when used."""
+        code = ("import sys\n"
+                "import dyndnsc, dyndnsc.cli\n"
+                "dyndnsc.cli.create_argparser()\n"
+                "assert 'asyncio' not in sys.modules\n"
+                "assert 'requests' not in sys.modules\n"
+                "assert 'urllib3' not in sys.modules\n")
+        subprocess.check_call([sys.executable, "-c", code])
+
 
 class TestIndividualDetectors(unittest.TestCase):
     """Test cases for detectors."""
@@ -41,6 +77,19 @@ class TestIndividualDetectors(unittest.TestCase):
         import dyndnsc.detector.dns as ns
         self.assertTrue(len(ns.resolve("localhost")) > 0)
         self.assertTrue(len(ns.resolve("localhost", family=ns.AF_INET)) > 0)
+        self.assertEqual(set(ns.resolve("localhost")), set(asyncio.run(ns.aresolve("localhost"))))
+        self.assertEqual((), asyncio.run(ns.aresolve("example.invalid")))
+
+    def test_adetect(self):
+        """Run tests for the async detector api."""
+        from dyndnsc.detector.dns import IPDetector_DNS
+        from dyndnsc.detector.command import IPDetector_Command
+        detector = IPDetector_DNS(hostname="localhost", family=AF_INET)
+        self.assertEqual("127.0.0.1", asyncio.run(detector.adetect()))
+        self.assertEqual("127.0.0.1", detector.get_current_value())
+        # the default implementation runs detect() in an executor:
+        detector = IPDetector_Command(command="echo 127.0.0.2")
+        self.assertEqual("127.0.0.2", asyncio.run(detector.adetect()))
 
     def test_detector_state_changes(self):
         """Run tests for IPDetector state changes."""
@@ -93,6 +142,43 @@ class TestIndividualDetectors(unittest.TestCase):
             val = detector.detect()
             self.assertTrue(val in ("::1", "fe80::1%lo0"), "%r not known" % val)
 
+    def test_dns_resolve_many(self):
+        """Test that identical lookups are done once, concurrently and within the limit."""
+        import threading
+        import dyndnsc.detector.dns as ns
+        lock = threading.Lock()
+        running = []
+        calls = []
+
+        def resolve(hostname, family):
+            with lock:
+                calls.append(hostname)
+                running.append(hostname)
+                concurrency.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(hostname)
+            return ("127.0.0.%i" % len(hostname),)
+
+        concurrency = []
+        detectors = [ns.IPDetector_DNS(hostname=hostname, family="INET")
+                     for hostname in ("a.example.com", "bb.example.com", "ccc.example.com", "a.example.com")]
+        with mock.patch.object(ns, "resolve", resolve):
+            self.assertEqual(3, ns.resolve_many(detectors, concurrency=2))
+            self.assertEqual(3, len(calls))
+            self.assertTrue(max(concurrency) <= 2)
+            # the detectors use the answers once:
+            self.assertEqual(["127.0.0.13", "127.0.0.14", "127.0.0.15", "127.0.0.13"],
+                             [detector.detect() for detector in detectors])
+            self.assertEqual(3, len(calls))
+            detectors[0].detect()
+            self.assertEqual(4, len(calls))
+            # stale answers are not used:
+            detectors[0].prime(("127.0.0.1",))
+            with mock.patch.object(ns, "PRIMED_MAX_AGE", 0):
+                self.assertEqual("127.0.0.13", detectors[0].detect())
+        self.assertEqual(0, ns.resolve_many([]))
+
     def test_command_detector(self):
         """Run tests for IPDetector_Command."""
         import dyndnsc.detector.command
@@ -189,6 +275,131 @@ Your IP address is : 127.0.0.1</body>
         value = detector.detect()
         self.assertTrue(isinstance(value, (type(None), str)))
 
+    def test_webcheck_streaming(self):
+        """Test that responses are read line by line and up to a limit only."""
+        from dyndnsc.detector import webcheck
+
+        class FakeResponse(object):
+            encoding = None
+            url = "http://example.invalid/"
+
+            def __init__(self, chunks):
+                self.chunks = chunks
+                self.read = 0
+
+            def iter_content(self, chunk_size):
+                for chunk in self.chunks:
+                    self.read += 1
+                    yield chunk
+
+        req = FakeResponse([b"a\r\nb", b"c\n", b"d"])
+        self.assertEqual(["a", "bc", "d"], list(webcheck._iter_lines(req)))
+        req = FakeResponse([b"x" * 10, b"y\nz" * 10])
+        self.assertEqual(["x" * 10 + "y", "z"], list(webcheck._iter_lines(req, limit=13)))
+        # parsing stops at the first match:
+        req = FakeResponse([b"<p>Current IP Address: 127.0.0.1</p>\n"] + [b"filler\n"] * 100)
+        self.assertEqual("127.0.0.1", webcheck.PARSERS["checkip"].parse_lines(webcheck._iter_lines(req)))
+        self.assertEqual(1, req.read)
+
+    @responses.activate
+    def test_webcheck_get_ip_from_url(self):
+        """Run tests for _get_ip_from_url()."""
+        from dyndnsc.detector import webcheck
+        responses.add(responses.GET, "http://plain.example.invalid/", body="127.0.0.1\n")
+        responses.add(responses.GET, "http://html.example.invalid/",
+                      body="<html>\r\n" * 10 + "Current IP Address: 127.0.0.2<br>\r\n" + "</html>\r\n")
+        responses.add(responses.GET, "http://large.example.invalid/", body="1" * (webcheck.MAX_BODY_SIZE + 1))
+        plain, checkip = webcheck.PARSERS["plain"], webcheck.PARSERS["checkip"]
+        self.assertEqual("127.0.0.1", webcheck._get_ip_from_url("http://plain.example.invalid/", plain))
+        self.assertEqual("127.0.0.2", webcheck._get_ip_from_url("http://html.example.invalid/", checkip))
+        self.assertEqual(None, webcheck._get_ip_from_url("http://large.example.invalid/", plain))
+        # plain callables taking the text work, too:
+        self.assertEqual("127.0.0.1", webcheck._get_ip_from_url("http://plain.example.invalid/", str.strip))
+        # answers must match the address family asked for:
+        self.assertEqual("127.0.0.1", webcheck._get_ip_from_url("http://plain.example.invalid/", plain, family=AF_INET))
+        self.assertEqual(None, webcheck._get_ip_from_url("http://plain.example.invalid/", plain, family=AF_INET6))
+        self.assertRaises(ValueError, webcheck.IPDetectorWebCheck, url="http://plain.example.invalid/",
+                          parser="nonexistent")
+
+    def test_webcheck_body_read(self):
+        """Test that the body is read completely, keeping the connection reusable."""
+        from dyndnsc.detector import webcheck
+        chunks = iter([b"Current IP Address: 127.0.0.2<br>\r\n", b"</html>\r\n"])
+        response = mock.Mock(status_code=200, encoding=None, url="http://html.example.invalid/")
+        response.iter_content.return_value = chunks
+        with mock.patch.object(webcheck.http, "get", return_value=response):
+            theip = webcheck._get_ip_from_url("http://html.example.invalid/", webcheck.PARSERS["checkip"])
+        self.assertEqual("127.0.0.2", theip)
+        self.assertEqual([], list(chunks))
+
+    def test_webcheck_parallel(self):
+        """Test that racing webchecks use the first valid answer."""
+        from dyndnsc.detector import webcheck
+        answers = {"http://slow/": (2, "127.0.0.9"), "http://fast/": (0.1, "127.0.0.1"), "http://broken/": (0, None)}
+
+        def get_ip_from_url(url, parser, family=AF_UNSPEC):
+            delay, theip = answers[url]
+            time.sleep(delay)
+            return theip
+
+        detector = webcheck.IPDetectorWebCheck(parallel=3)
+        detector.urls = tuple((url, "plain") for url in answers)
+        with mock.patch.object(webcheck, "_get_ip_from_url", get_ip_from_url):
+            started = time.time()
+            self.assertEqual("127.0.0.1", detector.detect())
+            self.assertTrue(time.time() - started < 1)
+            # at most as many requests as there are URLs:
+            detector = webcheck.IPDetectorWebCheck(parallel="5")
+            detector.urls = (("http://broken/", "plain"), ("http://fast/", "plain"))
+            self.assertEqual(2, len(detector._candidates()))
+            self.assertEqual("127.0.0.1", detector.detect())
+        self.assertRaises(ValueError, webcheck.IPDetectorWebCheck, parallel=0)
+
+    def test_webcheck_quorum(self):
+        """Test that a quorum of webchecks must agree on an address."""
+        from dyndnsc.common import health
+        from dyndnsc.detector import webcheck
+        answers = {"http://a/": (0, "127.0.0.1"), "http://proxy/": (0, "10.0.0.1"),
+                   "http://b/": (0.2, "127.0.0.1"), "http://slow/": (2, "127.0.0.1")}
+
+        def get_ip_from_url(url, parser, family=AF_UNSPEC):
+            delay, theip = answers[url]
+            time.sleep(delay)
+            return theip
+
+        tracker = health.HealthTracker()
+        detector = webcheck.IPDetectorWebCheck(parallel=4, quorum=2)
+        detector.urls = tuple((url, "plain") for url in answers)
+        with mock.patch.object(webcheck, "_get_ip_from_url", get_ip_from_url), \
+                mock.patch.object(health, "TRACKER", tracker):
+            started = time.time()
+            self.assertEqual("127.0.0.1", detector.detect())
+            self.assertTrue(time.time() - started < 1)
+            self.assertEqual(1, tracker.get("http://proxy/").disagreements)
+            self.assertEqual(0, tracker.get("http://a/").disagreements)
+
+            detector = webcheck.IPDetectorWebCheck(quorum=2)
+            detector.urls = (("http://a/", "plain"), ("http://proxy/", "plain"))
+            self.assertEqual(None, detector.detect())
+        self.assertRaises(ValueError, webcheck.IPDetectorWebCheck, quorum=0)
+        self.assertRaises(ValueError, webcheck.IPDetectorWebCheck, quorum=2, url="http://a/", parser="plain")
+        self.assertRaises(ValueError, webcheck.IPDetectorWebCheck6, quorum=100)
+
+    @responses.activate
+    def test_webcheck_health(self):
+        """Test that webchecks record the health of the URLs."""
+        from dyndnsc.common import health
+        from dyndnsc.detector import webcheck
+        responses.add(responses.GET, "http://good.example.invalid/", body="127.0.0.1")
+        responses.add(responses.GET, "http://bad.example.invalid/", status=500)
+        tracker = health.HealthTracker()
+        with mock.patch.object(health, "TRACKER", tracker):
+            for url in ("http://good.example.invalid/", "http://bad.example.invalid/"):
+                webcheck._get_ip_from_url(url, webcheck._parser_plain)
+        self.assertEqual(0, tracker.get("http://good.example.invalid/").error_rate)
+        self.assertTrue(tracker.get("http://good.example.invalid/").latency >= 0)
+        self.assertEqual(1, tracker.get("http://bad.example.invalid/").failures)
+
     def test_webcheck6(self):
         """Run tests for IPDetectorWebCheck6."""
         from dyndnsc.detector import webcheck
@@ -209,6 +420,47 @@ Your IP address is : 127.0.0.1</body>
         self.assertEqual(None, detector.get_current_value())
         self.assertTrue(isinstance(detector.detect(), (type(None), str)))
 
+    def test_webcheck46_happy_eyeballs(self):
+        """Test that webcheck46 races both address families."""
+        from dyndnsc.detector import webcheck
+        answers = {"http://v4/": (0, "127.0.0.1"), "http://v6/": (0.1, "::1")}
+        families = {"http://v4/": AF_INET, "http://v6/": AF_INET6}
+
+        def get_ip_from_url(url, parser, family=AF_UNSPEC):
+            # every family is queried over its own connections:
+            self.assertEqual(families[url], family)
+            delay, theip = answers[url]
+            time.sleep(delay)
+            return theip
+
+        detector = webcheck.IPDetectorWebCheck46(stagger="0.5")
+        detector.family_urls = {AF_INET: (("http://v4/", "plain"),), AF_INET6: (("http://v6/", "plain"),)}
+        with mock.patch.object(webcheck, "_get_ip_from_url", get_ip_from_url):
+            # the preferred family answers within the stagger delay, the other one is reported as well:
+            self.assertEqual("::1", detector.detect())
+            self.assertEqual({AF_INET: "127.0.0.1", AF_INET6: "::1"}, detector.addresses)
+            # the preferred family is slow, both are reported:
+            answers["http://v6/"] = (0.3, "::1")
+            detector.opts_stagger = 0.2
+            self.assertEqual("127.0.0.1", detector.detect())
+            self.assertEqual({AF_INET: "127.0.0.1", AF_INET6: "::1"}, detector.addresses)
+            # the preferred family fails, no need to wait for the stagger delay:
+            answers["http://v6/"] = (0, None)
+            detector = webcheck.IPDetectorWebCheck46(prefer="inet6", stagger=5)
+            detector.family_urls = {AF_INET: (("http://v4/", "plain"),), AF_INET6: (("http://v6/", "plain"),)}
+            started = time.time()
+            self.assertEqual("127.0.0.1", detector.detect())
+            self.assertTrue(time.time() - started < 1)
+            self.assertEqual({AF_INET: "127.0.0.1"}, detector.addresses)
+            # preferring INET:
+            answers["http://v6/"] = (0, "::1")
+            detector = webcheck.IPDetectorWebCheck46(prefer="INET", stagger=1)
+            detector.family_urls = {AF_INET: (("http://v4/", "plain"),), AF_INET6: (("http://v6/", "plain"),)}
+            self.assertEqual("127.0.0.1", detector.detect())
+            self.assertEqual({AF_INET: "127.0.0.1", AF_INET6: "::1"}, detector.addresses)
+        self.assertRaises(ValueError, webcheck.IPDetectorWebCheck46, prefer="INET5")
+        self.assertRaises(ValueError, webcheck.IPDetectorWebCheck46, stagger=-1)
+
     def test_null(self):
         """Run tests for IPDetector_Null."""
         from dyndnsc.detector import null
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the detection cache."""
+
+import unittest
+
+from dyndnsc.detector.base import IPDetector
+from dyndnsc.detector.cache import DetectionCache
+
+
+class CountingDetector(IPDetector):
+    """Detector counting calls to detect()."""
+
+    configuration_key = "counting"
+
+    def __init__(self, url=None, result="127.0.0.1", *args, **kwargs):
+        """Initialize."""
+        super(CountingDetector, self).__init__(*args, **kwargs)
+        self.opts_url = url
+        self.result = result
+        self.calls = 0
+
+    def can_detect_offline(self):
+        """Return False."""
+        return False
+
+    def detect(self):
+        """Count and return the configured result."""
+        self.calls += 1
+        return self.set_current_value(self.result)
+
+
+class TestDetectionCache(unittest.TestCase):
+    """Test cases for DetectionCache."""
+
+    def setUp(self):
+        """Run setup."""
+        self.now = 1000.0
+        self.cache = DetectionCache(max_age=60, timefunc=lambda: self.now)
+
+    def test_cache_key(self):
+        """Test that only equally configured detectors share a key."""
+        self.assertEqual(CountingDetector(url="a").cache_key(), CountingDetector(url="a").cache_key())
+        self.assertNotEqual(CountingDetector(url="a").cache_key(), CountingDetector(url="b").cache_key())
+        self.assertNotEqual(CountingDetector(family="INET").cache_key(),
+                            CountingDetector(family="INET6").cache_key())
+
+    def test_shared_detection(self):
+        """Test that detectors with the same key detect once per window."""
+        detectors = [CountingDetector(url="a") for _ in range(5)]
+        for detector in detectors:
+            self.assertEqual("127.0.0.1", self.cache.detect(detector))
+            self.assertEqual("127.0.0.1", detector.get_current_value())
+        self.assertEqual(1, sum(detector.calls for detector in detectors))
+        self.assertEqual((4, 1), (self.cache.hits, self.cache.misses))
+
+        # a differently configured detector is not affected:
+        other = CountingDetector(url="b")
+        self.cache.detect(other)
+        self.assertEqual(1, other.calls)
+
+        # results expire:
+        self.now += 60
+        self.cache.detect(detectors[0])
+        self.assertEqual(2, detectors[0].calls)
+
+    def test_failures_not_shared(self):
+        """Test that failed detections are not reused."""
+        detectors = [CountingDetector(url="a", result=None) for _ in range(2)]
+        for detector in detectors:
+            self.assertEqual(None, self.cache.detect(detector))
+        self.assertEqual([1, 1], [detector.calls for detector in detectors])
+
+    def test_dyndnsclients(self):
+        """Test that clients use a shared cache."""
+        from dyndnsc.core import getDynDnsClientForConfig
+        config = {
+            "detector": (("random", {}),),
+            "updater": (("dummy", {"hostname": "example.com"}),),
+        }
+        clients = [getDynDnsClientForConfig(config, detection_cache=self.cache) for _ in range(3)]
+        for client in clients:
+            client.sync()
+        values = {client.detector.get_current_value() for client in clients}
+        self.assertEqual(1, len(values))
+        self.assertEqual(1, self.cache.misses)
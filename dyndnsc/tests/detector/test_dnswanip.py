@@ -4,12 +4,15 @@
 
 
 import unittest
+from unittest import mock
 
 import pytest
 
+from dyndnsc.common import dnswire
 from dyndnsc.common.six import string_types
 from dyndnsc.common.six import ipaddress
 from dyndnsc.detector.base import AF_INET, AF_INET6
+from dyndnsc.detector import dnswanip
 from dyndnsc.detector.dnswanip import IPDetector_DnsWanIp
 
 HAVE_IPV6 = True
@@ -56,3 +59,179 @@ class TestIndividualDetectors(unittest.TestCase):
             # ensure the result is in fact an IP address:
             self.assertNotEqual(ipaddress(result), None)
             self.assertEqual(detector.get_current_value(), result)
+
+
+class TestWanIpResolver(unittest.TestCase):
+    """Test cases for WanIpResolver."""
+
+    def setUp(self):
+        """Set up a resolver with faked lookups of the provider nameservers."""
+        self.now = 1000.0
+        self.lookups = []
+        self.addresses = ["192.0.2.53"]
+        self.resolver = dnswanip.WanIpResolver(timeout=1, nameservers=["192.0.2.1"], timefunc=lambda: self.now)
+        patcher = mock.patch.object(self.resolver._client, "query_many", side_effect=self.lookup)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lookup(self, queries):
+        """Answer the lookups of nameserver addresses sent to the recursive nameserver."""
+        self.lookups.extend(query.qname for query in queries)
+        if self.addresses is None:
+            return [None] * len(queries)
+        self.assertEqual({("192.0.2.1", dnswire.A)}, {(query.nameserver, query.rdtype) for query in queries})
+        return [dnswire.Answer(dnswire.NOERROR, False, tuple((dnswire.A, 300, address) for address in self.addresses))
+                for _ in queries]
+
+    def respond(self, nameserver, qname, rdtype, rdclass):
+        """Answer queries for myip.opendns.com."""
+        self.assertEqual(("myip.opendns.com", dnswire.A, dnswire.IN), (qname, rdtype, rdclass))
+        return dnswire.Answer(dnswire.NOERROR, False, ((dnswire.A, 0, "198.51.100.1"),))
+
+    def test_find_ip(self):
+        """Test that the nameservers are looked up once per TTL."""
+        self.assertEqual(1, self.resolver._client.timeout)
+        with mock.patch.object(self.resolver._client, "query", side_effect=self.respond) as udp:
+            self.assertEqual("198.51.100.1", self.resolver.find_ip(AF_INET))
+            self.assertEqual(["resolver1.opendns.com", "resolver2.opendns.com"], self.lookups)
+            # a single exchange from now on:
+            self.assertEqual("198.51.100.1", self.resolver.find_ip(AF_INET))
+            self.assertEqual(2, len(self.lookups))
+            self.assertEqual(2, udp.call_count)
+            self.now += 300
+            self.assertEqual("198.51.100.1", self.resolver.find_ip(AF_INET))
+            self.assertEqual(4, len(self.lookups))
+
+    def test_afind_ip(self):
+        """Test looking up the nameservers and querying them using the event loop."""
+        import asyncio
+
+        async def aquery(nameserver, qname, rdtype, rdclass=dnswire.IN):
+            if qname == "myip.opendns.com":
+                return self.respond(nameserver, qname, rdtype, rdclass)
+            answer = self.lookup([dnswire.Query(nameserver, qname, rdtype, rdclass)])[0]
+            if answer is None:
+                raise dnswire.DnsWireError("timeout")
+            return answer
+
+        with mock.patch.object(self.resolver._client, "aquery", side_effect=aquery):
+            self.assertEqual("198.51.100.1", asyncio.run(self.resolver.afind_ip(AF_INET)))
+            self.assertEqual(["192.0.2.53", "192.0.2.53"], self.resolver.nameservers(AF_INET))
+            self.addresses = None
+            self.now += 300
+            self.assertEqual(None, asyncio.run(self.resolver.afind_ip(AF_INET)))
+
+    def test_find_ip_failures(self):
+        """Test that failing nameservers are skipped and failures return None."""
+        self.addresses = ["192.0.2.53", "192.0.2.54"]
+
+        def query(nameserver, qname, rdtype, rdclass):
+            if nameserver == "192.0.2.53":
+                raise dnswire.DnsWireError("timeout")
+            return self.respond(nameserver, qname, rdtype, rdclass)
+
+        with mock.patch.object(self.resolver._client, "query", side_effect=query) as mocked:
+            self.assertEqual("198.51.100.1", self.resolver.find_ip(AF_INET))
+            self.assertEqual(2, mocked.call_count)
+        with mock.patch.object(self.resolver._client, "query", side_effect=dnswire.DnsWireError("timeout")):
+            self.assertEqual(None, self.resolver.find_ip(AF_INET))
+        self.addresses = None
+        self.now += 300
+        self.assertEqual(None, self.resolver.find_ip(AF_INET))
+
+    def test_find_ip_partial(self):
+        """Test that unresolvable nameserver names and error rcodes move on to the next nameserver."""
+        lookup = self.lookup
+
+        def partial_lookup(queries):
+            answers = lookup(queries)
+            return [None if query.qname == "resolver1.opendns.com" else answer
+                    for query, answer in zip(queries, answers)]
+
+        def query(nameserver, qname, rdtype, rdclass):
+            if nameserver == "192.0.2.53":
+                return dnswire.Answer(dnswire.SERVFAIL, False, ())
+            return self.respond(nameserver, qname, rdtype, rdclass)
+
+        self.addresses = ["192.0.2.53", "192.0.2.54"]
+        with mock.patch.object(self.resolver._client, "query_many", side_effect=partial_lookup), \
+                mock.patch.object(self.resolver._client, "query", side_effect=query) as mocked:
+            self.assertEqual(["192.0.2.53", "192.0.2.54"], self.resolver.nameservers(AF_INET))
+            self.assertEqual("198.51.100.1", self.resolver.find_ip(AF_INET))
+            self.assertEqual(2, mocked.call_count)
+
+    def test_afind_ip_partial(self):
+        """Test that the event loop variant skips unresolvable nameserver names and error rcodes, too."""
+        import asyncio
+
+        async def aquery(nameserver, qname, rdtype, rdclass=dnswire.IN):
+            if qname == "resolver1.opendns.com":
+                raise dnswire.DnsWireError("timeout")
+            if qname == "resolver2.opendns.com":
+                return self.lookup([dnswire.Query(nameserver, qname, rdtype, rdclass)])[0]
+            if nameserver == "192.0.2.53":
+                return dnswire.Answer(dnswire.REFUSED, False, ())
+            return self.respond(nameserver, qname, rdtype, rdclass)
+
+        self.addresses = ["192.0.2.53", "192.0.2.54"]
+        with mock.patch.object(self.resolver._client, "aquery", side_effect=aquery) as mocked:
+            self.assertEqual("198.51.100.1", asyncio.run(self.resolver.afind_ip(AF_INET)))
+            self.assertEqual(["resolver2.opendns.com"], self.lookups)
+            self.assertEqual(4, mocked.call_count)
+
+    def test_providers(self):
+        """Test TXT answers, the CH class and nameservers given as addresses."""
+        queries = []
+
+        def query(nameserver, qname, rdtype, rdclass):
+            queries.append((nameserver, rdtype, rdclass))
+            return dnswire.Answer(dnswire.NOERROR, False, (
+                (dnswire.TXT, 0, "edns0-client-subnet 192.0.2.0/24"), (dnswire.TXT, 0, "198.51.100.2")))
+
+        self.assertEqual(["akamai", "cloudflare", "google", "opendns"], dnswanip.providers(AF_INET))
+        self.assertNotIn("akamai", dnswanip.providers(AF_INET6))
+        with mock.patch.object(self.resolver._client, "query", side_effect=query):
+            self.assertEqual("198.51.100.2", self.resolver.find_ip(AF_INET, "cloudflare"))
+            self.assertEqual(None, self.resolver.find_ip(AF_INET6, "cloudflare"))
+            self.assertEqual("198.51.100.2", self.resolver.find_ip(AF_INET, "google"))
+        self.assertEqual(("1.1.1.1", dnswire.TXT, dnswire.CH), queries[0])
+        self.assertEqual("192.0.2.53", queries[-1][0])
+        # only the google nameservers had to be looked up:
+        self.assertEqual(4, len(self.lookups))
+
+
+class TestDnsWanIpProviders(unittest.TestCase):
+    """Test cases for IPDetector_DnsWanIp querying several providers."""
+
+    def setUp(self):
+        """Fake the answers of the providers."""
+        self.answers = {"opendns": "198.51.100.1", "google": "198.51.100.2", "cloudflare": "198.51.100.1"}
+        patcher = mock.patch.object(dnswanip, "find_ip",
+                                    side_effect=lambda family, provider: self.answers[provider])
+        self.find_ip = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first(self):
+        """Test that any of the answers is used."""
+        detector = IPDetector_DnsWanIp(provider="opendns, google")
+        self.assertEqual(("opendns", "google"), detector.opts_provider)
+        self.assertIn(detector.detect(), ("198.51.100.1", "198.51.100.2"))
+        self.answers["opendns"] = None
+        self.assertEqual("198.51.100.2", detector.detect())
+        self.assertEqual("198.51.100.2", detector.get_current_value())
+
+    def test_majority(self):
+        """Test that the answer of a majority is used."""
+        detector = IPDetector_DnsWanIp(provider="opendns,google,cloudflare", mode="majority")
+        self.assertEqual("198.51.100.1", detector.detect())
+        self.answers["cloudflare"] = "198.51.100.3"
+        with mock.patch.object(dnswanip, "LOG") as log:
+            self.assertEqual(None, detector.detect())
+            self.assertTrue(log.warning.called)
+
+    def test_invalid(self):
+        """Test that unknown providers and modes are rejected."""
+        self.assertRaises(ValueError, IPDetector_DnsWanIp, provider="nonexistent")
+        self.assertRaises(ValueError, IPDetector_DnsWanIp, family=AF_INET6, provider="akamai")
+        self.assertRaises(ValueError, IPDetector_DnsWanIp, provider="")
+        self.assertRaises(ValueError, IPDetector_DnsWanIp, provider="google", mode="nonexistent")
@@ -64,3 +64,47 @@ class IfaceDetectorTest(unittest.TestCase):
 
         detector = teredo.IPDetector_Teredo(iface="foo0")
         self.assertEqual(None, detector.detect())
+
+    def test_netlink_events(self):
+        """Run tests for matching netlink events."""
+        import socket
+        from dyndnsc.common import netlink
+        from dyndnsc.detector import iface, teredo
+        interface = give_me_an_interface_ipv4()
+        index = socket.if_nametoindex(interface)
+        detector = iface.IPDetector_Iface(iface=interface)
+        self.assertEqual(netlink.RTMGRP_IPV4_IFADDR, detector.netlink_groups())
+        self.assertTrue(detector.is_affected_by(netlink.NetlinkEvent(netlink.RTM_NEWADDR, socket.AF_INET, index)))
+        self.assertFalse(detector.is_affected_by(netlink.NetlinkEvent(netlink.RTM_NEWADDR, socket.AF_INET6, index)))
+        self.assertFalse(detector.is_affected_by(netlink.NetlinkEvent(netlink.RTM_DELADDR, socket.AF_INET, -1)))
+        self.assertFalse(detector.is_affected_by(netlink.NetlinkEvent(netlink.RTM_NEWROUTE, socket.AF_INET, None)))
+        detector = teredo.IPDetector_Teredo(iface="foo0")
+        self.assertEqual(netlink.RTMGRP_IPV6_IFADDR, detector.netlink_groups())
+        self.assertFalse(detector.is_affected_by(netlink.NetlinkEvent(netlink.RTM_NEWADDR, socket.AF_INET6, index)))
+
+    def test_snapshot(self):
+        """Test choosing among the addresses in the shared snapshot."""
+        import ipaddress
+        import socket
+        from unittest import mock
+        from dyndnsc.common import ifaddrs, netlink
+        from dyndnsc.detector import iface
+
+        def address(text, flags=0):
+            return netlink.InterfaceAddress(1, socket.AF_INET6, ipaddress.ip_interface(text), flags, None, None)
+
+        addresses = [
+            address("2001:db8::aaaa/64", netlink.IFA_F_TEMPORARY),
+            address("2001:db8::dead/64", netlink.IFA_F_DEPRECATED),
+            address("2001:db8::1/64"),
+            address("2001:0:5ef5:79fd::1/32"),
+        ]
+        with mock.patch.object(ifaddrs.SNAPSHOT, "addresses", return_value=addresses) as lookup:
+            self.assertEqual("2001:db8::1", iface.IPDetector_Iface(iface="eth0", family="INET6").detect())
+            lookup.assert_called_with("eth0", AF_INET6)
+            detector = iface.IPDetector_Iface(iface="eth0", family="INET6", netmask="2001:db8::/64")
+            self.assertEqual("2001:db8::1", detector.detect())
+            addresses.pop(2)
+            self.assertEqual("2001:db8::aaaa", detector.detect())
+            detector = iface.IPDetector_Iface(iface="eth0", family="INET6", netmask="2001:0000::/32")
+            self.assertEqual("2001:0:5ef5:79fd::1", detector.detect())
@@ -40,3 +40,11 @@ detector-parser = plain"""
         self.assertTrue(buf.startswith("testpreset"))
         self.assertTrue("fubarUpdater" in buf)
         self.assertTrue(buf.endswith(os.linesep))
+
+    def test_needs_plugin_arguments(self):
+        """Run tests for _needs_plugin_arguments()."""
+        self.assertTrue(cli._needs_plugin_arguments([]))
+        self.assertTrue(cli._needs_plugin_arguments(["--updater-dummy"]))
+        self.assertFalse(cli._needs_plugin_arguments(["-c", "dyndnsc.ini", "--loop"]))
+        self.assertTrue(cli._needs_plugin_arguments(["-c", "dyndnsc.ini", "--detector-null"]))
+        self.assertTrue(cli._needs_plugin_arguments(["-c", "dyndnsc.ini", "--help"]))
@@ -69,3 +69,21 @@ detector-parser = plain
         self.assertTrue("url" in updater[1])
         self.assertTrue("moreparam" in updater[1])
         self.assertEqual("some_stuff", updater[1]["moreparam"])
+        self.assertFalse("detector6" in config["testconfig"])
+
+    def test_collect_configuration_dualstack(self):
+        """Test that a second detector for ipv6 is collected."""
+        sample_config = """[dyndnsc]
+configs = dualstack
+
+[dualstack]
+updater = dyndns2
+detector = webcheck4
+detector6 = webcheck6
+detector6-url = http://myip6.example.com/
+        """
+        parser = configparser.ConfigParser()
+        parser.read_file(StringIO(sample_config))
+        config = collect_config(parser)["dualstack"]
+        self.assertEqual([("webcheck4", {})], config["detector"])
+        self.assertEqual([("webcheck6", {"url": "http://myip6.example.com/"})], config["detector6"])
@@ -2,9 +2,14 @@
 
 """Tests for the core module."""
 
+import asyncio
+from socket import AF_UNSPEC
 import unittest
+from unittest import mock
 
 import dyndnsc
+from dyndnsc.detector.base import IPDetector
+from dyndnsc.updater.base import UpdateProtocol
 
 
 def get_valid_updater():
@@ -19,6 +24,98 @@ def get_valid_detector():
     return IPDetector_Null()
 
 
+class BatchingUpdater(UpdateProtocol):
+    """Updater recording single and combined updates."""
+
+    configuration_key = "batching"
+    requests = []
+
+    def __init__(self, hostname, account="default"):
+        """Initialize."""
+        self.hostname = hostname
+        self.account = account
+        super(BatchingUpdater, self).__init__()
+
+    def update(self, ip):
+        """Record a single update."""
+        self.requests.append((self.hostname,))
+        return ip
+
+    def batch_key(self):
+        """Return the account."""
+        return self.account
+
+    @classmethod
+    def update_many(cls, updaters, ip):
+        """Record a combined update."""
+        cls.requests.append(tuple(updater.hostname for updater in updaters))
+        return [ip] * len(updaters)
+
+
+class FailingUpdater(UpdateProtocol):
+    """Updater returning a configurable result."""
+
+    configuration_key = "failing"
+
+    def __init__(self, hostname, result="911"):
+        """Initialize."""
+        self.hostname = hostname
+        self.result = result
+        self.calls = 0
+        super(FailingUpdater, self).__init__()
+
+    def update(self, ip):
+        """Return the configured result."""
+        self.calls += 1
+        return self.result
+
+    def classify(self, ip, result):
+        """Classify "911" as temporary and anything else as fatal."""
+        from dyndnsc.updater.base import UPDATE_RETRY, UPDATE_FATAL
+        return UPDATE_RETRY if result == "911" else UPDATE_FATAL
+
+
+class StaticDetector(IPDetector):
+    """Detector returning a configurable IP."""
+
+    configuration_key = "static"
+
+    def __init__(self, ip, family):
+        """Initialize."""
+        super(StaticDetector, self).__init__(family=family)
+        self.ip = ip
+
+    def can_detect_offline(self):
+        """Return True."""
+        return True
+
+    def detect(self):
+        """Return the configured IP."""
+        return self.set_current_value(self.ip)
+
+
+class DualStackUpdater(UpdateProtocol):
+    """Updater recording dual stack updates."""
+
+    configuration_key = "dualstack"
+
+    def __init__(self, hostname):
+        """Initialize."""
+        self.hostname = hostname
+        self.requests = []
+        super(DualStackUpdater, self).__init__()
+
+    def update(self, ip):
+        """Record a single update."""
+        self.requests.append(ip)
+        return ip
+
+    def update_dualstack(self, ipv4, ipv6):
+        """Record a combined update."""
+        self.requests.append((ipv4, ipv6))
+        return (ipv4, ipv6)
+
+
 class TestDynDnsClient(unittest.TestCase):
     """Test cases for DynDnsClient."""
 
@@ -56,6 +153,7 @@ class TestDynDnsClient(unittest.TestCase):
         dyndnsclient.check()
         dyndnsclient.sync()
         dyndnsclient.has_state_changed()
+        self.assertEqual(dyndnsclient.lastcheck + 10, dyndnsclient.next_check_time())
 
     def test_dyndnsclient_null(self):
         """Run tests for dyndnsc when we cannot detect the IP."""
@@ -71,3 +169,166 @@ class TestDynDnsClient(unittest.TestCase):
         dyndnsclient.check()
         dyndnsclient.sync()
         dyndnsclient.has_state_changed()
+
+    def test_dualstack_client(self):
+        """Run tests for a client maintaining the ipv4 and ipv6 address."""
+        from dyndnsc.detector import dns, dualstack
+
+        config = {
+            "detector": (("null", {}),),
+            "detector6": (("null", {}),),
+            "updater": (("dummy", {"hostname": "example.com"}),),
+        }
+        dyndnsclient = dyndnsc.getDynDnsClientForConfig(config)
+        self.assertTrue(isinstance(dyndnsclient.detector, dualstack.IPDetector_DualStack))
+        self.assertTrue(isinstance(dyndnsclient.dns, dualstack.IPDetector_DualStackDNS))
+
+        updater = DualStackUpdater("example.com")
+        detector4, detector6 = StaticDetector("127.0.0.1", "INET"), StaticDetector("::1", "INET6")
+        self.assertRaises(ValueError, dualstack.IPDetector_DualStack, detector6, detector4)
+        client = dyndnsc.DynDnsClient(updater=updater, detector=dualstack.IPDetector_DualStack(detector4, detector6))
+        with mock.patch.object(dns, "resolve", return_value=("::2", "127.0.0.1")) as resolve:
+            client.sync()
+            self.assertEqual([("127.0.0.1", "::1")], updater.requests)
+            # one resolution for both records:
+            resolve.assert_called_once_with("example.com", AF_UNSPEC)
+            # the ipv6 address cannot be detected, the one in DNS is kept:
+            resolve.return_value = ("127.0.0.1", "::1")
+            detector6.ip = None
+            client.sync()
+            self.assertEqual(1, len(updater.requests))
+            detector4.ip = "127.0.0.2"
+            client.sync()
+            self.assertEqual(("127.0.0.2", "::1"), updater.requests[-1])
+            # nothing detected at all:
+            detector4.ip = None
+            client.sync()
+            self.assertEqual(2, len(updater.requests))
+        # the default update_dualstack() updates one address after the other:
+        updater = BatchingUpdater("example.com")
+        BatchingUpdater.requests = []
+        self.assertEqual(("127.0.0.1", None), updater.update_dualstack("127.0.0.1", None))
+        self.assertEqual([("example.com",)], BatchingUpdater.requests)
+
+    def test_check_observations(self):
+        """Test that a check detects and looks up the DNS only once."""
+        from dyndnsc.detector import dns
+        updater = DualStackUpdater("example.com")
+        detector = StaticDetector("127.0.0.1", "INET")
+        client = dyndnsc.DynDnsClient(updater=updater, detector=detector)
+        with mock.patch.object(dns, "resolve", return_value=("127.0.0.2",)) as resolve, \
+                mock.patch.object(StaticDetector, "can_detect_offline", return_value=False), \
+                mock.patch.object(StaticDetector, "detect", autospec=True, side_effect=StaticDetector.detect) as detect:
+            client.check()
+            self.assertEqual(["127.0.0.1"], updater.requests)
+            self.assertEqual(1, resolve.call_count)
+            self.assertEqual(1, detect.call_count)
+            self.assertEqual({"detections": 1, "dns_lookups": 1, "reused": 2}, dict(client.stats))
+            # combined checks, too:
+            client.request_check()
+            dyndnsc.core.check_clients([client])
+            self.assertEqual(2, resolve.call_count)
+            self.assertEqual(2, detect.call_count)
+            # outside of a check, nothing is reused:
+            client.sync()
+            self.assertEqual(3, resolve.call_count)
+            self.assertEqual(3, detect.call_count)
+        self.assertEqual(None, client._observations)
+
+    def test_async_client(self):
+        """Run tests for AsyncDynDnsClient."""
+        from dyndnsc.detector.command import IPDetector_Command
+        from dyndnsc.detector.cache import DetectionCache
+        BatchingUpdater.requests = []
+        cache = DetectionCache()
+        clients = [
+            dyndnsc.AsyncDynDnsClient(updater=BatchingUpdater(hostname),
+                                      detector=IPDetector_Command(command="echo 127.0.0.2"),
+                                      detection_cache=cache)
+            for hostname in ("a.example.invalid", "b.example.invalid")
+        ]
+
+        async def run_all(method):
+            await asyncio.gather(*(getattr(client, method)() for client in clients))
+
+        asyncio.run(run_all("sync"))
+        self.assertEqual([("a.example.invalid",), ("b.example.invalid",)], sorted(BatchingUpdater.requests))
+        self.assertEqual(["127.0.0.2", "127.0.0.2"], [client.status for client in clients])
+        # both clients detected concurrently, but only one detection ran:
+        self.assertEqual(1, cache.misses)
+
+        asyncio.run(run_all("check"))
+        self.assertEqual([False, False], [client.needs_check() for client in clients])
+
+        # clients sharing a batch_key() are updated with a single request:
+        BatchingUpdater.requests = []
+        clients.append(dyndnsc.AsyncDynDnsClient(dyndnsc.DynDnsClient(
+            updater=BatchingUpdater("c.example.invalid", account="other"),
+            detector=IPDetector_Command(command="echo 127.0.0.2"))))
+        asyncio.run(dyndnsc.core.async_clients(clients))
+        self.assertEqual([("a.example.invalid", "b.example.invalid"), ("c.example.invalid",)],
+                         sorted(BatchingUpdater.requests))
+        # a check aligns the schedules of the clients checked together:
+        for client in clients:
+            client.request_check()
+        asyncio.run(dyndnsc.core.acheck_clients(clients))
+        self.assertEqual(1, len({client.next_check_time() for client in clients}))
+
+        config = {"detector": (("null", {}),), "updater": (("dummy", {"hostname": "example.com"}),)}
+        client = dyndnsc.getDynDnsClientForConfig(config, client_class=dyndnsc.AsyncDynDnsClient)
+        self.assertTrue(isinstance(client, dyndnsc.AsyncDynDnsClient))
+        # the thread based code must not be handed an async client by accident:
+        self.assertFalse(isinstance(client, dyndnsc.DynDnsClient))
+        self.assertTrue(isinstance(client.client, dyndnsc.DynDnsClient))
+        asyncio.run(client.sync())
+
+    def test_sync_clients(self):
+        """Run tests for combined updates in sync_clients()."""
+        from dyndnsc.detector.command import IPDetector_Command
+        from dyndnsc.core import group_clients, sync_clients, check_clients
+        BatchingUpdater.requests = []
+        clients = [
+            dyndnsc.DynDnsClient(updater=BatchingUpdater(hostname, account),
+                                 detector=IPDetector_Command(command="echo 127.0.0.2"))
+            for hostname, account in (("a.example.invalid", "one"), ("b.example.invalid", "one"),
+                                      ("c.example.invalid", "two"))
+        ]
+        self.assertEqual(2, len(group_clients(clients)))
+        sync_clients(clients)
+        self.assertEqual([("a.example.invalid", "b.example.invalid"), ("c.example.invalid",)],
+                         BatchingUpdater.requests)
+        self.assertEqual(["127.0.0.2"] * 3, [client.status for client in clients])
+
+        # a check aligns the schedules of the clients checked together:
+        check_clients(clients)
+        self.assertEqual(1, len({client.next_check_time() for client in clients}))
+
+    def test_backoff(self):
+        """Run tests for backing off after failed updates."""
+        import time
+        from dyndnsc.detector.command import IPDetector_Command
+        updater = FailingUpdater("example.invalid")
+        client = dyndnsc.DynDnsClient(updater=updater, detector=IPDetector_Command(command="echo 127.0.0.2"),
+                                      detect_interval=60)
+        client.sync()
+        self.assertEqual(1, updater.calls)
+        self.assertTrue(time.time() + 30 <= client.retry_at <= time.time() + 60)
+        self.assertEqual(client.retry_at, client.next_check_time())
+        self.assertFalse(client.needs_check())
+        client.check()
+        self.assertEqual(1, updater.calls)
+
+        # once the retry time has come, the update is retried:
+        client.retry_at = time.time()
+        client.check()
+        self.assertEqual(2, updater.calls)
+        self.assertEqual(2, client.backoff.failures)
+
+        # fatal results pause the client:
+        updater.result = "badauth"
+        client.retry_at = time.time()
+        client.check()
+        self.assertEqual(3, updater.calls)
+        self.assertTrue(client.paused)
+        self.assertFalse(client.needs_check())
+        self.assertEqual(None, client.next_check_time())
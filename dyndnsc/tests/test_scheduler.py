@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the scheduler."""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from dyndnsc import scheduler as scheduler_module
+from dyndnsc.common import http, race
+from dyndnsc.scheduler import Scheduler, sync_all
+
+
+class FakeClock(object):
+    """Clock whose time only advances when sleeping."""
+
+    def __init__(self):
+        """Initialize."""
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        """Return the current fake time."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Advance the fake time."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeUpdater(object):
+    """Minimal stand-in for an updater."""
+
+    def __init__(self, hostname):
+        """Initialize."""
+        self.hostname = hostname
+
+    def batch_key(self):
+        """Return None, fake updaters are never combined."""
+        return None
+
+
+class FakeClient(object):
+    """Minimal stand-in for a DynDnsClient."""
+
+    def __init__(self, name, clock, interval, fail=False):
+        """Initialize."""
+        self.updater = FakeUpdater(name)
+        self.clock = clock
+        self.ipchangedetection_sleep = interval
+        self.lastcheck = None
+        self.fail = fail
+        self.checks = []
+
+    def next_check_time(self):
+        """Return the next deadline."""
+        if self.lastcheck is None:
+            return self.clock.time()
+        return self.lastcheck + self.ipchangedetection_sleep
+
+    def request_check(self):
+        """Make the client due."""
+        self.lastcheck = None
+
+    def check(self):
+        """Record the check."""
+        self.checks.append(self.clock.time())
+        if self.fail:
+            raise RuntimeError("boom")
+        self.lastcheck = self.clock.time()
+
+
+class TestScheduler(unittest.TestCase):
+    """Test cases for Scheduler."""
+
+    def test_run_pending(self):
+        """Run tests for Scheduler.run_pending()."""
+        clock = FakeClock()
+        fast = FakeClient("fast", clock, 10)
+        slow = FakeClient("slow", clock, 25)
+        scheduler = Scheduler([fast, slow], timefunc=clock.time, delayfunc=clock.sleep)
+        self.assertEqual(2, len(scheduler))
+
+        # both are due initially:
+        self.assertEqual(10, scheduler.run_pending())
+        self.assertEqual([1000.0], fast.checks)
+        self.assertEqual([1000.0], slow.checks)
+
+        # nothing is due yet:
+        clock.now += 5
+        self.assertEqual(5, scheduler.run_pending())
+        self.assertEqual(1, len(fast.checks))
+
+        for _ in range(4):
+            clock.sleep(scheduler.run_pending())
+        scheduler.run_pending()
+        self.assertEqual([1000.0, 1010.0, 1020.0, 1030.0], fast.checks)
+        self.assertEqual([1000.0, 1025.0], slow.checks)
+        # we only ever slept until the next deadline:
+        self.assertEqual([5, 10, 5, 5], clock.sleeps)
+
+    def test_failing_client(self):
+        """Test that a failing client does not stall the others."""
+        clock = FakeClock()
+        bad = FakeClient("bad", clock, 10, fail=True)
+        good = FakeClient("good", clock, 10)
+        scheduler = Scheduler([bad, good], timefunc=clock.time, delayfunc=clock.sleep)
+        self.assertEqual(10, scheduler.run_pending())
+        self.assertEqual(1, len(bad.checks))
+        self.assertEqual(1, len(good.checks))
+        clock.sleep(10)
+        scheduler.run_pending()
+        self.assertEqual(2, len(bad.checks))
+        self.assertEqual(2, len(good.checks))
+
+    def test_wake(self):
+        """Test that woken clients are checked before their deadline."""
+        clock = FakeClock()
+        client = FakeClient("client", clock, 60)
+        other = FakeClient("other", clock, 60)
+        scheduler = Scheduler([client, other], timefunc=clock.time, delayfunc=clock.sleep)
+        scheduler.run_pending()
+        clock.now += 5
+        scheduler.wake(client)
+        self.assertEqual(55, scheduler.run_pending())
+        self.assertEqual(2, len(scheduler))
+        self.assertEqual([1000.0, 1005.0], client.checks)
+        self.assertEqual([1000.0], other.checks)
+        # the stale queue entry of the woken client is ignored:
+        clock.now = 1060
+        scheduler.run_pending()
+        self.assertEqual([1000.0, 1005.0], client.checks)
+        self.assertEqual([1000.0, 1060.0], other.checks)
+
+    def test_wake_interrupts_wait(self):
+        """Test that wake() interrupts wait() from another thread."""
+        client = FakeClient("client", time, 60)
+        scheduler = Scheduler([client])
+        delay = scheduler.run_pending()
+        self.assertTrue(delay > 50)
+        timer = threading.Timer(0.05, scheduler.wake, (client,))
+        timer.start()
+        started = time.time()
+        scheduler.wait(delay)
+        self.assertTrue(time.time() - started < 5)
+        scheduler.run_pending()
+        self.assertEqual(2, len(client.checks))
+
+    def test_paused_client(self):
+        """Test that paused clients are dropped from the queue."""
+        clock = FakeClock()
+        client = FakeClient("client", clock, 60)
+        scheduler = Scheduler([client], timefunc=clock.time, delayfunc=clock.sleep)
+        client.next_check_time = lambda: None
+        self.assertEqual(None, scheduler.run_pending())
+        self.assertEqual(0, len(scheduler))
+        # a loop left without anything to do says so:
+        with mock.patch.object(scheduler_module.LOG, "error") as error:
+            scheduler.run()
+        self.assertEqual(1, error.call_count)
+
+    def test_state_save_failure(self):
+        """Test that failing to save the state does not stop the scheduler."""
+        clock = FakeClock()
+        client = FakeClient("client", clock, 60)
+        state_store = mock.Mock(filename="state.json")
+        state_store.save.side_effect = [OSError(30, "Read-only file system"), None]
+        scheduler = Scheduler([client], state_store=state_store, timefunc=clock.time, delayfunc=clock.sleep)
+        with mock.patch.object(scheduler_module.LOG, "error") as error:
+            self.assertEqual(60, scheduler.run_pending())
+        self.assertEqual(1, error.call_count)
+        clock.sleep(60)
+        scheduler.run_pending()
+        self.assertEqual(2, state_store.save.call_count)
+        self.assertEqual(2, len(client.checks))
+
+    def test_empty(self):
+        """Test that an empty scheduler returns immediately."""
+        scheduler = Scheduler([])
+        self.assertEqual(None, scheduler.run_pending())
+        self.assertEqual(None, scheduler.run())
+
+
+class SlowClient(FakeClient):
+    """Client whose check blocks until released."""
+
+    def __init__(self, name, interval):
+        """Initialize."""
+        super(SlowClient, self).__init__(name, time, interval)
+        self.release = threading.Event()
+
+    def check(self):
+        """Block, then record the check."""
+        self.release.wait(5)
+        super(SlowClient, self).check()
+
+
+class TestSchedulerWorkers(unittest.TestCase):
+    """Test cases for Scheduler with a worker pool."""
+
+    def test_concurrent_checks(self):
+        """Test that a blocked check does not stall the other clients."""
+        blocked = SlowClient("blocked", 60)
+        fast = SlowClient("fast", 60)
+        fast.release.set()
+        scheduler = Scheduler([blocked, fast], workers=2, timeout=0.1)
+        self.assertTrue(scheduler.run_pending() <= 0.1)
+        self.assertEqual(2, len(scheduler))
+        scheduler.wait(1)
+        self.assertEqual(1, len(fast.checks))
+        self.assertEqual(0, len(blocked.checks))
+
+        time.sleep(0.1)
+        with mock.patch.object(scheduler_module.LOG, "warning") as warning:
+            delay = scheduler.run_pending()
+        self.assertEqual(1, warning.call_count)
+        # the fast client is back in the queue, the blocked one is not:
+        self.assertTrue(50 < delay <= 60)
+        self.assertEqual(fast.next_check_time(), scheduler.next_deadline())
+
+        blocked.release.set()
+        scheduler.wait(None)
+        scheduler.run_pending()
+        self.assertEqual(1, len(blocked.checks))
+        self.assertEqual(2, len(scheduler))
+        scheduler.shutdown()
+
+    def test_late_checks_free_workers(self):
+        """Test that checks running past the timeout are not counted against the workers."""
+        blocked = [SlowClient("blocked%i" % i, 60) for i in range(2)]
+        fast = SlowClient("fast", 60)
+        fast.release.set()
+        scheduler = Scheduler(blocked + [fast], workers=2, timeout=0.1)
+        self.assertTrue(scheduler.run_pending() <= 0.1)
+        # both workers are busy, the fast client has to wait, still being due:
+        self.assertEqual(3, len(scheduler))
+        self.assertTrue(scheduler.next_deadline() <= time.time())
+        self.assertEqual([], fast.checks)
+
+        time.sleep(0.1)
+        with mock.patch.object(scheduler_module.LOG, "warning") as warning:
+            scheduler.run_pending()
+        self.assertEqual(2, warning.call_count)
+        scheduler.wait(1)
+        self.assertEqual(1, len(fast.checks))
+
+        for client in blocked:
+            client.release.set()
+        scheduler.shutdown()
+
+    def test_deadline(self):
+        """Test that the HTTP requests of a check time out at the deadline."""
+        timeouts = []
+        client = FakeClient("client", time, 60)
+        client.check = lambda: timeouts.append(http.timeout(60))
+        other = FakeClient("other", time, 60)
+        other.check = client.check
+        Scheduler([client], timeout=5).run_pending()
+        scheduler = Scheduler([client, other], workers=2, timeout=5)
+        scheduler.run_pending()
+        while len(timeouts) < 3:
+            scheduler.wait(1)
+        self.assertTrue(all(0 < timeout <= 5 for timeout in timeouts), timeouts)
+        self.assertEqual(60, http.timeout(60))
+        scheduler.shutdown()
+
+    def test_deadline_race(self):
+        """Test that requests raced on other threads time out at the deadline of the check."""
+        timeouts = []
+        client = FakeClient("client", time, 60)
+        client.check = lambda: timeouts.append(race.first([lambda: http.timeout(10)]))
+        Scheduler([client], timeout=0.5).run_pending()
+        self.assertTrue(0 < timeouts[0] <= 0.5, timeouts)
+
+
+class TestSchedulerDns(unittest.TestCase):
+    """Test cases for looking up the DNS records of due clients up front."""
+
+    def test_prime_dns(self):
+        """Test that the DNS records of due clients are looked up together, once per hostname."""
+        from dyndnsc.core import DynDnsClient
+        from dyndnsc.detector import dns
+        from dyndnsc.detector.command import IPDetector_Command
+        from dyndnsc.updater.dummy import UpdateProtocolDummy
+        clients = [DynDnsClient(updater=UpdateProtocolDummy(hostname=hostname),
+                                detector=IPDetector_Command(command="echo 127.0.0.1"))
+                   for hostname in ("a.example.com", "b.example.com", "a.example.com")]
+        scheduler = Scheduler(clients, dns_concurrency=4)
+        with mock.patch.object(dns, "resolve", return_value=("127.0.0.2",)) as resolve, \
+                mock.patch.object(IPDetector_Command, "can_detect_offline", return_value=False):
+            scheduler.run_pending()
+        # neither the checks nor the syncs following them resolved again:
+        self.assertEqual(2, resolve.call_count)
+        self.assertEqual([2, 2, 2], [client.stats["reused"] for client in clients])
+        self.assertEqual(["127.0.0.2"] * 3, [client.dns.get_current_value() for client in clients])
+
+
+class SyncClient(FakeClient):
+    """Client recording calls to sync()."""
+
+    def __init__(self, name, fail=False):
+        """Initialize."""
+        super(SyncClient, self).__init__(name, time, 60, fail=fail)
+        self.syncs = 0
+
+    def sync(self):
+        """Record the sync."""
+        if self.fail:
+            raise RuntimeError("boom")
+        self.syncs += 1
+
+
+class TestSyncAll(unittest.TestCase):
+    """Test cases for sync_all()."""
+
+    def test_sync_all(self):
+        """Test that all clients are synced and failures are counted."""
+        clients = [SyncClient("client%i" % i) for i in range(10)]
+        clients.append(SyncClient("bad", fail=True))
+        clock = FakeClock()
+        self.assertEqual(1, sync_all(clients, workers=4, jitter=2, delayfunc=clock.sleep, timefunc=clock.time))
+        self.assertEqual([1] * 10, [client.syncs for client in clients[:-1]])
+        self.assertTrue(all(delay > 0 for delay in clock.sleeps))
+        self.assertTrue(clock.now <= 1002.0)
+
+    def test_sync_all_jitter_single_worker(self):
+        """Test that the jitter is not served one sync after the other by a single worker."""
+        clients = [SyncClient("client%i" % i) for i in range(20)]
+        clock = FakeClock()
+        with mock.patch.object(scheduler_module.random, "uniform", side_effect=lambda a, b: b):
+            self.assertEqual(0, sync_all(clients, jitter=2, delayfunc=clock.sleep, timefunc=clock.time))
+        # all syncs are due at the same offset, so a single delay covers all of them:
+        self.assertEqual([2], clock.sleeps)
+        self.assertEqual([1] * 20, [client.syncs for client in clients])
+
+    def test_sync_all_no_jitter(self):
+        """Test that no delays happen without jitter."""
+        clients = [SyncClient("client%i" % i) for i in range(3)]
+        delays = []
+        self.assertEqual(0, sync_all(clients, delayfunc=delays.append))
+        self.assertEqual([], delays)
+        self.assertEqual(0, sync_all([]))
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for sharding clients across worker processes."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+from dyndnsc.shard import Supervisor, shard_for, split_configs
+
+
+def report_and_exit(index, configs, status_queue):
+    """Worker reporting its clients, exits non-zero for shards containing 'bad'."""
+    status_queue.put((index, {"clients": len(configs)}))
+    sys.exit(1 if "bad" in configs else 0)
+
+
+def crash_once(index, configs, status_queue):
+    """Worker crashing unless its marker file exists."""
+    marker = configs["marker"]
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(3)
+    status_queue.put((index, {"clients": len(configs)}))
+
+
+class TestShard(unittest.TestCase):
+    """Test cases for splitting configurations."""
+
+    def test_shard_for(self):
+        """Run tests for shard_for()."""
+        self.assertEqual(shard_for("host.example.com", 7), shard_for("host.example.com", 7))
+        self.assertTrue(0 <= shard_for("host.example.com", 7) < 7)
+        self.assertEqual(0, shard_for("host.example.com", 1))
+
+    def test_split_configs(self):
+        """Run tests for split_configs()."""
+        configs = {"client%i" % i: {"interval": i} for i in range(100)}
+        shards = split_configs(configs, 4)
+        self.assertEqual(4, len(shards))
+        self.assertEqual(100, sum(len(shard) for shard in shards))
+        # every shard gets a fair share:
+        self.assertTrue(all(len(shard) > 10 for shard in shards))
+        for index, shard in enumerate(shards):
+            for name, config in shard.items():
+                self.assertEqual(configs[name], config)
+                self.assertEqual(index, shard_for(name, 4))
+        self.assertEqual([{}, {}], split_configs({}, 2))
+
+
+class TestSupervisor(unittest.TestCase):
+    """Test cases for Supervisor."""
+
+    def test_run(self):
+        """Test that workers run once without restarts and their status is collected."""
+        configs = {"client%i" % i: {} for i in range(20)}
+        supervisor = Supervisor(configs, 3, report_and_exit, restart=False)
+        self.assertEqual(0, supervisor.run())
+        self.assertEqual(0, supervisor.restarts)
+        self.assertEqual(20, sum(status["clients"] for status in supervisor.status.values()))
+
+        configs["bad"] = {}
+        supervisor = Supervisor(configs, 3, report_and_exit, restart=False)
+        self.assertEqual(1, supervisor.run())
+
+    def test_no_restart_after_clean_exit(self):
+        """Test that workers exiting cleanly are not restarted, e.g. when all of their clients are paused."""
+        configs = {"client%i" % i: {} for i in range(5)}
+        supervisor = Supervisor(configs, 2, report_and_exit, min_uptime=0)
+        self.assertEqual(0, supervisor.run())
+        self.assertEqual(0, supervisor.restarts)
+
+    def test_restart(self):
+        """Test that a crashed worker is restarted."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            configs = {"marker": os.path.join(tmpdir, "marker")}
+            supervisor = Supervisor(configs, 1, crash_once, min_uptime=0)
+            supervisor.start()
+            try:
+                for _ in range(30):
+                    supervisor.poll(timeout=0.5)
+                    if supervisor.status:
+                        break
+            finally:
+                supervisor.stop()
+            self.assertEqual(1, supervisor.restarts)
+            self.assertEqual({0: {"clients": 1}}, supervisor.status)
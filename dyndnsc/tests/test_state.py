@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""Tests for the state store."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from dyndnsc.state import StateStore
+
+
+class TestStateStore(unittest.TestCase):
+    """Test cases for StateStore."""
+
+    def setUp(self):
+        """Run setup."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "state.json")
+
+    def tearDown(self):
+        """Teardown."""
+        shutil.rmtree(self.tmpdir)
+
+    def test_roundtrip(self):
+        """Test that saved state is loaded again."""
+        store = StateStore(self.filename)
+        self.assertEqual({}, store.get("example.com"))
+        store.set("example.com", {"ip": "127.0.0.1", "synced": 1000.0})
+        store.save()
+        self.assertEqual(["state.json"], os.listdir(self.tmpdir))
+
+        store = StateStore(self.filename)
+        self.assertEqual({"ip": "127.0.0.1", "synced": 1000.0}, store.get("example.com"))
+
+    def test_sections(self):
+        """Test that sections are kept apart."""
+        store = StateStore(self.filename)
+        store.set("example.com", {"ip": "127.0.0.1"})
+        store.set("https://example.com/", {"latency": 0.5}, section="endpoints")
+        store.save()
+        store = StateStore(self.filename)
+        self.assertEqual({}, store.get("https://example.com/"))
+        self.assertEqual({"latency": 0.5}, store.get("https://example.com/", section="endpoints"))
+        self.assertEqual({"https://example.com/": {"latency": 0.5}}, store.items("endpoints"))
+        self.assertEqual({}, store.items("nonexistent"))
+
+    def test_unreadable(self):
+        """Test that a broken file is ignored."""
+        with open(self.filename, "w") as fobj:
+            fobj.write("{broken")
+        store = StateStore(self.filename)
+        self.assertEqual({}, store.get("example.com"))
+        with open(self.filename, "w") as fobj:
+            fobj.write("[]")
+        store = StateStore(self.filename)
+        self.assertEqual({}, store.get("example.com"))
+
+    def test_save_only_changes(self):
+        """Test that save() does not rewrite an unchanged state."""
+        store = StateStore(self.filename)
+        store.save()
+        self.assertFalse(os.path.exists(self.filename))
+        store.set("example.com", {"ip": "127.0.0.1"})
+        store.save()
+        os.utime(self.filename, ns=(0, 0))
+        store.set("example.com", {"ip": "127.0.0.1"})
+        store.save()
+        self.assertEqual(0, os.stat(self.filename).st_mtime_ns)
+
+    def test_save_failure(self):
+        """Test that a failed save() is repeated by the next one."""
+        store = StateStore(self.filename)
+        store.set("example.com", {"ip": "127.0.0.1"})
+        with mock.patch("tempfile.mkstemp", side_effect=OSError(28, "No space left on device")):
+            self.assertRaises(OSError, store.save)
+        self.assertFalse(os.path.exists(self.filename))
+        store.save()
+        self.assertEqual({"ip": "127.0.0.1"}, StateStore(self.filename).get("example.com"))
+
+    def test_dyndnsclient(self):
+        """Test that a restarted client skips a recent sync."""
+        from dyndnsc.core import getDynDnsClientForConfig
+        config = {
+            "interval": 60,
+            "detector": (("command", {"command": "echo 127.0.0.2"}),),
+            "updater": (("dummy", {"hostname": "example.invalid"}),),
+        }
+        store = StateStore(self.filename)
+        client = getDynDnsClientForConfig(config, state_store=store)
+        self.assertTrue(client.needs_check())
+        client.sync()
+        self.assertEqual("127.0.0.2", client.status)
+        client.check()
+        store.save()
+
+        store = StateStore(self.filename)
+        self.assertEqual("127.0.0.2", store.get("example.invalid")["ip"])
+        client = getDynDnsClientForConfig(config, state_store=store)
+        self.assertFalse(client.needs_check())
+
+        # the first sync after a restart must not look up the DNS:
+        def fail(*args, **kwargs):
+            raise AssertionError("unexpected DNS lookup")
+        client.dns.detect = fail
+        client.sync()
+        self.assertEqual("127.0.0.2", client.status)
+
+    def test_pause(self):
+        """Test that a pause and a retry delay survive restarts until the updater configuration changes."""
+        from dyndnsc.core import getDynDnsClientForConfig
+        from dyndnsc.updater.base import UPDATE_FATAL, UPDATE_RETRY
+        config = {
+            "detector": (("command", {"command": "echo 127.0.0.2"}),),
+            "updater": (("dummy", {"hostname": "example.invalid"}),),
+        }
+        store = StateStore(self.filename)
+        client = getDynDnsClientForConfig(config, state_store=store)
+        with mock.patch.object(client.updater, "classify", return_value=UPDATE_RETRY):
+            client.sync()
+        retry_at = client.retry_at
+        self.assertEqual(retry_at, getDynDnsClientForConfig(config, state_store=store).retry_at)
+        self.assertEqual(1, getDynDnsClientForConfig(config, state_store=store).backoff.failures)
+
+        with mock.patch.object(client.updater, "classify", return_value=UPDATE_FATAL):
+            client.retry_at = None
+            client.sync()
+        self.assertTrue(client.paused)
+        store.save()
+        store = StateStore(self.filename)
+        client = getDynDnsClientForConfig(config, state_store=store)
+        self.assertTrue(client.paused)
+        self.assertEqual(None, client.next_check_time())
+
+        # e.g. corrected credentials:
+        config["updater"] = (("dummy", {"hostname": "example.invalid", "password": "fixed"}),)
+        client = getDynDnsClientForConfig(config, state_store=store)
+        self.assertFalse(client.paused)
+        self.assertTrue(client.needs_check())
+
+    def test_state_key(self):
+        """Test that clients of the A and AAAA records of a hostname keep separate states."""
+        from dyndnsc.core import getDynDnsClientForConfig
+        store = StateStore(self.filename)
+        clients = [
+            getDynDnsClientForConfig({
+                "detector": (("command", {"command": command, "family": family}),),
+                "updater": (("dummy", {"hostname": "example.invalid"}),),
+            }, state_store=store)
+            for command, family in (("echo 127.0.0.2", "INET"), ("echo ::2", "INET6"))
+        ]
+        self.assertEqual(["example.invalid/ipv4", "example.invalid/ipv6"], [client.state_key() for client in clients])
+        for client in clients:
+            client.sync()
+        self.assertEqual("127.0.0.2", store.get("example.invalid/ipv4")["ip"])
+        self.assertEqual("::2", store.get("example.invalid/ipv6")["ip"])
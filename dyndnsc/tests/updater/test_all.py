@@ -18,6 +18,19 @@ class TestUpdaterCommon(unittest.TestCase):
         import dyndnsc.updater.builtin
         self.assertTrue(len(dyndnsc.updater.builtin.PLUGINS) > 0)
 
+    def test_classify(self):
+        """Run tests for classifying update results."""
+        from dyndnsc.updater import base
+        from dyndnsc.updater.dummy import UpdateProtocolDummy
+        self.assertEqual(None, base.classify_http_status("127.0.0.1"))
+        self.assertEqual(None, base.classify_http_status(None))
+        self.assertEqual(base.UPDATE_RETRY, base.classify_http_status("invalid http status code: 503"))
+        self.assertEqual(base.UPDATE_RETRY, base.classify_http_status("invalid http status code: 429"))
+        self.assertEqual(base.UPDATE_FATAL, base.classify_http_status("invalid http status code: 401"))
+        updater = UpdateProtocolDummy(hostname="example.com")
+        self.assertEqual(base.UPDATE_OK, updater.classify("127.0.0.1", "127.0.0.1"))
+        self.assertEqual(base.UPDATE_RETRY, updater.classify("127.0.0.1", None))
+
     def test_updater_base_class(self):
         """Run test."""
         from dyndnsc.updater.base import UpdateProtocol
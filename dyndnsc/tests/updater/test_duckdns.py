@@ -55,3 +55,75 @@ class TestDuckdns(unittest.TestCase):
 
         # empty/no IP test:
         self.assertEqual(None, updater.update(None))
+
+    @responses.activate
+    def test_duckdns_update_many(self):
+        """Run tests for combined updates of several domains."""
+        from responses import matchers
+        from dyndnsc.updater import duckdns
+        responses.add(
+            responses.GET,
+            "https://www.duckdns.org/update",
+            match=[matchers.query_string_matcher("domains=a,b&token=dummy&ip=127.0.0.2")],
+            body="OK",
+            status=200,
+            headers={"Content-Type": "text/plain; charset=utf-8"}
+        )
+        updaters = [
+            duckdns.UpdateProtocolDuckdns(hostname=hostname, token="dummy", url="https://www.duckdns.org/update")
+            for hostname in ("a.duckdns.org", "b.duckdns.org")
+        ]
+        self.assertEqual(updaters[0].batch_key(), updaters[1].batch_key())
+        self.assertEqual(["127.0.0.2", "127.0.0.2"], duckdns.UpdateProtocolDuckdns.update_many(updaters, "127.0.0.2"))
+
+    @responses.activate
+    def test_duckdns_update_many_invalid(self):
+        """Test that an invalid domain does not fail the other domains updated in the same request."""
+        from responses import matchers
+        from dyndnsc.updater import duckdns
+        from dyndnsc.updater.base import UPDATE_FATAL, UPDATE_OK
+        for domains, body in (("a,invalid", "KO"), ("a", "OK"), ("invalid", "KO")):
+            responses.add(
+                responses.GET,
+                "https://www.duckdns.org/update",
+                match=[matchers.query_string_matcher("domains=%s&token=dummy&ip=127.0.0.2" % domains)],
+                body=body,
+                status=200,
+                headers={"Content-Type": "text/plain; charset=utf-8"}
+            )
+        updaters = [
+            duckdns.UpdateProtocolDuckdns(hostname=hostname, token="dummy", url="https://www.duckdns.org/update")
+            for hostname in ("a.duckdns.org", "invalid.duckdns.org")
+        ]
+        results = duckdns.UpdateProtocolDuckdns.update_many(updaters, "127.0.0.2")
+        self.assertEqual(["127.0.0.2", "KO"], results)
+        self.assertEqual([UPDATE_OK, UPDATE_FATAL],
+                         [updater.classify("127.0.0.2", result) for updater, result in zip(updaters, results)])
+        self.assertEqual(3, len(responses.calls))
+
+    @responses.activate
+    def test_duckdns_dualstack(self):
+        """Run tests for updating the ipv4 and ipv6 address in one request."""
+        from responses import matchers
+        from dyndnsc.updater import duckdns
+        responses.add(
+            responses.GET,
+            "https://www.duckdns.org/update",
+            match=[matchers.query_string_matcher("domains=a&token=dummy&ip=127.0.0.2&ipv6=::1")],
+            body="OK",
+            status=200,
+        )
+        updater = duckdns.UpdateProtocolDuckdns(hostname="a.duckdns.org", token="dummy",
+                                                url="https://www.duckdns.org/update")
+        self.assertEqual(("127.0.0.2", "::1"), updater.update_dualstack("127.0.0.2", "::1"))
+        self.assertEqual(1, len(responses.calls))
+
+    def test_duckdns_classify(self):
+        """Run tests for classifying duckdns results."""
+        from dyndnsc.updater import duckdns
+        from dyndnsc.updater.base import UPDATE_OK, UPDATE_RETRY, UPDATE_FATAL
+        updater = duckdns.UpdateProtocolDuckdns(hostname="a.duckdns.org", token="dummy",
+                                                url="https://www.duckdns.org/update")
+        self.assertEqual(UPDATE_OK, updater.classify("127.0.0.1", "127.0.0.1"))
+        self.assertEqual(UPDATE_FATAL, updater.classify("127.0.0.1", "KO"))
+        self.assertEqual(UPDATE_RETRY, updater.classify("127.0.0.1", "invalid http status code: 500"))
@@ -46,3 +46,80 @@ class TestDyndns2(unittest.TestCase):
         updater = dyndns2.UpdateProtocolDyndns2(**options)
         res = updater.update(theip)
         self.assertEqual(theip, res)
+
+    @responses.activate
+    def test_dyndns2_update_many(self):
+        """Run tests for combined updates of several hostnames."""
+        from responses import matchers
+        from dyndnsc.updater import dyndns2
+        responses.add(
+            responses.GET,
+            self.url,
+            match=[matchers.query_string_matcher("myip=127.0.0.2&hostname=a.example.com,b.example.com,c.example.com")],
+            body="good 127.0.0.2\nnochg 127.0.0.2\nnohost",
+            status=200,
+            headers={"Content-Type": "text/plain; charset=utf-8"}
+        )
+        updaters = [
+            dyndns2.UpdateProtocolDyndns2(hostname=hostname, userid="dummy", password="1234", url=self.url)
+            for hostname in ("a.example.com", "b.example.com", "c.example.com")
+        ]
+        self.assertEqual(1, len({updater.batch_key() for updater in updaters}))
+        other = dyndns2.UpdateProtocolDyndns2(hostname="a.example.com", userid="other", password="1234", url=self.url)
+        self.assertNotEqual(updaters[0].batch_key(), other.batch_key())
+
+        res = dyndns2.UpdateProtocolDyndns2.update_many(updaters, "127.0.0.2")
+        self.assertEqual(["127.0.0.2", "127.0.0.2", "nohost"], res)
+        self.assertEqual(1, len(responses.calls))
+
+    @responses.activate
+    def test_dyndns2_dualstack(self):
+        """Run tests for updating the ipv4 and ipv6 address in one request."""
+        from responses import matchers
+        from dyndnsc.updater import dyndns2
+        responses.add(
+            responses.GET,
+            self.url,
+            match=[matchers.query_string_matcher("myip=127.0.0.2,::1&hostname=a.example.com,b.example.com")],
+            body="good 127.0.0.2,::1\nnochg 127.0.0.2,::1",
+            status=200,
+        )
+        responses.add(
+            responses.GET,
+            self.url,
+            match=[matchers.query_string_matcher("myip=::1&hostname=a.example.com")],
+            body="good ::1",
+            status=200,
+        )
+        updaters = [
+            dyndns2.UpdateProtocolDyndns2(hostname=hostname, userid="dummy", password="1234", url=self.url)
+            for hostname in ("a.example.com", "b.example.com")
+        ]
+        res = dyndns2.UpdateProtocolDyndns2.update_many_dualstack(updaters, "127.0.0.2", "::1")
+        self.assertEqual([("127.0.0.2", "::1")] * 2, res)
+        self.assertEqual((None, "::1"), updaters[0].update_dualstack(None, "::1"))
+        self.assertEqual(2, len(responses.calls))
+
+    @responses.activate
+    def test_dyndns2_update_many_single_answer(self):
+        """Run tests for a combined update answered with a single line."""
+        from dyndnsc.updater import dyndns2
+        responses.add(responses.GET, self.url, body="badauth", status=200)
+        updaters = [
+            dyndns2.UpdateProtocolDyndns2(hostname=hostname, userid="dummy", password="1234", url=self.url)
+            for hostname in ("a.example.com", "b.example.com")
+        ]
+        res = dyndns2.UpdateProtocolDyndns2.update_many(updaters, "127.0.0.2")
+        self.assertEqual(["badauth", "badauth"], res)
+
+    def test_dyndns2_classify(self):
+        """Run tests for classifying dyndns2 return codes."""
+        from dyndnsc.updater import dyndns2
+        from dyndnsc.updater.base import UPDATE_OK, UPDATE_RETRY, UPDATE_FATAL
+        updater = dyndns2.UpdateProtocolDyndns2(hostname="a.example.com", userid="dummy", password="1234",
+                                                url=self.url)
+        self.assertEqual(UPDATE_OK, updater.classify("127.0.0.1", "127.0.0.1"))
+        for result in ("badauth", "abuse", "nohost", "notfqdn", "!donator", "invalid http status code: 404"):
+            self.assertEqual(UPDATE_FATAL, updater.classify("127.0.0.1", result), result)
+        for result in ("911", "dnserr", "invalid http status code: 502", "something"):
+            self.assertEqual(UPDATE_RETRY, updater.classify("127.0.0.1", result), result)
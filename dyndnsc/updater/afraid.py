@@ -7,11 +7,9 @@ import hashlib
 import re
 from collections import namedtuple
 
-import requests
-
-from .base import UpdateProtocol
+from .base import UpdateProtocol, UPDATE_OK, UPDATE_RETRY
 from ..common.six import ipaddress
-from ..common import constants
+from ..common import constants, http
 
 LOG = logging.getLogger(__name__)
 
@@ -82,7 +80,7 @@ def records(credentials, url="https://freedns.afraid.org/api/"):
     :param url: the service URL
     """
     params = {"action": "getdyndns", "sha": credentials.sha}
-    req = requests.get(
+    req = http.get(
         url, params=params, headers=constants.REQUEST_HEADERS_DEFAULT, timeout=60)
     for record_line in (line.strip() for line in req.text.splitlines()
                         if len(line.strip()) > 0):
@@ -99,9 +97,8 @@ def update(url):
     :param url: URL to retrieve for triggering the update
     :return: IP address
     """
-    req = requests.get(
+    req = http.get(
         url, headers=constants.REQUEST_HEADERS_DEFAULT, timeout=60)
-    req.close()
     # Response must contain an IP address, or else we can't parse it.
     # Also, the IP address in the response is the newly assigned IP address.
     ipregex = re.compile(r"\b(?P<ip>(?:[0-9]{1,3}\.){3}[0-9]{1,3})\b")
@@ -132,6 +129,12 @@ class UpdateProtocolAfraid(UpdateProtocol):
 
         super(UpdateProtocolAfraid, self).__init__()
 
+    def classify(self, ip, result):
+        """Classify the result of update(), which returns the IP chosen by the service."""
+        if result is None:
+            return UPDATE_RETRY
+        return UPDATE_OK
+
     def update(self, *args, **kwargs):
         """Update the IP on the remote service."""
         # first find the update_url for the provided account + hostname:
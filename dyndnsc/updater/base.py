@@ -9,6 +9,34 @@ from ..common.dynamiccli import DynamicCliMixin
 
 LOG = logging.getLogger(__name__)
 
+# classification of update results, see UpdateProtocol.classify():
+UPDATE_OK = "ok"
+UPDATE_RETRY = "retry"  # temporary failure, try again later
+UPDATE_FATAL = "fatal"  # must not be retried without intervention
+
+_HTTP_STATUS_PREFIX = "invalid http status code: "
+
+
+def classify_http_status(result):
+    """
+    Classify an "invalid http status code" update result.
+
+    Server errors and rate limiting are temporary, any other unexpected
+    status code points at a configuration problem.
+
+    :param result: update result string
+    :return: UPDATE_RETRY, UPDATE_FATAL or None if result is no such result
+    """
+    if not isinstance(result, str) or not result.startswith(_HTTP_STATUS_PREFIX):
+        return None
+    try:
+        status_code = int(result[len(_HTTP_STATUS_PREFIX):])
+    except ValueError:
+        return UPDATE_RETRY
+    if status_code >= 500 or status_code == 429:
+        return UPDATE_RETRY
+    return UPDATE_FATAL
+
 
 class UpdateProtocol(Subject, DynamicCliMixin):
     """Base class for all update protocols that use a simple http GET protocol."""
@@ -51,3 +79,112 @@ class UpdateProtocol(Subject, DynamicCliMixin):
         Abstract method, must be implemented in subclass.
         """
         raise NotImplementedError("Please implement in subclass")
+
+    async def aupdate(self, ip):
+        """
+        Update the hostname on the remote service without blocking the event loop.
+
+        The default implementation runs update() in the default executor of
+        the running loop.
+
+        May be overwritten in updater subclasses.
+        """
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, self.update, ip)
+
+    def classify(self, ip, result):
+        """
+        Classify the result of update(ip).
+
+        The default implementation considers any result but the IP itself a
+        temporary failure.
+
+        May be overwritten in updater subclasses.
+
+        :param ip: the IP passed to update()
+        :param result: the value returned by update()
+        :return: one of UPDATE_OK, UPDATE_RETRY, UPDATE_FATAL
+        """
+        if result == ip:
+            return UPDATE_OK
+        return classify_http_status(result) or UPDATE_RETRY
+
+    def batch_key(self):
+        """
+        Return a key identifying updaters that can be updated in one request.
+
+        Updaters of the same class with equal keys are passed to update_many()
+        together. Returns None if this updater cannot be combined with others.
+
+        May be overwritten in updater subclasses.
+        """
+        return None
+
+    @classmethod
+    def update_many(cls, updaters, ip):
+        """
+        Update the hostnames of several updaters sharing a batch_key().
+
+        The default implementation updates them one by one.
+
+        May be overwritten in updater subclasses.
+
+        :param updaters: list of updater instances of this class
+        :param ip: the IP address to set for all of them
+        :return: list of the update results, in the order of updaters
+        """
+        return [updater.update(ip) for updater in updaters]
+
+    @classmethod
+    async def aupdate_many(cls, updaters, ip):
+        """
+        Update the hostnames of several updaters sharing a batch_key() without blocking the event loop.
+
+        The default implementation runs update_many() in the default executor
+        of the running loop.
+
+        May be overwritten in updater subclasses.
+
+        :param updaters: list of updater instances of this class
+        :param ip: the IP address to set for all of them
+        :return: list of the update results, in the order of updaters
+        """
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, cls.update_many, updaters, ip)
+
+    def update_dualstack(self, ipv4, ipv6):
+        """
+        Update the ipv4 and the ipv6 address of the hostname on the remote service.
+
+        The default implementation calls update() once per address, updaters
+        whose protocol can set both addresses at once should overwrite it.
+
+        May be overwritten in updater subclasses.
+
+        :param ipv4: the ipv4 address or None to leave it alone
+        :param ipv6: the ipv6 address or None to leave it alone
+        :return: the tuple (ipv4, ipv6) on success, the first failed update result otherwise
+        """
+        for ip in (ipv4, ipv6):
+            if ip is None:
+                continue
+            result = self.update(ip)
+            if self.classify(ip, result) != UPDATE_OK:
+                return result
+        return (ipv4, ipv6)
+
+    @classmethod
+    def update_many_dualstack(cls, updaters, ipv4, ipv6):
+        """
+        Update the ipv4 and ipv6 addresses of several updaters sharing a batch_key().
+
+        The default implementation updates them one by one.
+
+        May be overwritten in updater subclasses.
+
+        :param updaters: list of updater instances of this class
+        :param ipv4: the ipv4 address or None to leave it alone
+        :param ipv6: the ipv6 address or None to leave it alone
+        :return: list of the update results, in the order of updaters
+        """
+        return [updater.update_dualstack(ipv4, ipv6) for updater in updaters]
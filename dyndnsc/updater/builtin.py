@@ -1,19 +1,31 @@
 # -*- coding: utf-8 -*-
 
 """
-All built-in updater plugins are listed here and will be dynamically imported.
+All built-in updater plugins are listed here and will be imported on demand.
 
 If importing a plugin fails, it will be silently ignored.
 """
 
-from ..common.load import load_class as _load_plugin
+from ..common.load import load_builtin_class, load_builtin_classes
 
+# configuration key, module, class:
 _BUILTINS = (
-    ("dyndnsc.updater.afraid", "UpdateProtocolAfraid"),
-    ("dyndnsc.updater.dummy", "UpdateProtocolDummy"),
-    ("dyndnsc.updater.duckdns", "UpdateProtocolDuckdns"),
-    ("dyndnsc.updater.dyndns2", "UpdateProtocolDyndns2"),
-    ("dyndnsc.updater.dnsimple", "UpdateProtocolDnsimple"),
+    ("afraid", "dyndnsc.updater.afraid", "UpdateProtocolAfraid"),
+    ("dummy", "dyndnsc.updater.dummy", "UpdateProtocolDummy"),
+    ("duckdns", "dyndnsc.updater.duckdns", "UpdateProtocolDuckdns"),
+    ("dyndns2", "dyndnsc.updater.dyndns2", "UpdateProtocolDyndns2"),
+    ("dnsimple", "dyndnsc.updater.dnsimple", "UpdateProtocolDnsimple"),
 )
 
-PLUGINS = {plug for plug in (_load_plugin(m, c) for m, c in _BUILTINS) if plug is not None}
+
+def get_plugin(name):
+    """Return the plugin class for configuration key ``name``, importing only its module."""
+    return load_builtin_class(name, _BUILTINS)
+
+
+def __getattr__(name):
+    """Import all plugins when ``PLUGINS`` is accessed for the first time."""
+    if name == "PLUGINS":
+        globals()["PLUGINS"] = plugins = load_builtin_classes(_BUILTINS)
+        return plugins
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -16,10 +16,8 @@ where:
 
 from logging import getLogger
 
-import requests
-
-from .base import UpdateProtocol
-from ..common import constants
+from .base import UpdateProtocol, UPDATE_OK, UPDATE_RETRY, UPDATE_FATAL, classify_http_status
+from ..common import constants, http
 
 LOG = getLogger(__name__)
 
@@ -45,20 +43,73 @@ class UpdateProtocolDuckdns(UpdateProtocol):
 
     def update(self, ip):
         """Update the IP on the remote service."""
+        return self._update([self.hostname], ip)[0]
+
+    def classify(self, ip, result):
+        """Classify the result of update(ip), "KO" means bad token or domain."""
+        if result == ip:
+            return UPDATE_OK
+        if isinstance(result, str) and result.startswith("KO"):
+            return UPDATE_FATAL
+        return classify_http_status(result) or UPDATE_RETRY
+
+    def batch_key(self):
+        """Return a key shared by all updaters using the same token."""
+        return (self._updateurl, self.__token)
+
+    @classmethod
+    def update_many(cls, updaters, ip):
+        """Update the IP of several hostnames in a single request."""
+        return updaters[0]._update([updater.hostname for updater in updaters], ip)
+
+    def update_dualstack(self, ipv4, ipv6):
+        """Update the ipv4 and ipv6 address in a single request."""
+        return self._update([self.hostname], (ipv4, ipv6))[0]
+
+    @classmethod
+    def update_many_dualstack(cls, updaters, ipv4, ipv6):
+        """Update the ipv4 and ipv6 address of several hostnames in a single request."""
+        return updaters[0]._update([updater.hostname for updater in updaters], (ipv4, ipv6))
+
+    def _update(self, hostnames, ip):
+        """
+        Update the IP of the given hostnames in a single request.
+
+        The answer of the service applies to all of the hostnames. As a
+        single invalid domain fails the whole request with "KO", a failed
+        request for several hostnames is repeated for each of them, so that
+        only the invalid ones are reported as failed.
+
+        :param ip: IP address, None for auto-detection or (ipv4, ipv6) tuple
+        :return: list of results, one per hostname
+        """
         timeout = 60
-        LOG.debug("Updating '%s' to '%s' at service '%s'", self.hostname, ip, self._updateurl)
-        params = {"domains": self.hostname.partition(".")[0], "token": self.__token}
-        if ip is None:
+        LOG.debug("Updating '%s' to '%s' at service '%s'", ",".join(hostnames), ip, self._updateurl)
+        domains = ",".join(hostname.partition(".")[0] for hostname in hostnames)
+        params = {"domains": domains, "token": self.__token}
+        if isinstance(ip, tuple):
+            # an omitted ipv4 address is detected by the service:
+            params["ip"] = ip[0] or ""
+            if ip[1] is not None:
+                params["ipv6"] = ip[1]
+        elif ip is None:
             params["ip"] = ""
         else:
             params["ip"] = ip
         # LOG.debug("Update params: %r", params)
-        req = requests.get(self._updateurl, params=params, headers=constants.REQUEST_HEADERS_DEFAULT,
-                           timeout=timeout)
+        req = http.get(self._updateurl, params=params, headers=constants.REQUEST_HEADERS_DEFAULT,
+                       timeout=timeout)
         LOG.debug("status %i, %s", req.status_code, req.text)
         # duckdns response codes seem undocumented...
         if req.status_code == 200:
             if req.text.startswith("OK"):
-                return ip
-            return req.text
-        return "invalid http status code: %s" % req.status_code
+                result = ip
+            else:
+                result = req.text
+        else:
+            result = "invalid http status code: %s" % req.status_code
+        if len(hostnames) > 1 and isinstance(result, str) and result.startswith("KO"):
+            LOG.info("Combined update of '%s' failed with '%s', updating them one by one",
+                     ",".join(hostnames), result)
+            return [self._update([hostname], ip)[0] for hostname in hostnames]
+        return [result] * len(hostnames)
@@ -4,13 +4,15 @@
 
 from logging import getLogger
 
-import requests
-
-from .base import UpdateProtocol
-from ..common import constants
+from .base import UpdateProtocol, UPDATE_OK, UPDATE_RETRY, UPDATE_FATAL, classify_http_status
+from ..common import constants, http
 
 LOG = getLogger(__name__)
 
+# return codes that require user intervention, see https://help.dyn.com/remote-access-api/return-codes/
+FATAL_RETURN_CODES = ("badauth", "!donator", "notfqdn", "nohost", "numhost", "abuse", "badagent", "badsys",
+                      "!yours")
+
 
 class UpdateProtocolDyndns2(UpdateProtocol):
     """Updater for services compatible with the dyndns2 protocol."""
@@ -35,15 +37,67 @@ class UpdateProtocolDyndns2(UpdateProtocol):
 
     def update(self, ip):
         """Update the IP on the remote service."""
+        return self._update([self.hostname], ip)[0]
+
+    def classify(self, ip, result):
+        """Classify the result of update(ip) using the dyndns2 return codes."""
+        if result == ip:
+            return UPDATE_OK
+        if isinstance(result, str) and result.strip().startswith(FATAL_RETURN_CODES):
+            return UPDATE_FATAL
+        # "911", "dnserr" and anything unknown are considered temporary
+        return classify_http_status(result) or UPDATE_RETRY
+
+    def batch_key(self):
+        """Return a key shared by all updaters using the same account."""
+        return (self._updateurl, self.__userid, self.__password)
+
+    @classmethod
+    def update_many(cls, updaters, ip):
+        """Update the IP of several hostnames in a single request."""
+        return updaters[0]._update([updater.hostname for updater in updaters], ip)
+
+    def update_dualstack(self, ipv4, ipv6):
+        """Update the ipv4 and ipv6 address in a single request."""
+        return self._update([self.hostname], (ipv4, ipv6))[0]
+
+    @classmethod
+    def update_many_dualstack(cls, updaters, ipv4, ipv6):
+        """Update the ipv4 and ipv6 address of several hostnames in a single request."""
+        return updaters[0]._update([updater.hostname for updater in updaters], (ipv4, ipv6))
+
+    def _update(self, hostnames, ip):
+        """
+        Update the IP of the given hostnames in a single request.
+
+        The dyndns2 protocol accepts a comma separated list of hostnames and
+        answers with one line per hostname, in the same order. Likewise, an
+        ipv4 and an ipv6 address can be set at once by passing both in myip.
+
+        :param ip: IP address or (ipv4, ipv6) tuple
+        :return: list of results, one per hostname
+        """
         timeout = 60
-        LOG.debug("Updating '%s' to '%s' at service '%s'", self.hostname, ip, self._updateurl)
-        params = {"myip": ip, "hostname": self.hostname}
-        req = requests.get(self._updateurl, params=params, headers=constants.REQUEST_HEADERS_DEFAULT,
-                           auth=(self.__userid, self.__password), timeout=timeout)
+        LOG.debug("Updating '%s' to '%s' at service '%s'", ",".join(hostnames), ip, self._updateurl)
+        if isinstance(ip, tuple):
+            myip = ",".join(address for address in ip if address is not None)
+        else:
+            myip = ip
+        params = {"myip": myip, "hostname": ",".join(hostnames)}
+        req = http.get(self._updateurl, params=params, headers=constants.REQUEST_HEADERS_DEFAULT,
+                       auth=(self.__userid, self.__password), timeout=timeout)
         LOG.debug("status %i, %s", req.status_code, req.text)
-        if req.status_code == 200:
+        if req.status_code != 200:
+            return ["invalid http status code: %s" % req.status_code] * len(hostnames)
+        lines = req.text.splitlines()
+        if len(lines) != len(hostnames):
+            # a single answer (e.g. "badauth") applies to all hostnames
+            lines = [req.text] * len(hostnames)
+        results = []
+        for line in lines:
             # responses can also be "nohost", "abuse", "911", "notfqdn"
-            if req.text.startswith("good ") or req.text.startswith("nochg"):
-                return ip
-            return req.text
-        return "invalid http status code: %s" % req.status_code
+            if line.startswith("good ") or line.startswith("nochg"):
+                results.append(ip)
+            else:
+                results.append(line)
+        return results
@@ -2,15 +2,14 @@
 
 """Management of updaters."""
 
-from ..common.load import find_class
-
 
 def updater_classes():
-    """Return all built-in updater classes."""
+    """Return all built-in updater classes, this imports all of them."""
     from .builtin import PLUGINS
     return PLUGINS
 
 
 def get_updater_class(name="noip"):
     """Return updater class identified by configuration key ``name``."""
-    return find_class(name, updater_classes())
+    from .builtin import get_plugin
+    return get_plugin(name)
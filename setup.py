@@ -49,7 +49,7 @@ CLASSIFIERS = [
 
 INSTALL_REQUIRES = [
     "daemonocle>=1.0.1",
-    "dnspython>=1.15.0",
+    "dnspython>=2.0.0",
     "netifaces>=0.10.5",
     "requests>=2.0.1",
     "json-logging",